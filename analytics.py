@@ -0,0 +1,216 @@
+from collections import defaultdict
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Order, OrderItem, SalesRollup, RollupCheckpoint
+import jobs
+
+# Estados en los que una orden cuenta como venta
+SALE_STATUSES = ('paid', 'shipped', 'delivered')
+GRANULARITIES = ('hour', 'day')
+SCOPES = ('total', 'product', 'category')
+METRICS = ('revenue', 'units', 'orders')
+BACKFILL = 'sales_rollups'
+
+_UPSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def bucket_start(moment, granularity):
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _deltas(order_ids, sign):
+    """Agrega los items de las ordenes por (granularity, bucket, scope, scope_id).
+
+    El bucket sale de orders.created_at y la categoria de la copia guardada en
+    order_items.category_id, asi que restar una orden deshace exactamente lo
+    que sumo aunque despues cambie el producto.
+    """
+    rows = db.session.execute(
+        select(
+            Order.id, Order.created_at, OrderItem.product_id, OrderItem.category_id,
+            func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.unit_price),
+        )
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.id.in_(order_ids))
+        .group_by(Order.id, Order.created_at, OrderItem.product_id, OrderItem.category_id)
+    ).all()
+
+    deltas = defaultdict(lambda: [0.0, 0, 0])
+    counted = set()
+    for order_id, created_at, product_id, category_id, units, revenue in rows:
+        scopes = [('total', 0), ('product', product_id)]
+        if category_id is not None:
+            scopes.append(('category', category_id))
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(created_at, granularity)
+            for scope, scope_id in scopes:
+                key = (granularity, bucket, scope, scope_id)
+                delta = deltas[key]
+                delta[0] += sign * revenue
+                delta[1] += sign * units
+                # Una orden con varias lineas del mismo scope cuenta una vez
+                if (order_id, key) not in counted:
+                    counted.add((order_id, key))
+                    delta[2] += sign
+    return deltas
+
+
+def _apply(deltas):
+    """Suma los deltas a los rollups con un upsert relativo (executemany)."""
+    if not deltas:
+        return
+    table = SalesRollup.__table__
+    insert = _UPSERTS[db.session.get_bind().dialect.name]
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.granularity, table.c.scope, table.c.scope_id, table.c.bucket],
+        set_={
+            "revenue": table.c.revenue + stmt.excluded.revenue,
+            "units": table.c.units + stmt.excluded.units,
+            "orders": table.c.orders + stmt.excluded.orders,
+            "updated_at": func.now(),
+        },
+    )
+    db.session.execute(stmt, [
+        {
+            "granularity": granularity, "bucket": bucket, "scope": scope, "scope_id": scope_id,
+            "revenue": revenue, "units": units, "orders": orders,
+        }
+        for (granularity, bucket, scope, scope_id), (revenue, units, orders) in deltas.items()
+    ])
+
+
+def _tracked(order_id):
+    """False si un backfill en curso todavia va a leer esta orden.
+
+    Sin backfill en curso no se bloquea nada: los cambios de estado no se
+    serializan entre si. Durante un backfill, el FOR UPDATE serializa contra
+    el lote que avanza el checkpoint. Sin el (SQLite) tambien es correcto: el
+    estado ya esta confirmado, y si el lote lo leyo, el checkpoint nuevo ya es
+    visible.
+    """
+    query = select(RollupCheckpoint.last_id, RollupCheckpoint.target_id).filter_by(name=BACKFILL)
+    checkpoint = db.session.execute(query).first()
+    if checkpoint is None or checkpoint.last_id >= checkpoint.target_id:
+        return True
+    checkpoint = db.session.execute(query.with_for_update()).first()
+    return order_id <= checkpoint.last_id or order_id > checkpoint.target_id
+
+
+def sync_order(order_id):
+    """Suma o resta la orden de los rollups segun su estado actual.
+
+    orders.in_rollups dice si ya esta sumada; el UPDATE condicional lo invierte
+    una sola vez, asi que repetir o reordenar llamadas no cuenta dos veces.
+    """
+    if not _tracked(order_id):
+        return
+    is_sale = Order.status.in_(SALE_STATUSES)
+    row = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.in_rollups != is_sale)
+        .values(in_rollups=is_sale)
+        .returning(Order.in_rollups)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is not None:
+        _apply(_deltas([order_id], 1 if row.in_rollups else -1))
+
+
+@jobs.handler('analytics.sync_order')
+def _sync_order_job(payload):
+    sync_order(payload["order_id"])
+
+
+def order_deleted(order):
+    """Resta una orden vendida antes de borrarla."""
+    if order.in_rollups and _tracked(order.id):
+        _apply(_deltas([order.id], -1))
+
+
+def backfill(batch_size=500, restart=False, on_batch=None):
+    """Reconstruye los rollups desde las ordenes, por lotes de orders.id.
+
+    Cada lote se confirma junto con el checkpoint, asi que si el proceso se
+    corta se reanuda donde quedo. Una corrida nueva (o restart=True) borra los
+    rollups y procesa hasta la ultima orden existente; las ordenes posteriores
+    las mantiene sync_order. Devuelve las ordenes procesadas.
+    """
+    checkpoint = db.session.scalar(select(RollupCheckpoint).filter_by(name=BACKFILL))
+    if restart or checkpoint is None or checkpoint.last_id >= checkpoint.target_id:
+        if checkpoint is None:
+            checkpoint = RollupCheckpoint(name=BACKFILL)
+            db.session.add(checkpoint)
+        db.session.execute(delete(SalesRollup))
+        checkpoint.last_id = 0
+        checkpoint.target_id = db.session.scalar(select(func.max(Order.id))) or 0
+        db.session.commit()
+
+    processed = 0
+    while checkpoint.last_id < checkpoint.target_id:
+        ids = db.session.scalars(
+            select(Order.id)
+            .where(Order.id > checkpoint.last_id, Order.id <= checkpoint.target_id)
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).all()
+        # Se avanza el checkpoint antes de leer estados: desde aca los cambios
+        # de estado de este lote esperan al commit y se aplican sobre lo contado
+        checkpoint.last_id = ids[-1] if ids else checkpoint.target_id
+        db.session.flush()
+        rows = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(ids))
+            .values(in_rollups=Order.status.in_(SALE_STATUSES))
+            .returning(Order.id, Order.in_rollups)
+            .execution_options(synchronize_session=False)
+        ).all()
+        sold = [row.id for row in rows if row.in_rollups]
+        if sold:
+            _apply(_deltas(sold, 1))
+        db.session.commit()
+        processed += len(ids)
+        if on_batch:
+            on_batch(checkpoint.last_id, checkpoint.target_id)
+    return processed
+
+
+def sales_series(granularity, scope, scope_id, start=None, end=None):
+    """Query de la serie temporal de un scope, solo sobre los rollups."""
+    query = SalesRollup.query.filter(
+        SalesRollup.granularity == granularity,
+        SalesRollup.scope == scope,
+        SalesRollup.scope_id == scope_id,
+    )
+    if start is not None:
+        query = query.filter(SalesRollup.bucket >= start)
+    if end is not None:
+        query = query.filter(SalesRollup.bucket < end)
+    return query
+
+
+def top(scope, metric, granularity='day', start=None, end=None, limit=10):
+    """Productos o categorias con mas ventas en el rango, desde los rollups."""
+    query = db.session.query(
+        SalesRollup.scope_id,
+        func.sum(SalesRollup.revenue),
+        func.sum(SalesRollup.units),
+        func.sum(SalesRollup.orders),
+    ).filter(SalesRollup.granularity == granularity, SalesRollup.scope == scope)
+    if start is not None:
+        query = query.filter(SalesRollup.bucket >= start)
+    if end is not None:
+        query = query.filter(SalesRollup.bucket < end)
+    rows = query.group_by(SalesRollup.scope_id) \
+        .order_by(func.sum(getattr(SalesRollup, metric)).desc(), SalesRollup.scope_id).limit(limit)
+    return [
+        {"scope_id": scope_id, "revenue": revenue, "units": units, "orders": orders}
+        for scope_id, revenue, units, orders in rows
+    ]
@@ -8,6 +8,13 @@ import os
 from importlib import import_module
 from logger import setup_logger
 from flask_marshmallow import Marshmallow
+from cache import product_cache, category_cache
+import idempotency
+import jobs
+import revocation
+import authz
+import passwords
+import ratelimit
 
 
 logger = setup_logger(__name__)
@@ -31,12 +38,14 @@ def load_blueprints(app):
 
         
 # Create the Flask application
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
     
     
     # Load configuration
     app.config.from_object(config.get_config())
+    if config_overrides:
+        app.config.update(config_overrides)
     # Load blueprints
     load_blueprints(app)
     # Initialize extensions
@@ -45,7 +54,15 @@ def create_app():
     db.init_app(app)
     jwt = JWTManager()
     jwt.init_app(app)
+    revocation.init_app(app, jwt)
+    authz.init_app(app)
+    passwords.init_app(app)
+    ratelimit.init_app(app)
     migrate = Migrate()
     migrate.init_app(app, db)
+    product_cache.init_app(app)
+    category_cache.init_app(app)
+    idempotency.init_app(app)
+    jobs.init_app(app)
     
     return app
\ No newline at end of file
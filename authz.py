@@ -0,0 +1,93 @@
+import time
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from models import db, User
+from cache import LRUCache
+from logger import setup_logger
+import revocation
+
+logger = setup_logger(__name__)
+
+
+def init_app(app):
+    # user_id -> (role, is_active) para tokens emitidos sin claims
+    app.extensions['authz'] = LRUCache(
+        maxsize=app.config.get('AUTHZ_CACHE_MAXSIZE', 10000),
+        ttl=app.config.get('AUTHZ_CACHE_TTL', 30),
+    )
+
+
+def claims_for(user):
+    """Claims extra del access token: con ellos has_role no consulta la base."""
+    return {"role": user.role, "active": bool(user.is_active), "ver": user.token_version or 0}
+
+
+def _cached_user(user_id):
+    users = current_app.extensions['authz']
+    entry = users.get(str(user_id))
+    if entry is None:
+        row = db.session.execute(select(User.role, User.is_active).where(User.id == user_id)).first()
+        entry = (row.role, bool(row.is_active)) if row else (None, False)
+        users.set(str(user_id), entry)
+    return entry
+
+
+def current_role():
+    """(role, is_active) del usuario del token actual."""
+    claims = get_jwt()
+    if 'role' in claims:
+        return claims['role'], claims.get('active', True)
+    # Token viejo, sin claims: cache por worker con TTL corto
+    return _cached_user(get_jwt_identity())
+
+
+def has_role(required_roles):
+    if isinstance(required_roles, str):
+        required_roles = [required_roles]
+    role, active = current_role()
+    return active and role in required_roles
+
+
+def role_required(required_roles):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not has_role(required_roles):
+                logger.error(f"Access forbidden for roles: {required_roles}")
+                return jsonify({"msg": "Access forbidden"}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def user_changed(user):
+    """Llamar cuando cambia el rol o el estado de un usuario, antes del commit.
+
+    Sube token_version y revoca la version anterior: los tokens ya emitidos
+    llevan claims viejos y dejan de valer. La cache del worker se invalida
+    despues del commit; los demas workers la ven vencer por TTL.
+    """
+    old = user.token_version or 0
+    user.token_version = old + 1
+    expires = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    revocation.revoke_user(user.id, old, time.time() + expires.total_seconds())
+    db.session.info.setdefault('authz_changed', set()).add(str(user.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_users(session):
+    changed = session.info.pop('authz_changed', None)
+    if changed and current_app:
+        users = current_app.extensions.get('authz')
+        if users is not None:
+            users.delete(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('authz_changed', None)
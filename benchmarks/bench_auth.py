@@ -0,0 +1,73 @@
+"""Benchmark del costo de CPU de renovar la sesion.
+
+Compara volver a hacer login cada hora (verificar el hash de la contraseña)
+contra canjear un refresh token, y proyecta el CPU por dia para una
+cantidad de sesiones activas. El hash corre en linea (PASSWORD_HASH_WORKERS=0):
+con el pool de passwords.py su CPU se gasta en otros procesos y
+process_time() no lo veria.
+
+    python -m benchmarks.bench_auth [--requests 200] [--sessions 10000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_auth.db')
+os.environ.setdefault('APP_ENV', 'development')
+os.environ['DATABASE_URI_DEVELOPMENT'] = f'sqlite:///{DB_PATH}'
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+
+CREDENTIALS = {"email": "bench@example.com", "password": "Password123"}
+
+
+def cpu_per_request(fn, n):
+    start = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = create_app({"JOBS_WORKER_ENABLED": False, "RATELIMIT_ENABLED": False, "PASSWORD_HASH_WORKERS": 0})
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username="bench", email=CREDENTIALS["email"], phone="+5500000000",
+            password=generate_password_hash(CREDENTIALS["password"]),
+        ))
+        db.session.commit()
+    client = app.test_client()
+
+    def login():
+        assert client.post('/auth/login', json=CREDENTIALS).status_code == 200
+
+    refresh_token = client.post('/auth/login', json=CREDENTIALS).get_json()["refresh_token"]
+
+    def refresh():
+        nonlocal refresh_token
+        response = client.post('/auth/refresh', headers={"Authorization": f"Bearer {refresh_token}"})
+        assert response.status_code == 200
+        refresh_token = response.get_json()["refresh_token"]
+
+    login_cpu = cpu_per_request(login, args.requests)
+    refresh_cpu = cpu_per_request(refresh, args.requests)
+    # Una renovacion por hora y por sesion activa
+    renewals = args.sessions * 24
+    print(f"{'path':>8} {'ms CPU/req':>11} {f'CPU s/day ({args.sessions} sessions)':>32}")
+    print(f"{'login':>8} {login_cpu * 1000:>11.2f} {login_cpu * renewals:>32.0f}")
+    print(f"{'refresh':>8} {refresh_cpu * 1000:>11.2f} {refresh_cpu * renewals:>32.0f}")
+    print(f"refresh is {login_cpu / refresh_cpu:.1f}x cheaper")
+
+
+if __name__ == '__main__':
+    main()
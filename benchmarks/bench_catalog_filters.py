@@ -0,0 +1,174 @@
+"""Benchmark del catalogo filtrado/ordenado sobre un catalogo sintetico.
+
+Mide la primera pagina y una pagina "profunda" (cursor a mitad del catalogo)
+para cada combinacion de filtros/orden a distintos tamanos de catalogo. Con
+los indices compuestos de Product los tiempos deben mantenerse planos.
+
+Al final mide lo que cuestan esos indices en escritura (INSERT de productos y
+cambios de precio/stock/rating) con los indices actuales y con los que tenia
+antes el catalogo (un juego extra con prefijo is_active).
+
+    python -m benchmarks.bench_catalog_filters [--sizes 10000 100000 300000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_catalog.db')
+os.environ.setdefault('APP_ENV', 'development')
+os.environ['DATABASE_URI_DEVELOPMENT'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Product, Category  # noqa: E402
+from catalog import ProductQuery  # noqa: E402
+from pagination import encode_cursor  # noqa: E402
+
+SCENARIOS = {
+    'id': {},
+    'category+price': {'category_id': '3', 'sort': 'price'},
+    'active+category+-created_at': {'is_active': 'true', 'category_id': '5', 'sort': '-created_at'},
+    'price range+price': {'min_price': '10', 'max_price': '50', 'sort': 'price'},
+    'active+in_stock+created_at': {'is_active': 'true', 'in_stock': 'true', 'sort': 'created_at'},
+    'rating': {'sort': 'rating'},
+}
+CATEGORIES = 20
+PAGE = 50
+# Indices retirados del modelo: se recrean solo para comparar su costo
+EXTRA_INDEXES = {
+    'ix_products_is_active_id': 'is_active, id',
+    'ix_products_is_active_price_id': 'is_active, price, id',
+    'ix_products_is_active_created_at_id': 'is_active, created_at, id',
+    'ix_products_is_active_category_id_id': 'is_active, category_id, id',
+    'ix_products_is_active_category_id_price_id': 'is_active, category_id, price, id',
+    'ix_products_is_active_category_id_created_at_id': 'is_active, category_id, created_at, id',
+}
+WRITES = {
+    'insert': None,
+    'price': "UPDATE products SET price = price + 0.01 WHERE id % 10 = 0",
+    'stock': "UPDATE products SET stock = stock + 1 WHERE id % 10 = 0",
+    'rating': "UPDATE products SET rating_avg = rating_avg WHERE id % 10 = 0",
+}
+
+
+def populate(total, batch=20000):
+    start = db.session.query(db.func.count(Product.id)).scalar()
+    base = datetime(2024, 1, 1)
+    rnd = random.Random(start)
+    for offset in range(start, total, batch):
+        rows = [
+            {
+                "name": f"Product {i}",
+                "price": round(rnd.uniform(1, 1500), 2),
+                "stock": rnd.choice([0, 0, 1, 5, 20, 100]),
+                "is_active": rnd.random() > 0.1,
+                "category_id": rnd.randint(1, CATEGORIES),
+                "id_code": f"BENCH-{i}",
+                "created_at": base + timedelta(minutes=i),
+                "rating_avg": round(rnd.uniform(0, 5), 2),
+            }
+            for i in range(offset, min(offset + batch, total))
+        ]
+        db.session.execute(insert(Product), rows)
+        db.session.commit()
+    db.session.execute(text("ANALYZE"))
+
+
+def deep_cursor(query, total):
+    columns, descending = query.SORTS[query.sort]
+    order = [c.desc() if descending else c for c in columns]
+    row = query.filtered().order_by(*order).offset(total // 2).limit(1).first()
+    return encode_cursor([getattr(row, c.key) for c in columns]) if row else None
+
+
+def insert_batch(rows=5000):
+    base = datetime(2030, 1, 1)
+    db.session.execute(insert(Product), [
+        {
+            "name": f"Write {i}",
+            "price": float(i % 1500),
+            "stock": 1,
+            "is_active": True,
+            "category_id": i % CATEGORIES + 1,
+            "id_code": f"WRITE-{i}",
+            "created_at": base + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ])
+
+
+def write_cost(repeat):
+    """ms por operacion de escritura; cada una se deshace con rollback."""
+    results = {}
+    for name, sql in WRITES.items():
+        def run():
+            if sql is None:
+                insert_batch()
+            else:
+                db.session.execute(text(sql))
+            db.session.flush()
+            db.session.rollback()
+        results[name] = timed(run, repeat)
+    return results
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 300000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Category(name=f"Category {i}") for i in range(1, CATEGORIES + 1)])
+        db.session.commit()
+
+        print(f"{'scenario':32} {'size':>8} {'first ms':>9} {'deep ms':>9} {'facets ms':>10}")
+        for size in args.sizes:
+            populate(size)
+            for name, params in SCENARIOS.items():
+                query = ProductQuery(params)
+                cursor = deep_cursor(query, size)
+                first = timed(lambda: query.page(limit=PAGE), args.repeat)
+                deep = timed(lambda: query.page(cursor=cursor, limit=PAGE), args.repeat)
+                facets = timed(query.facets, 1)
+                print(f"{name:32} {size:>8} {first:>9.2f} {deep:>9.2f} {facets:>10.2f}")
+
+        # Mismo catalogo, primero con los indices del modelo y luego con los extra
+        indexes = db.session.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'products'"
+        )).scalar()
+        print(f"\n{'indexes':>8} " + " ".join(f"{name + ' ms':>10}" for name in WRITES))
+        for label, extra in (('model', False), ('+extra', True)):
+            if extra:
+                for index, columns in EXTRA_INDEXES.items():
+                    db.session.execute(text(f"CREATE INDEX {index} ON products ({columns})"))
+                db.session.commit()
+            cost = write_cost(args.repeat)
+            count = indexes + (len(EXTRA_INDEXES) if extra else 0)
+            print(f"{count:>8} " + " ".join(f"{cost[name]:>10.2f}" for name in WRITES) + f"  ({label})")
+        for index in EXTRA_INDEXES:
+            db.session.execute(text(f"DROP INDEX {index}"))
+        db.session.commit()
+    print("\nPages (first/deep) should stay flat as size grows; facets are grouped")
+    print("counts over the matching rows and grow with them (cache them via ETag).")
+    print("Writes: insert = 5000 new products; price/stock/rating update 10% of the")
+    print("catalog. Every index on a changed column is paid on each write.")
+
+
+if __name__ == '__main__':
+    main()
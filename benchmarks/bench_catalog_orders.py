@@ -0,0 +1,101 @@
+"""Benchmark del catalogo frente al volumen de ventas.
+
+Con el catalogo fijo, agrega ordenes/items y mide la pagina del catalogo, el
+detalle de un producto y una carga completa de productos. Las lecturas del
+catalogo no deben tocar order_items, asi que los tiempos deben mantenerse
+planos aunque crezca el historial de ventas.
+
+    python -m benchmarks.bench_catalog_orders [--products 5000] [--items 0 100000 500000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_orders.db')
+os.environ.setdefault('APP_ENV', 'development')
+os.environ['DATABASE_URI_DEVELOPMENT'] = f'sqlite:///{DB_PATH}'
+
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Product, Category, User, Order, OrderItem  # noqa: E402
+from catalog import ProductQuery  # noqa: E402
+
+PAGE = 50
+ITEMS_PER_ORDER = 5
+
+
+def populate_catalog(total):
+    db.session.add(Category(name="Bench"))
+    db.session.add(User(username="bench", email="bench@example.com", password="x"))
+    db.session.commit()
+    rows = [
+        {"name": f"Product {i}", "price": 10.0 + i % 100, "stock": 100, "category_id": 1, "id_code": f"BENCH-{i}"}
+        for i in range(total)
+    ]
+    db.session.execute(insert(Product), rows)
+    db.session.commit()
+
+
+def populate_sales(total_items, products, batch=50000):
+    start = db.session.query(db.func.count(OrderItem.id)).scalar()
+    rnd = random.Random(start)
+    for offset in range(start, total_items, batch):
+        count = min(batch, total_items - offset)
+        orders = count // ITEMS_PER_ORDER
+        first = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+        db.session.execute(insert(Order), [{"user_id": 1, "status": "paid"} for _ in range(orders)])
+        db.session.execute(insert(OrderItem), [
+            {
+                "order_id": first + n // ITEMS_PER_ORDER,
+                "product_id": rnd.randint(1, products),
+                "quantity": 1,
+                "unit_price": 10.0,
+            }
+            for n in range(orders * ITEMS_PER_ORDER)
+        ])
+        db.session.commit()
+    db.session.execute(text("ANALYZE"))
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--items', type=int, nargs='+', default=[0, 100000, 500000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        populate_catalog(args.products)
+
+        statements = []
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        print(f"{'order items':>12} {'page ms':>9} {'detail ms':>10} {'all ms':>9} {'joins order_items':>18}")
+        for items in args.items:
+            populate_sales(items, args.products)
+            statements.clear()
+            page = timed(lambda: ProductQuery({}).page(limit=PAGE), args.repeat)
+            detail = timed(lambda: db.session.get(Product, args.products // 2), args.repeat)
+            everything = timed(lambda: Product.query.all(), args.repeat)
+            touched = any("order_items" in s for s in statements)
+            print(f"{items:>12} {page:>9.2f} {detail:>10.2f} {everything:>9.2f} {str(touched):>18}")
+    print("\nTimes should stay flat as order items grow; 'joins order_items' must be False.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark de la cola de jobs y del pool de workers.
+
+Encola N jobs triviales y mide cuanto tarda el pool en vaciar la cola con
+distinta cantidad de hilos, y el tiempo del PATCH de estado de una orden (que
+solo encola sus efectos).
+
+    python -m benchmarks.bench_jobs [--jobs 5000] [--threads 1 2 4 8]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_jobs.db')
+os.environ.setdefault('APP_ENV', 'development')
+os.environ['DATABASE_URI_DEVELOPMENT'] = f'sqlite:///{DB_PATH}'
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, Job, Product, Category, User  # noqa: E402
+import jobs  # noqa: E402
+
+
+@jobs.handler('bench.noop')
+def noop(payload):
+    pass
+
+
+def drain(app, threads, batch_size):
+    worker = jobs.Worker(app, threads=threads, batch_size=batch_size, poll_interval=0.01)
+    start = time.perf_counter()
+    worker.start()
+    while Job.query.filter(Job.status != 'done').count():
+        db.session.remove()
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=5000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--batch-size', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app({"JOBS_WORKER_ENABLED": False})
+    with app.app_context():
+        db.create_all()
+        print(f"{'threads':>8} {'enqueue/s':>10} {'drain s':>8} {'jobs/s':>8}")
+        for threads in args.threads:
+            start = time.perf_counter()
+            for n in range(args.jobs):
+                jobs.enqueue('bench.noop', {"n": n})
+            db.session.commit()
+            enqueue_rate = args.jobs / (time.perf_counter() - start)
+            elapsed = drain(app, threads, args.batch_size)
+            print(f"{threads:>8} {enqueue_rate:>10.0f} {elapsed:>8.2f} {args.jobs / elapsed:>8.0f}")
+            db.session.query(Job).delete()
+            db.session.commit()
+
+        # Latencia del PATCH: solo valida, actualiza y encola
+        category = Category(name="Bench")
+        user = User(username="bench", email="bench@example.com", password="x")
+        db.session.add_all([category, user, Product(name="P", price=1.0, stock=10**6, category=category)])
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    timings = []
+    for _ in range(200):
+        order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+        client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+        start = time.perf_counter()
+        client.patch(f'/ventas/orders/{order_id}', json={"status": "cancelled"}, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"\nPATCH cancel: p50 {timings[len(timings) // 2]:.2f} ms, p95 {timings[int(len(timings) * 0.95)]:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark de logins concurrentes con hashing en linea o en el pool.
+
+Lanza una rafaga de logins desde varios hilos (como hilos WSGI) y, en
+paralelo, requests baratas a /auth/me. Reporta throughput y latencias de los
+logins, cuantos recibieron 503, y la latencia de las requests baratas, que
+es la que sufre cuando el hashing retiene el GIL.
+
+    python -m benchmarks.bench_passwords [--logins 200] [--threads 16] [--workers 0 4]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench_passwords.db')
+os.environ.setdefault('APP_ENV', 'development')
+os.environ['DATABASE_URI_DEVELOPMENT'] = f'sqlite:///{DB_PATH}'
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, User  # noqa: E402
+
+CREDENTIALS = {"email": "bench@example.com", "password": "Password123"}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(workers, logins, threads, max_pending):
+    app = create_app({"JOBS_WORKER_ENABLED": False, "RATELIMIT_ENABLED": False, "PASSWORD_HASH_WORKERS": workers,
+                      "PASSWORD_HASH_MAX_PENDING": max_pending})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User(
+            username="bench", email=CREDENTIALS["email"], phone="+5500000000",
+            password=generate_password_hash(CREDENTIALS["password"], app.config['PASSWORD_HASH_METHOD']),
+        ))
+        db.session.commit()
+    token = app.test_client().post('/auth/login', json=CREDENTIALS).get_json()["access_token"]
+
+    latencies, rejected, cheap = [], [0], []
+    remaining = [logins]
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login_loop():
+        client = app.test_client()
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            status = client.post('/auth/login', json=CREDENTIALS).status_code
+            with lock:
+                if status == 503:
+                    rejected[0] += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+
+    def cheap_loop():
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {token}"}
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/auth/me', headers=headers)
+            cheap.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    # Calienta el pool para no medir el arranque de los procesos
+    with app.app_context():
+        app.extensions['passwords'].verify(generate_password_hash('x', 'pbkdf2:sha256:1'), 'x')
+
+    prober = threading.Thread(target=cheap_loop)
+    pool = [threading.Thread(target=login_loop) for _ in range(threads)]
+    start = time.perf_counter()
+    prober.start()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    prober.join()
+    app.extensions['passwords'].shutdown()
+    return {
+        "logins/s": len(latencies) / elapsed,
+        "p50 ms": percentile(latencies, 0.5) * 1000,
+        "p95 ms": percentile(latencies, 0.95) * 1000,
+        "503": rejected[0],
+        "/me p95 ms": percentile(cheap, 0.95) * 1000,
+        "/me p50 ms": statistics.median(cheap) * 1000 if cheap else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, os.cpu_count() or 1])
+    parser.add_argument('--max-pending', type=int, default=None)
+    args = parser.parse_args()
+
+    columns = ["logins/s", "p50 ms", "p95 ms", "503", "/me p50 ms", "/me p95 ms"]
+    print(f"{'workers':>8} " + " ".join(f"{c:>11}" for c in columns))
+    for workers in args.workers:
+        result = run(workers, args.logins, args.threads, args.max_pending)
+        print(f"{workers:>8} " + " ".join(f"{result[c]:>11.1f}" for c in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,31 +4,15 @@ from models import db, User
 from schemas import UserSchema
 from models import Roles
 from logger import setup_logger
-from flask_jwt_extended import get_jwt_identity
-from flask import abort
-from functools import wraps
+from authz import role_required
+import authz
+import tokens
 
 
 
 admin_bp = Blueprint('admin', __name__)
 
 logger = setup_logger(__name__)
-def has_role(required_roles):
-    identity = get_jwt_identity()
-    user = db.session.get(User,identity)
-    return user and user.role in required_roles
-  
-#asign roles to user
-def role_required(required_roles):
-    def decorator(fn):
-        @wraps(fn)
-        def wrapper(*args, **kwargs):
-            if not has_role(required_roles):
-                logger.error(f"Access forbidden for roles: {required_roles}")
-                return jsonify({"msg": "Access forbidden"}), 403
-            return fn(*args, **kwargs)
-        return wrapper
-    return decorator
   
 @admin_bp.route('/test', methods=['GET'])
 def test():
@@ -38,8 +22,6 @@ def test():
 @jwt_required()
 @role_required(Roles.ADMIN)
 def get_user(id):
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User,current_user_id)
     user = db.session.get(User,id)
     if not user:
         logger.error("User not found")
@@ -52,10 +34,6 @@ def get_user(id):
 @jwt_required()
 @role_required(Roles.ADMIN)
 def get_all_users():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User,current_user_id)
-
-
     users = User.query.all()
     user_schema = UserSchema(many=True)
     return jsonify(user_schema.dump(users)), 200
@@ -91,7 +69,9 @@ def change_user_role(id):
         return jsonify({"msg": f"Invalid role. Valid roles are: {valid_roles}"}), 400
 
     # Cambiar el rol del usuario
-    user.role = new_role
+    if user.role != new_role:
+        user.role = new_role
+        authz.user_changed(user)
     db.session.commit()
     logger.info(f"User {user.username} role changed to {new_role} by admin {current_user_id}")
     return jsonify({"msg": f"User role updated to {new_role}"}), 200
@@ -101,9 +81,6 @@ def change_user_role(id):
 @jwt_required()
 @role_required(Roles.ADMIN)
 def delete_user(id):
-    user_id = get_jwt_identity()
-    user = db.session.get(User,user_id)
-    
     user = db.session.get(User,id)
     if not user:
         logger.error("User not found")
@@ -114,6 +91,8 @@ def delete_user(id):
       return jsonify({"msg": "Cannot delete the superadmin user"}), 403
 
     # Eliminar el usuario
+    authz.user_changed(user)
+    tokens.drop_user(user.id)
     db.session.delete(user)
     db.session.commit()
     logger.info(f"User {user.username} deleted successfully")
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify, redirect, url_for
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from schemas import UserSchema
 from models import db, User,Roles
 from logger import setup_logger
 from marshmallow import ValidationError
+import revocation
+import authz
+import tokens
+import passwords
+from passwords import HasherBusy
+from ratelimit import limit
+from authz import has_role
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -14,7 +20,13 @@ logger = setup_logger(__name__)
 def test():
     return jsonify({"message": "Test endpoint auth"}), 200
 
+@auth_bp.errorhandler(HasherBusy)
+def hasher_busy(e):
+    logger.error(f"Password hashing unavailable: {e}")
+    return jsonify({"msg": "Server busy, try again later"}), 503, {"Retry-After": "1"}
+
 @auth_bp.route('/register', methods=['POST'])
+@limit('register')
 def register():
     user_schema = UserSchema()
     data = request.get_json()
@@ -27,7 +39,7 @@ def register():
 
 
     # Hashear la contraseña antes de cargar el modelo
-    data['password'] = generate_password_hash(data['password'])
+    data['password'] = passwords.hash_password(data['password'])
 
     user = user_schema.load(data)
 
@@ -37,6 +49,7 @@ def register():
     return jsonify(user_schema.dump(user)), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@limit('login')
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -45,7 +58,7 @@ def login():
 
         user = User.query.filter_by(email=email).first()
 
-        if not user or not check_password_hash(user.password, password):
+        if not user or not passwords.verify_password(user.password, password):
             logger.error("Invalid email or password")
             # logger.error(f"Invalid email or password for user: {email}")
             return jsonify({"msg": "Nombre o contraseña incorrectos"}), 401
@@ -55,8 +68,13 @@ def login():
             
             return jsonify({"msg": "User account is inactive, contact to admin for activate"}), 403
 
-        access_token = create_access_token(identity=str(user.id))
-        return jsonify(access_token=access_token)
+        passwords.rehash_if_needed(user, password)
+        # Access token corto y refresh token para renovarlo sin volver a hashear
+        pair = tokens.issue(user)
+        db.session.commit()
+        return jsonify(pair)
+    except HasherBusy:
+        raise
     except Exception as e:
         logger.error(f"Error during login: {str(e)}")
         return jsonify({"msg": "Error during login"}), 500
@@ -77,14 +95,14 @@ def update_user():
         logger.error("User not found")
         return jsonify({"msg": "User not found"}), 404
 
-    current_user = db.session.get(User, current_user_id)
+    is_admin = has_role([Roles.ADMIN])
     # Solo admin puede modificar a otros usuarios
-    if str(user.id) != str(current_user_id) and current_user.role != Roles.ADMIN:
+    if str(user.id) != str(current_user_id) and not is_admin:
         logger.error("Permission denied")
         return jsonify({"msg": "Permission denied"}), 403
     
     #ningun usuario puede moficicar ni el id ni el rol
-    if 'role' in data and current_user.role != Roles.ADMIN:
+    if 'role' in data and not is_admin:
         logger.error("Permission denied to change role")
         return jsonify({"msg": "Permission denied to change role"}), 403
     if 'id' in data:
@@ -94,16 +112,14 @@ def update_user():
     #if is active is disabled, redirect to method logout
     if 'is_active' in data and not data['is_active']:
         user.is_active = False
+        authz.user_changed(user)
+        tokens.revoke_user(user.id)
+        # Si la cuenta es la propia, el token actual deja de servir
+        if str(user.id) == str(current_user_id):
+            revocation.revoke_token(get_jwt())
         db.session.commit()
         logger.info(f"User {user.username} deactivated their account")
-        
-        # Invalidar el token actual (si usas un sistema de blacklist)
-        jti = get_jwt_identity()  # Obtener el identificador del token actual
-        
-        
-        # Aquí podrías agregar el jti a una blacklist si tienes un sistema implementado
-        
-        
+
         return jsonify({"msg": "Account deactivated. You have been logged out."}), 200
 
     
@@ -114,12 +130,14 @@ def update_user():
         logger.error(f"Validation errors: {errors}")
         return jsonify(errors), 400
 
+    if ('role' in data and data['role'] != user.role) or ('is_active' in data and bool(data['is_active']) != bool(user.is_active)):
+        authz.user_changed(user)
     for key, value in data.items():
         if hasattr(user, key):
             if key == 'id':
                 continue  # Nunca permitir actualizar el id
             if key == 'password':
-                value = generate_password_hash(value)
+                value = passwords.hash_password(value)
             setattr(user, key, value)
 
     db.session.commit()
@@ -142,12 +160,30 @@ def get_current_user():
     
     return jsonify(user_schema.dump(user)), 200
 
+@auth_bp.route('/refresh', methods=['POST'])
+@limit('refresh')
+@jwt_required(refresh=True)
+def refresh():
+    try:
+        user, pair = tokens.rotate(get_jwt())
+    except tokens.RefreshError as e:
+        # Confirmar la revocacion de la familia si hubo reuso
+        db.session.commit()
+        logger.error(f"Refresh rejected: {e}")
+        return jsonify({"msg": str(e)}), 401
+    db.session.commit()
+    return jsonify(pair), 200
+
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    # Invalidate the token (this is a placeholder, actual implementation may vary)
-    jti = get_jwt_identity()
-    # Here you would typically add the jti to a blacklist
+    # El jti queda en la blocklist hasta que el token venza
+    claims = get_jwt()
+    revocation.revoke_token(claims)
+    # y la familia de refresh tokens del login deja de renovar
+    if 'fam' in claims:
+        tokens.revoke_family(claims['fam'])
+    db.session.commit()
     return jsonify({"msg": "Successfully logged out"}), 200
 
 
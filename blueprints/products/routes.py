@@ -1,22 +1,23 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_jwt_extended import jwt_required
-from models import Product, db,Order,OrderItem,User,Roles, Category
-from schemas import ProductSchema,OrderItemSchema
+from models import Product, db,Order,OrderItem,User,Roles, Category, Comment
+from schemas import ProductSchema,OrderItemSchema,CommentSchema
 from flask_jwt_extended import get_jwt_identity
+from pagination import PaginationError, get_limit, keyset_paginate, page_response
+from search import SearchQueryError, index_products, reindex_products, remove_products, search_products
+from cache import product_cache, category_cache
+import etag
+from importer import ImportFormatError, ImportParseError, detect_format, import_products
+import exporter
+import ratings
+import catalog
+import inventory
+from authz import has_role
 
 
 product_bp = Blueprint('products', __name__)
 
 
-def has_role(required_roles):
-    user_id = get_jwt_identity()
-    user = db.session.get(User, user_id)
-    if not user:
-        return False
-    user_roles = user.role if isinstance(user.role, list) else [user.role]
-    
-    return any(role in required_roles for role in user_roles)
-
 # Endpoint test
 @product_bp.route('/test', methods=['GET'])
 def test():
@@ -26,29 +27,116 @@ def test():
 @product_bp.route('/products', methods=['GET'])
 @jwt_required()
 def get_products():
-    products = Product.query.all()
-    product_schema = ProductSchema(many=True)
-    return jsonify(product_schema.dump(products)), 200
+    return etag.conditional_response(['products'], _paginated_products)
   
 @product_bp.route('/products/<int:product_id>', methods=['GET'])
 @jwt_required()
 def get_product(product_id):
-    product = Product.query.get_or_404(product_id)
     product_schema = ProductSchema()
-    return jsonify(product_schema.dump(product)), 200
+
+    def render():
+        product = product_cache.get_or_load(
+            product_id, lambda: product_schema.dump(Product.query.get_or_404(product_id)),
+            version=etag.version(f'product:{product_id}'),
+        )
+        return jsonify(product), 200
+
+    return etag.conditional_response([f'product:{product_id}'], render)
+
+@product_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    if not has_role([Roles.ADMIN]):
+        return jsonify({"msg": "Access forbidden"}), 403
+    return jsonify({"products": product_cache.stats(), "categories": category_cache.stats()}), 200
 
 #get products by category
 @product_bp.route('/categories/<int:category>', methods=['GET'])
 @jwt_required()
 def get_products_by_category(category):
-    products = Product.query.filter_by(category_id=category).all()
+    return etag.conditional_response(
+        [f'category:{category}'],
+        lambda: _paginated_products(category_id=category),
+    )
+
+
+def _paginated_products(category_id=None):
+    try:
+        query = catalog.ProductQuery(request.args, category_id=category_id)
+        products, next_cursor = query.page(cursor=request.args.get('cursor'), limit=get_limit())
+    except (catalog.CatalogQueryError, PaginationError) as e:
+        return jsonify({"msg": str(e)}), 400
+
     product_schema = ProductSchema(many=True)
-    
-    if not products:
-        return []
-    
-    return jsonify(product_schema.dump(products)), 200
+    body = page_response(product_schema.dump(products), next_cursor)
+    if request.args.get('facets', '').lower() in ('1', 'true', 'yes'):
+        body["facets"] = query.facets()
+    return jsonify(body), 200
+
+#full-text search
+@product_bp.route('/search', methods=['GET'])
+@jwt_required()
+def search():
+    try:
+        products, next_cursor = search_products(
+            request.args.get('q'), cursor=request.args.get('cursor'), limit=get_limit()
+        )
+    except (SearchQueryError, PaginationError) as e:
+        return jsonify({"msg": str(e)}), 400
+
+    product_schema = ProductSchema(many=True)
+    return jsonify(page_response(product_schema.dump(products), next_cursor)), 200
   
+# Comentarios / calificaciones
+@product_bp.route('/products/<int:product_id>/comments', methods=['GET'])
+@jwt_required()
+def get_comments(product_id):
+    try:
+        comments, next_cursor = keyset_paginate(
+            Comment.query.filter_by(product_id=product_id), [Comment.id],
+            cursor=request.args.get('cursor'), limit=get_limit(), descending=True
+        )
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(page_response(CommentSchema(many=True).dump(comments), next_cursor)), 200
+
+@product_bp.route('/products/<int:product_id>/comments', methods=['POST'])
+@jwt_required()
+def create_comment(product_id):
+    if not db.session.get(Product, product_id):
+        return jsonify({"msg": "Product not found"}), 404
+
+    comment_schema = CommentSchema()
+    data = {**(request.get_json() or {}), "product_id": product_id, "user_id": int(get_jwt_identity())}
+    errors = comment_schema.validate(data)
+    if errors:
+        return jsonify(errors), 400
+
+    comment = comment_schema.load(data)
+    db.session.add(comment)
+    ratings.record_comment(comment)
+    db.session.commit()
+    product_cache.invalidate(product_id)
+
+    return jsonify(comment_schema.dump(comment)), 201
+
+@product_bp.route('/comments/<int:comment_id>', methods=['DELETE'])
+@jwt_required()
+def delete_comment(comment_id):
+    comment = db.session.get(Comment, comment_id)
+    if not comment:
+        return jsonify({"msg": "Comment not found"}), 404
+    if str(comment.user_id) != str(get_jwt_identity()) and not has_role([Roles.ADMIN]):
+        return jsonify({"msg": "Access forbidden"}), 403
+
+    product_id = comment.product_id
+    db.session.delete(comment)
+    ratings.forget_comment(comment)
+    db.session.commit()
+    product_cache.invalidate(product_id)
+
+    return jsonify({"msg": "Comment deleted successfully"}), 200
+
 # get orders by user as cart
 @product_bp.route('/orders/<int:id_user>', methods=['GET'])
 @jwt_required()
@@ -83,7 +171,13 @@ def create_product():
 
     product = product_schema.load(data)
     db.session.add(product)
+    db.session.flush()
+    index_products([product])
+    etag.bump(*etag.product_scopes(product.id, product.category_id))
+    catalog.touch_counts()
     db.session.commit()
+    product_cache.invalidate(product.id)
+    catalog.invalidate_counts()
 
     return jsonify(product_schema.dump(product)), 201
   except Exception as e:
@@ -91,6 +185,61 @@ def create_product():
     
     return jsonify({"msg": "Error creating product", "error": str(e)}), 500
   
+# Bulk import (CSV / NDJSON) en streaming
+@product_bp.route('/products/import', methods=['POST'])
+@jwt_required()
+def bulk_import_products():
+    if not has_role([Roles.ADMIN, Roles.SELLER]):
+        return jsonify({"msg": "Access forbidden"}), 403
+
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    stream = upload.stream if upload else request.stream
+    try:
+        fmt = detect_format(
+            request.args.get('format'),
+            upload.mimetype if upload else request.mimetype,
+            upload.filename if upload else None,
+        )
+    except ImportFormatError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    try:
+        report = import_products(
+            stream, fmt,
+            chunk_size=current_app.config.get('IMPORT_CHUNK_SIZE', 1000),
+            max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 1000),
+            on_chunk=lambda ids: (product_cache.invalidate(*ids), catalog.invalidate_counts()),
+        )
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"msg": "The file must be UTF-8 encoded"}), 400
+    except ImportParseError as e:
+        # Lo anterior a la linea ya quedo importado: se devuelve el reporte
+        return jsonify({"msg": str(e), "line": e.line, "report": e.report}), 400
+    return jsonify(report), 200
+
+# Export del catalogo en streaming (NDJSON / CSV)
+@product_bp.route('/products/export', methods=['GET'])
+@jwt_required()
+def export_catalog():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exporter.FORMATS:
+        return jsonify({"msg": f"Unsupported format '{fmt}', use one of {list(exporter.FORMATS)}"}), 400
+    try:
+        updated_since = exporter.parse_updated_since(request.args.get('updated_since'))
+    except exporter.ExportParamsError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    chunks = exporter.export_products(
+        fmt,
+        category_id=request.args.get('category_id', type=int),
+        updated_since=updated_since,
+        batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 1000),
+    )
+    response = Response(stream_with_context(chunks), mimetype=exporter.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{fmt}'
+    return response
+
 # Update an existing product
 @product_bp.route('/<int:product_id>', methods=['PATCH'])
 @jwt_required()
@@ -100,6 +249,8 @@ def update_product(product_id):
     return jsonify({"msg": "Access forbidden"}), 403
   
   product = Product.query.get_or_404(product_id)
+  previous_category_id = product.category_id
+  previous_counts_key = catalog.counts_key(product)
   product_schema = ProductSchema(partial=True)
   data = request.get_json()
 
@@ -108,7 +259,15 @@ def update_product(product_id):
       return jsonify(errors), 400
 
   product = product_schema.load(data, instance=product, partial=True)
+  index_products([product])
+  etag.bump(*etag.product_scopes(product_id, previous_category_id, product.category_id))
+  counts_changed = catalog.counts_key(product) != previous_counts_key
+  if counts_changed:
+    catalog.touch_counts()
   db.session.commit()
+  product_cache.invalidate(product_id)
+  if counts_changed:
+    catalog.invalidate_counts()
 
   return jsonify(product_schema.dump(product)), 200
 
@@ -122,7 +281,12 @@ def delete_product(product_id):
   
   product = db.session.get(Product,product_id)
   db.session.delete(product)
+  remove_products([product_id])
+  etag.bump(*etag.product_scopes(product_id, product.category_id))
+  catalog.touch_counts()
   db.session.commit()
+  product_cache.invalidate(product_id)
+  catalog.invalidate_counts()
 
   return jsonify({"msg": "Product deleted successfully"}), 200
 
@@ -143,26 +307,28 @@ def  add_order():
     if not product_id or not quantity:
       return jsonify({"msg": "Product ID and quantity are required"}), 400
 
-    product = Product.query.get(product_id)
-    if not product:
-      return jsonify({"msg": "Product not found"}), 404
-
-    if product.stock < quantity:
-      return jsonify({"msg": "Insufficient stock"}), 400
-    
     if not isinstance(quantity, int) or quantity <= 0:
       return jsonify({"msg": "Quantity must be a positive integer"}), 400
 
+    # Reserva atomica: UPDATE ... WHERE stock >= quantity
+    change = inventory.reserve_stock(product_id, quantity)
+    if change is None:
+      db.session.rollback()
+      if not db.session.get(Product, product_id):
+        return jsonify({"msg": "Product not found"}), 404
+      return jsonify({"msg": "Insufficient stock"}), 400
+
     #execute
-    order = Order(user_id=get_jwt_identity().get("id"))
+    order = Order(user_id=get_jwt_identity(), item_count=quantity, subtotal=quantity * change.price)
     db.session.add(order)
     db.session.flush()  # Flush to get the order ID
 
-    order_item = OrderItem(order_id=order.id, product_id=product_id, quantity=quantity)
+    order_item = OrderItem(order_id=order.id, product_id=product_id, quantity=quantity, unit_price=change.price,
+                           category_id=change.category_id)
     db.session.add(order_item)
 
-    product.stock -= quantity
     db.session.commit()
+    inventory.publish(change)
 
     return jsonify({"msg": "Order created successfully", "order_id": order.id}), 201
   
@@ -189,15 +355,16 @@ def create_category():
     # Crear la nueva categoría
     category = Category(name=name, description=description)
     db.session.add(category)
+    etag.bump('categories')
     db.session.commit()
+    catalog.invalidate_counts()
 
     return jsonify({"msg": "Category created successfully", "category": {"id": category.id, "name": category.name, "description": category.description}}), 201
     
 @product_bp.route('/categories', methods=['GET'])
 @jwt_required()
 def get_categories():
-    categories = Category.query.all()
-    return jsonify([{"id": category.id, "name": category.name, "description": category.description} for category in categories]), 200
+    return etag.conditional_response(['categories'], lambda: (jsonify(catalog.category_listing()), 200))
 
 
 @product_bp.route('/categories/<int:category_id>', methods=['DELETE'])
@@ -213,9 +380,17 @@ def delete_category(category_id):
         return jsonify({"msg": "Category not found"}), 404
 
     try:
-        # Eliminar la categoría
+        # Eliminar la categoría; sus productos quedan sin categoria
+        product_ids = [pid for (pid,) in db.session.query(Product.id).filter_by(category_id=category_id)]
         db.session.delete(category)
+        db.session.flush()
+        # El documento de busqueda incluye el nombre de la categoria
+        reindex_products(product_ids)
+        # Los productos que perdieron la categoria cambian de ETag y de cache
+        etag.bump('categories', f'category:{category_id}', 'products', *[f'product:{pid}' for pid in product_ids])
         db.session.commit()
+        product_cache.invalidate(*product_ids)
+        catalog.invalidate_counts()
         return jsonify({"msg": "Category deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
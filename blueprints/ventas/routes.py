@@ -1,21 +1,34 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime
+
+import click
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db,Order,OrderItem,Product
+from sqlalchemy import case, delete, update
+from sqlalchemy.orm import raiseload, selectinload
+from models import db,Order,OrderItem,Product,User,Roles,SalesRollup
 from schemas import OrderSchema,OrderItemSchema
+from pagination import PaginationError, get_limit, keyset_paginate, page_response
+import inventory
+import orders
+import analytics
+from idempotency import idempotent
+from authz import has_role
 
 ventas_bp = Blueprint("ventas", __name__)
 
+
 #1. Crear una nueva orden
 
 @ventas_bp.route('/orders', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_order():
     try:
         # Obtener el usuario actual
         user_id = get_jwt_identity()
 
         # Crear la nueva orden
-        order = Order(user_id=user_id, status='pending')
+        order = Order(user_id=user_id, status=orders.PENDING)
         db.session.add(order)
         db.session.commit()
 
@@ -26,22 +39,92 @@ def create_order():
         return jsonify({"msg": "Error creating order", "error": str(e)}), 500
 
 
-#2. Obtener todas las órdenes
+#2. Obtener las órdenes (paginadas, del usuario actual)
+
+
+def _parse_datetime(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise PaginationError(f"{name} must be an ISO 8601 datetime")
+
+
+# ?sort= -> (clave keyset, descendente). El id crece con created_at y es unico
+ORDER_SORTS = {
+    '-id': ([Order.id], True),
+    'id': ([Order.id], False),
+    'total': ([Order.subtotal, Order.id], False),
+    '-total': ([Order.subtotal, Order.id], True),
+}
+
 
 @ventas_bp.route('/orders', methods=['GET'])
 @jwt_required()
 def get_orders():
-    orders = Order.query.all()
+    """Ordenes del usuario, mas recientes primero.
+
+    Filtros: ?status=, ?created_after=, ?created_before=, ?min_total=,
+    ?max_total=; orden con ?sort= (-id, id, total, -total). Un admin puede ver
+    todas con ?all=true o las de otro usuario con ?user_id=.
+    """
+    sort = request.args.get('sort', '-id')
+    if sort not in ORDER_SORTS:
+        return jsonify({"msg": f"Invalid sort, use one of {list(ORDER_SORTS)}"}), 400
+
+    # Items con selectinload (una consulta por pagina); nada de lazy loads por fila
+    query = Order.query.options(selectinload(Order.order_items), raiseload('*'))
+    scope_all = request.args.get('all', '').lower() in ('1', 'true', 'yes')
+    user_id = request.args.get('user_id', type=int)
+    if scope_all or user_id is not None:
+        if not has_role([Roles.ADMIN]):
+            return jsonify({"msg": "Access denied"}), 403
+        if user_id is not None:
+            query = query.filter(Order.user_id == user_id)
+    else:
+        query = query.filter(Order.user_id == int(get_jwt_identity()))
+
+    try:
+        status = request.args.get('status')
+        if status:
+            query = query.filter(Order.status == status)
+        created_after = _parse_datetime('created_after')
+        if created_after is not None:
+            query = query.filter(Order.created_at >= created_after)
+        created_before = _parse_datetime('created_before')
+        if created_before is not None:
+            query = query.filter(Order.created_at < created_before)
+        min_total = request.args.get('min_total', type=float)
+        if min_total is not None:
+            query = query.filter(Order.subtotal >= min_total)
+        max_total = request.args.get('max_total', type=float)
+        if max_total is not None:
+            query = query.filter(Order.subtotal <= max_total)
+
+        columns, descending = ORDER_SORTS[sort]
+        page, next_cursor = keyset_paginate(
+            query, columns, cursor=request.args.get('cursor'), limit=get_limit(), descending=descending
+        )
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+
     order_schema = OrderSchema(many=True)
-    return jsonify(order_schema.dump(orders)), 200
+    return jsonify(page_response(order_schema.dump(page), next_cursor)), 200
+
+def _visible(order):
+    """Solo el dueño o el staff ven la orden; para el resto responde 404."""
+    return str(order.user_id) == str(get_jwt_identity()) or has_role([Roles.ADMIN, Roles.SELLER])
+
 
 #3. Obtener una orden específica  
  
 @ventas_bp.route('/orders/<int:order_id>', methods=['GET'])
 @jwt_required()
 def get_order(order_id):
-    order = Order.query.get(order_id)
-    if not order:
+    order = db.session.get(Order, order_id, options=[selectinload(Order.order_items)])
+    if not order or not _visible(order):
         return jsonify({"msg": "Order not found"}), 404
 
     order_schema = OrderSchema()
@@ -62,9 +145,28 @@ def update_order(order_id):
         data = request.get_json()
         status = data.get('status')
 
-        # Validar el estado
+        # Solo el dueño o el staff ven la orden
+        is_owner = str(order.user_id) == str(get_jwt_identity())
+        is_staff = has_role([Roles.ADMIN, Roles.SELLER])
+        if not is_owner and not is_staff:
+            return jsonify({"msg": "Order not found"}), 404
+
+        # Validar el estado y la transicion; los efectos quedan encolados
         if status:
-            order.status = status
+            if status not in orders.STATUSES:
+                return jsonify({"msg": f"Invalid status, use one of {list(orders.STATUSES)}"}), 400
+            # Pagar/enviar/entregar es del staff; cancelar, del dueño o un admin
+            if status == orders.CANCELLED:
+                allowed = is_owner or has_role([Roles.ADMIN])
+            else:
+                allowed = is_staff
+            if not allowed:
+                return jsonify({"msg": "Permission denied"}), 403
+            try:
+                orders.transition(order, status)
+            except orders.OrderTransitionError as e:
+                db.session.rollback()
+                return jsonify({"msg": str(e)}), 409
 
         db.session.commit()
 
@@ -84,9 +186,18 @@ def delete_order(order_id):
         order = Order.query.get(order_id)
         if not order:
             return jsonify({"msg": "Order not found"}), 404
+        if str(order.user_id) != str(get_jwt_identity()) and not has_role([Roles.ADMIN]):
+            return jsonify({"msg": "Order not found"}), 404
 
+        analytics.order_deleted(order)
+        # Una orden pending tiene stock reservado: vuelve al inventario
+        changes = []
+        if order.status == orders.PENDING:
+            changes = inventory.release_many(orders.order_quantities([order.id]))
+        db.session.execute(delete(OrderItem).where(OrderItem.order_id == order.id))
         db.session.delete(order)
         db.session.commit()
+        inventory.publish(*changes)
         return jsonify({"msg": "Order deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -97,11 +208,14 @@ def delete_order(order_id):
 
 @ventas_bp.route('/orders/<int:order_id>/items', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_order_item(order_id):
     try:
         order = Order.query.get(order_id)
-        if not order:
+        if not order or not _visible(order):
             return jsonify({"msg": "Order not found"}), 404
+        if order.status != orders.PENDING:
+            return jsonify({"msg": "Only pending orders can be modified"}), 409
 
         # Obtener los datos del cuerpo de la solicitud
         data = request.get_json()
@@ -109,32 +223,43 @@ def add_order_item(order_id):
         quantity = data.get('quantity')
 
         # Validar los datos
-        if not product_id or not quantity or quantity <= 0:
+        if not product_id or not isinstance(quantity, int) or quantity <= 0:
             return jsonify({"msg": "Invalid product or quantity"}), 400
 
-        # Verificar si el producto existe
-        product = Product.query.get(product_id)
-        if not product:
-            return jsonify({"msg": "Product not found"}), 404
-
-        # Verificar si hay suficiente stock
-        if product.stock < quantity:
+        # Reservar el stock de forma atomica (UPDATE ... WHERE stock >= quantity)
+        change = inventory.reserve_stock(product_id, quantity)
+        if change is None:
+            db.session.rollback()
+            if not db.session.get(Product, product_id):
+                return jsonify({"msg": "Product not found"}), 404
             return jsonify({"msg": "Insufficient stock"}), 400
 
         # Verificar si el producto ya está en la orden
         order_item = OrderItem.query.filter_by(order_id=order_id, product_id=product_id).first()
         if order_item:
-            # Si ya existe, aumentar la cantidad
-            order_item.quantity += quantity
+            # Si ya existe, aumentar la cantidad (al precio capturado en la linea)
+            # con un UPDATE relativo, como el stock y los totales
+            db.session.execute(
+                update(OrderItem)
+                .where(OrderItem.id == order_item.id)
+                .values(quantity=OrderItem.quantity + quantity)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.expire(order_item, ['quantity'])
         else:
-            # Si no existe, crear un nuevo ítem
-            order_item = OrderItem(order_id=order_id, product_id=product_id, quantity=quantity)
+            # Si no existe, crear un nuevo ítem con el precio actual
+            order_item = OrderItem(order_id=order_id, product_id=product_id, quantity=quantity,
+                                   unit_price=change.price, category_id=change.category_id)
             db.session.add(order_item)
-
-        # Reducir el stock del producto
-        product.stock -= quantity
+        try:
+            orders.adjust_totals(order_id, quantity, quantity * order_item.unit_price)
+        except orders.OrderTransitionError as e:
+            # La orden se cerro mientras tanto: tambien se deshace la reserva
+            db.session.rollback()
+            return jsonify({"msg": str(e)}), 409
 
         db.session.commit()
+        inventory.publish(change)
 
         order_item_schema = OrderItemSchema()
         return jsonify({"msg": "Order item added successfully", "order_item": order_item_schema.dump(order_item)}), 201
@@ -142,6 +267,123 @@ def add_order_item(order_id):
         db.session.rollback()
         return jsonify({"msg": "Error adding order item", "error": str(e)}), 500
 
+#6b. Agregar varios ítems a una orden en una sola llamada
+
+
+def _parse_batch(lines):
+    """Valida las lineas y agrupa cantidades por producto (en orden de llegada)."""
+    results = []
+    quantities = {}
+    for line in lines:
+        product_id = line.get('product_id') if isinstance(line, dict) else None
+        quantity = line.get('quantity') if isinstance(line, dict) else None
+        valid = (
+            isinstance(product_id, int) and not isinstance(product_id, bool) and product_id > 0
+            and isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+        )
+        results.append({"product_id": product_id, "quantity": quantity, "status": "ok" if valid else "invalid"})
+        if valid:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return results, quantities
+
+
+@ventas_bp.route('/orders/<int:order_id>/items/batch', methods=['POST'])
+@jwt_required()
+@idempotent
+def add_order_items(order_id):
+    """Agrega {product_id, quantity} en lote: todo o nada.
+
+    Numero fijo de consultas sin importar el tamaño del carrito: orden,
+    productos (IN), reserva de stock (un UPDATE), items existentes (IN) y el flush.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        lines = data.get('items')
+        max_items = current_app.config.get('ORDER_BATCH_MAX_ITEMS', 100)
+        if not isinstance(lines, list) or not lines:
+            return jsonify({"msg": "items must be a non-empty list"}), 400
+        if len(lines) > max_items:
+            return jsonify({"msg": f"At most {max_items} items per batch"}), 400
+
+        order = db.session.get(Order, order_id)
+        if not order or not _visible(order):
+            return jsonify({"msg": "Order not found"}), 404
+        if order.status != orders.PENDING:
+            return jsonify({"msg": "Only pending orders can be modified"}), 409
+
+        results, quantities = _parse_batch(lines)
+        found = set(db.session.scalars(db.select(Product.id).where(Product.id.in_(list(quantities)))))
+        for result in results:
+            if result["status"] == "ok" and result["product_id"] not in found:
+                result["status"] = "not_found"
+
+        # Reserva atomica de todas las lineas (un solo UPDATE condicional)
+        short = []
+        changes = []
+        if all(r["status"] == "ok" for r in results):
+            changes, short = inventory.reserve_many(quantities)
+            for result in results:
+                if result["product_id"] in short:
+                    result["status"] = "insufficient_stock"
+
+        if short or any(r["status"] != "ok" for r in results):
+            db.session.rollback()
+            for result in results:
+                if result["status"] == "ok":
+                    result["status"] = "skipped"
+            return jsonify({"msg": "No items were added", "items": results}), 400
+
+        in_order = OrderItem.query.filter(
+            OrderItem.order_id == order_id, OrderItem.product_id.in_(list(quantities))
+        )
+        existing = {item.product_id: item for item in in_order}
+        prices = {change.product_id: change.price for change in changes}
+        categories = {change.product_id: change.category_id for change in changes}
+        new_items = []
+        increments = {}
+        amount = 0
+        for product_id, quantity in quantities.items():
+            if product_id in existing:
+                increments[product_id] = quantity
+                amount += quantity * existing[product_id].unit_price
+            else:
+                new_items.append({"order_id": order_id, "product_id": product_id, "quantity": quantity,
+                                  "unit_price": prices[product_id], "category_id": categories[product_id]})
+                amount += quantity * prices[product_id]
+        if increments:
+            # UPDATE relativo: dos altas concurrentes del mismo producto suman las dos
+            db.session.execute(
+                update(OrderItem)
+                .where(OrderItem.order_id == order_id, OrderItem.product_id.in_(list(increments)))
+                .values(quantity=OrderItem.quantity + case(increments, value=OrderItem.product_id))
+                .execution_options(synchronize_session=False)
+            )
+        if new_items:
+            # INSERT en bloque (executemany), sin ida y vuelta por fila
+            db.session.execute(db.insert(OrderItem), new_items)
+        try:
+            orders.adjust_totals(order_id, sum(quantities.values()), amount)
+        except orders.OrderTransitionError as e:
+            # La orden se cerro mientras tanto: tambien se deshace la reserva
+            db.session.rollback()
+            return jsonify({"msg": str(e)}), 409
+
+        db.session.commit()
+        inventory.publish(*changes)
+
+        # Una sola consulta para devolver los items ya actualizados
+        order_items = in_order.order_by(OrderItem.id).all()
+
+        order_item_schema = OrderItemSchema(many=True)
+        return jsonify({
+            "msg": "Order items added successfully",
+            "items": results,
+            "order_items": order_item_schema.dump(order_items),
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": "Error adding order items", "error": str(e)}), 500
+
 #7. Eliminar un ítem de una orden
 
       
@@ -150,14 +392,135 @@ def add_order_item(order_id):
 def delete_order_item(order_id, item_id):
     try:
         order_item = OrderItem.query.filter_by(order_id=order_id, id=item_id).first()
-        if not order_item:
+        if not order_item or not _visible(order_item.order):
             return jsonify({"msg": "Order item not found"}), 404
+        if order_item.order.status != orders.PENDING:
+            return jsonify({"msg": "Only pending orders can be modified"}), 409
 
+        # El stock reservado vuelve al inventario en la misma transaccion
+        change = inventory.release_stock(order_item.product_id, order_item.quantity)
+        try:
+            orders.adjust_totals(order_id, -order_item.quantity, -order_item.quantity * order_item.unit_price)
+        except orders.OrderTransitionError as e:
+            # La orden se cerro mientras tanto: el stock ya lo libera el cierre
+            db.session.rollback()
+            return jsonify({"msg": str(e)}), 409
         db.session.delete(order_item)
         db.session.commit()
+        inventory.publish(change)
         return jsonify({"msg": "Order item deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"msg": "Error deleting order item", "error": str(e)}), 500
       
+#8. Carrito del usuario
+
+
+@ventas_bp.route('/cart', methods=['GET'])
+@jwt_required()
+def get_cart():
+    """Orden pending del usuario con nombre, precio, stock y total por linea."""
+    order, lines = orders.open_cart(int(get_jwt_identity()))
+    if order is None:
+        return jsonify({"order": None, "items": []}), 200
+    order_schema = OrderSchema(exclude=('order_items',))
+    return jsonify({"order": order_schema.dump(order), "items": lines}), 200
+
+
+@ventas_bp.route('/cart/history', methods=['GET'])
+@jwt_required()
+def get_cart_history():
+    """Ordenes pasadas (no pending) del usuario, paginadas, con sus lineas."""
+    query = Order.query.options(raiseload('*')).filter(
+        Order.user_id == int(get_jwt_identity()), Order.status.in_(orders.PAST_STATUSES)
+    )
+    try:
+        page, next_cursor = keyset_paginate(
+            query, [Order.id], cursor=request.args.get('cursor'), limit=get_limit(), descending=True
+        )
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    lines = orders.lines_by_order([order.id for order in page])
+    order_schema = OrderSchema(exclude=('order_items',))
+    items = [dict(order_schema.dump(order), items=lines[order.id]) for order in page]
+    return jsonify(page_response(items, next_cursor)), 200
+
+#9. Reportes de ventas (solo leen los rollups de analytics)
+
+
+def _report_args():
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in analytics.GRANULARITIES:
+        raise PaginationError(f"granularity must be one of {list(analytics.GRANULARITIES)}")
+    return granularity, _parse_datetime('from'), _parse_datetime('to')
+
+
+@ventas_bp.route('/reports/sales', methods=['GET'])
+@jwt_required()
+def sales_report():
+    """Serie temporal: ?granularity=hour|day, ?scope=total|product|category,
+    ?scope_id=, ?from=, ?to= (ISO 8601), paginada por bucket."""
+    if not has_role([Roles.ADMIN]):
+        return jsonify({"msg": "Access denied"}), 403
+    scope = request.args.get('scope', 'total')
+    if scope not in analytics.SCOPES:
+        return jsonify({"msg": f"scope must be one of {list(analytics.SCOPES)}"}), 400
+    scope_id = request.args.get('scope_id', 0, type=int)
+    if scope != 'total' and not scope_id:
+        return jsonify({"msg": "scope_id is required"}), 400
+
+    try:
+        granularity, start, end = _report_args()
+        query = analytics.sales_series(granularity, scope, scope_id if scope != 'total' else 0, start, end)
+        rows, next_cursor = keyset_paginate(
+            query, [SalesRollup.bucket], cursor=request.args.get('cursor'), limit=get_limit()
+        )
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    items = [
+        {"bucket": r.bucket.isoformat(), "revenue": r.revenue, "units": r.units, "orders": r.orders}
+        for r in rows
+    ]
+    return jsonify(page_response(items, next_cursor)), 200
+
+
+@ventas_bp.route('/reports/top/<scope>', methods=['GET'])
+@jwt_required()
+def top_report(scope):
+    """Top de productos o categorias: ?metric=revenue|units|orders, ?from=, ?to=, ?limit=."""
+    if not has_role([Roles.ADMIN]):
+        return jsonify({"msg": "Access denied"}), 403
+    if scope not in ('product', 'category'):
+        return jsonify({"msg": "scope must be product or category"}), 400
+    metric = request.args.get('metric', 'revenue')
+    if metric not in analytics.METRICS:
+        return jsonify({"msg": f"metric must be one of {list(analytics.METRICS)}"}), 400
+
+    try:
+        granularity, start, end = _report_args()
+        limit = get_limit()
+    except PaginationError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify({"items": analytics.top(scope, metric, granularity, start, end, limit)}), 200
+
+
+@ventas_bp.cli.command('backfill-rollups')
+@click.option('--batch-size', default=500, show_default=True, help='Ordenes por lote.')
+@click.option('--restart', is_flag=True, help='Empieza de cero aunque haya un backfill a medias.')
+def backfill_rollups(batch_size, restart):
+    """Reconstruye los rollups de ventas (reanudable: flask ventas backfill-rollups)."""
+    processed = analytics.backfill(
+        batch_size=batch_size, restart=restart,
+        on_batch=lambda last, target: click.echo(f"  orders up to {last}/{target}"),
+    )
+    click.echo(f"Backfilled {processed} orders")
+
+@ventas_bp.cli.command('sweep-orders')
+@click.option('--batch-size', type=int, default=None, help='Ordenes por lote (default ORDER_SWEEP_BATCH_SIZE).')
+def sweep_orders(batch_size):
+    """Expira ordenes pending abandonadas y devuelve su stock."""
+    click.echo(f"Expired {orders.sweep_expired(batch_size=batch_size)} orders")
+
 blueprint = ventas_bp
\ No newline at end of file
@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class CacheBackend:
+    """Interfaz minima que debe cumplir un backend de cache."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def add(self, key, value, ttl=None):
+        """Guarda solo si la clave no existe (atomico). True si la guardo."""
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class CacheFull(RuntimeError):
+    """Cache sin expulsion llena de entradas vigentes: no se guarda la clave."""
+
+
+class LRUCache(CacheBackend):
+    """Cache en proceso con expulsion LRU y expiracion por TTL (thread-safe).
+
+    Con `evict=False` nunca descarta una entrada antes de su TTL: lleno, solo
+    libera las vencidas y si no alcanza una clave nueva levanta CacheFull.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic, evict=True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evict = evict
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Antes de este instante no hay nada vencido que purgar
+        self._purge_at = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl else None
+        with self._lock:
+            self._store(key, value, expires_at)
+
+    def add(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                return False
+            self._store(key, value, now + ttl if ttl else None)
+            return True
+
+    def _store(self, key, value, expires_at):
+        if not self.evict and key not in self._data and len(self._data) >= self.maxsize:
+            self._purge_expired()
+            if len(self._data) >= self.maxsize:
+                raise CacheFull(f"cache full ({self.maxsize} live entries)")
+        if expires_at is not None and expires_at < self._purge_at:
+            self._purge_at = expires_at
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _purge_expired(self):
+        now = self._clock()
+        if now < self._purge_at:
+            return
+        # Los TTL varian por entrada: se recorre todo, a lo sumo una vez
+        # hasta que venza la proxima
+        next_expiry = None
+        for key, (expires_at, _) in list(self._data.items()):
+            if expires_at is None:
+                continue
+            if expires_at <= now:
+                del self._data[key]
+            elif next_expiry is None or expires_at < next_expiry:
+                next_expiry = expires_at
+        self._purge_at = next_expiry if next_expiry is not None else float('inf')
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """Backend para cualquier cliente compatible con Redis (get/set/delete/scan_iter).
+
+    Los valores se guardan como JSON bajo `prefix + key`.
+    """
+
+    def __init__(self, client, prefix='cache:', ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self._key(key), json.dumps(value), ex=ttl or None)
+
+    def add(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        return bool(self.client.set(self._key(key), json.dumps(value), ex=ttl or None, nx=True))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self._key(k) for k in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_backend(config, name, ttl=None, maxsize=None, evict=True):
+    kind = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_TTL', 300) if ttl is None else ttl
+    if kind == 'memory':
+        return LRUCache(maxsize=maxsize or config.get('CACHE_MAXSIZE', 1024), ttl=ttl, evict=evict)
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' requires the redis package")
+        client = redis.Redis.from_url(config['CACHE_REDIS_URL'])
+        return RedisCache(client, prefix=f"{name}:", ttl=ttl)
+    raise RuntimeError(f"Unknown CACHE_BACKEND: {kind}")
+
+
+class CacheRegion:
+    """Cache con nombre propio, un backend por app y contadores de hit/miss."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def init_app(self, app, backend=None):
+        app.extensions.setdefault('cache', {})[self.name] = {
+            "backend": backend if backend is not None else make_backend(app.config, self.name),
+            "hits": 0,
+            "misses": 0,
+            "lock": threading.Lock(),
+        }
+
+    def _state(self):
+        return current_app.extensions['cache'][self.name]
+
+    @property
+    def backend(self):
+        return self._state()["backend"]
+
+    def _count(self, counter):
+        state = self._state()
+        with state["lock"]:
+            state[counter] += 1
+
+    def get_or_load(self, key, loader, version=None):
+        """Devuelve el valor cacheado o lo calcula con `loader()` y lo guarda.
+
+        Con `version` (p.ej. la del ETag) la entrada se guarda con ella y una
+        de otra version cuenta como miss: con el backend en memoria cada
+        proceso tiene su cache pero la version es compartida, y asi nunca se
+        sirve un cuerpo viejo con un ETag nuevo.
+        """
+        entry = self.backend.get(key)
+        if entry is not None and (version is None or entry[0] == version):
+            self._count("hits")
+            return entry if version is None else entry[1]
+        self._count("misses")
+        value = loader()
+        if value is not None:
+            self.backend.set(key, value if version is None else [version, value])
+        return value
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        state = self._state()
+        total = state["hits"] + state["misses"]
+        return {
+            "hits": state["hits"],
+            "misses": state["misses"],
+            "hit_ratio": state["hits"] / total if total else 0.0,
+        }
+
+
+product_cache = CacheRegion('products')
+category_cache = CacheRegion('categories')
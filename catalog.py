@@ -0,0 +1,188 @@
+from flask import current_app
+from sqlalchemy import and_, case, func, select
+
+from models import db, Product, Category
+from cache import category_cache
+from pagination import keyset_paginate
+import etag
+
+LISTING_KEY = 'listing'
+_TRUE = ('1', 'true', 'yes')
+_FALSE = ('0', 'false', 'no')
+
+
+class CatalogQueryError(ValueError):
+    pass
+
+
+class ProductQuery:
+    """Filtros, orden y facetas del catalogo a partir de los query args.
+
+    Cada orden (id, price, created_at, rating), global o dentro de una
+    categoria, tiene su indice compuesto en models.Product, asi que la pagina
+    se resuelve con un range scan sobre el indice; is_active y los rangos se
+    filtran sobre el mismo recorrido (en SQLite el orden por created_at se
+    compara normalizado, ver pagination.sqlite_datetime).
+    """
+
+    # ?sort= -> (columnas de la clave keyset, descendente)
+    SORTS = {
+        'id': ([Product.id], False),
+        'price': ([Product.price, Product.id], False),
+        '-price': ([Product.price, Product.id], True),
+        'created_at': ([Product.created_at, Product.id], False),
+        '-created_at': ([Product.created_at, Product.id], True),
+        'rating': ([Product.rating_avg, Product.id], True),
+    }
+
+    def __init__(self, args, category_id=None):
+        self.sort = args.get('sort', 'id')
+        if self.sort not in self.SORTS:
+            raise CatalogQueryError(f"Invalid sort, use one of {list(self.SORTS)}")
+        self.category_id = category_id if category_id is not None else _int(args, 'category_id')
+        self.min_price = _float(args, 'min_price')
+        self.max_price = _float(args, 'max_price')
+        self.min_rating = _float(args, 'min_rating')
+        self.is_active = _bool(args, 'is_active')
+        self.in_stock = _bool(args, 'in_stock')
+
+    def filtered(self, exclude=()):
+        """Query con los filtros aplicados, salvo los nombrados en exclude."""
+        query = Product.query
+        if self.category_id is not None and 'category' not in exclude:
+            query = query.filter(Product.category_id == self.category_id)
+        if self.is_active is not None:
+            query = query.filter(Product.is_active == self.is_active)
+        if 'price' not in exclude:
+            if self.min_price is not None:
+                query = query.filter(Product.price >= self.min_price)
+            if self.max_price is not None:
+                query = query.filter(Product.price <= self.max_price)
+        if self.min_rating is not None:
+            query = query.filter(Product.rating_avg >= self.min_rating)
+        if self.in_stock:
+            query = query.filter(Product.stock > 0)
+        elif self.in_stock is False:
+            query = query.filter(Product.stock <= 0)
+        return query
+
+    def page(self, cursor=None, limit=50):
+        columns, descending = self.SORTS[self.sort]
+        return keyset_paginate(self.filtered(), columns, cursor=cursor, limit=limit, descending=descending)
+
+    def facets(self):
+        """Conteos por categoria y por rango de precio.
+
+        Cada faceta ignora su propio filtro (como es habitual en busqueda facetada)
+        y se resuelve con una consulta agrupada.
+        """
+        by_category = (
+            self.filtered(exclude=('category',))
+            .with_entities(Product.category_id, func.count(Product.id))
+            .group_by(Product.category_id)
+            .order_by(Product.category_id)
+            .all()
+        )
+
+        bounds = current_app.config.get('CATALOG_PRICE_BUCKETS', [0, 10, 25, 50, 100, 250, 500, 1000])
+        bucket = case(
+            *[(Product.price < upper, index) for index, upper in enumerate(bounds[1:])],
+            else_=len(bounds) - 1,
+        )
+        counts = dict(
+            self.filtered(exclude=('price',))
+            .with_entities(bucket, func.count(Product.id))
+            .group_by(bucket)
+            .all()
+        )
+        price = [
+            {
+                "min": lower,
+                "max": bounds[index + 1] if index + 1 < len(bounds) else None,
+                "count": counts.get(index, 0),
+            }
+            for index, lower in enumerate(bounds)
+        ]
+        return {
+            "categories": [{"id": cid, "count": count} for cid, count in by_category],
+            "price": price,
+        }
+
+
+def _int(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise CatalogQueryError(f"{name} must be an integer")
+
+
+def _float(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise CatalogQueryError(f"{name} must be a number")
+
+
+def _bool(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    value = value.lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise CatalogQueryError(f"{name} must be true or false")
+
+
+def category_listing():
+    """Categorias con conteo de productos, servidas desde category_cache."""
+    return category_cache.get_or_load(LISTING_KEY, _load_listing, version=etag.version('categories'))
+
+
+def _load_listing():
+    # Una sola consulta agrupada en lugar de un dump de productos por categoria
+    active = Product.is_active.is_(True)
+    stmt = (
+        select(
+            Category.id,
+            Category.name,
+            Category.description,
+            func.count(Product.id).label('total'),
+            func.coalesce(func.sum(case((active, 1), else_=0)), 0).label('active'),
+            func.coalesce(func.sum(case((and_(active, Product.stock > 0), 1), else_=0)), 0).label('in_stock'),
+        )
+        .outerjoin(Product, Product.category_id == Category.id)
+        .group_by(Category.id, Category.name, Category.description)
+        .order_by(Category.id)
+    )
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "product_count": {"total": row.total, "active": row.active, "in_stock": row.in_stock},
+        }
+        for row in db.session.execute(stmt)
+    ]
+
+
+def counts_key(product):
+    """Lo que del producto afecta los conteos: si cambia, hay que invalidar."""
+    return (product.category_id, bool(product.is_active), (product.stock or 0) > 0)
+
+
+def touch_counts():
+    # Dentro de la transaccion: el listado de categorias cambia de ETag
+    etag.bump('categories')
+
+
+def invalidate_counts():
+    # Despues del commit
+    category_cache.invalidate(LISTING_KEY)
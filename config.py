@@ -10,6 +10,75 @@ class Config:
     JWT_SECRET = os.getenv('JWT_SECRET')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)  # 1 hour
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)  # 7 days
+    # Paginacion por cursor
+    PAGINATION_DEFAULT_LIMIT = 50
+    PAGINATION_MAX_LIMIT = 200
+    # Cache de lectura (memory | redis)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+    CACHE_TTL = 300  # segundos
+    CACHE_MAXSIZE = 1024
+    # Cache-Control max-age de las respuestas con ETag del catalogo
+    CATALOG_CACHE_MAX_AGE = 0
+    # Limites inferiores de los rangos de precio de la faceta (el ultimo es abierto)
+    CATALOG_PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+    # Importacion masiva de productos
+    IMPORT_CHUNK_SIZE = 1000
+    IMPORT_MAX_ERRORS = 1000
+    EXPORT_BATCH_SIZE = 1000
+    # Ordenes
+    ORDER_BATCH_MAX_ITEMS = 100
+    # Codigos PROD-<n> que cada proceso reserva de una vez (fuera de SQLite)
+    ID_CODE_BLOCK_SIZE = 100
+    # Idempotency-Key: respuestas guardadas en el backend de CACHE_BACKEND
+    IDEMPOTENCY_TTL = 24 * 3600  # segundos que se puede repetir una request
+    IDEMPOTENCY_LOCK_TTL = 60  # vida de una clave "en curso" si el proceso muere
+    IDEMPOTENCY_WAIT = 10  # segundos que un duplicado espera a la primera ejecucion
+    IDEMPOTENCY_MAXSIZE = 100000  # claves vigentes en memoria; lleno responde 503
+    # Procesos del servidor (gunicorn lee la misma variable)
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    # Cola de jobs en la base y pool de workers en proceso
+    JOBS_WORKER_ENABLED = True
+    JOBS_WORKERS = 4
+    JOBS_BATCH_SIZE = 10
+    JOBS_POLL_INTERVAL = 1.0  # segundos sin trabajo entre consultas
+    JOBS_LEASE = 60  # segundos antes de que otro worker retome un job
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_RETENTION = timedelta(days=7)
+    JOBS_PURGE_INTERVAL = 3600
+    # Reservas de stock: ordenes pending sin actividad durante el TTL expiran
+    ORDER_RESERVATION_TTL = timedelta(minutes=30)
+    ORDER_SWEEP_INTERVAL = 60  # segundos entre barridos
+    ORDER_SWEEP_BATCH_SIZE = 100
+    # Revocacion de tokens (memory | sql | redis) con filtro de Bloom por worker
+    REVOCATION_STORE = os.getenv('REVOCATION_STORE', 'sql')
+    REVOCATION_REDIS_URL = os.getenv('REVOCATION_REDIS_URL')
+    REVOCATION_SYNC_INTERVAL = 2.0  # segundos que tarda en verse una revocacion de otro worker
+    REVOCATION_REBUILD_INTERVAL = 3600
+    REVOCATION_PURGE_INTERVAL = 3600
+    REVOCATION_BLOOM_CAPACITY = 100000
+    REVOCATION_BLOOM_ERROR_RATE = 0.001
+    # Fallback de autorizacion para tokens sin claims de rol
+    AUTHZ_CACHE_TTL = 30  # segundos
+    AUTHZ_CACHE_MAXSIZE = 10000
+    REFRESH_PURGE_INTERVAL = 3600  # borra refresh tokens vencidos
+    # Hashing de contraseñas: metodo de werkzeug y pool de procesos acotado
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_SALT_LENGTH = 16
+    PASSWORD_HASH_WORKERS = None  # None = os.cpu_count(); 0 = en linea
+    PASSWORD_HASH_MAX_PENDING = None  # None = 4 por worker; pasado esto responde 503
+    PASSWORD_HASH_TIMEOUT = 10  # segundos
+    # Rate limiting por ventana deslizante (memory | redis)
+    RATELIMIT_ENABLED = True
+    RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL')
+    RATELIMIT_MAXSIZE = 100000  # claves en memoria antes de expulsar las inactivas
+    # nombre -> [(clave, requests, ventana en segundos)]
+    RATELIMIT_RULES = {
+        'login': [('ip', 20, 60), ('email', 5, 60)],
+        'register': [('ip', 10, 3600)],
+        'refresh': [('ip', 60, 60)],
+    }
     
 class Development(Config):
     DEBUG = True
@@ -18,6 +87,9 @@ class Development(Config):
 class Testing(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # Los tests corren la cola a mano con jobs.run_pending()
+    JOBS_WORKER_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
     # Use an in-memory database for testing
     
 class Production(Config):
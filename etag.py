@@ -0,0 +1,74 @@
+import hashlib
+
+from flask import current_app, g, make_response, request
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, CatalogVersion
+
+_UPSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def product_scopes(product_id, *category_ids):
+    """Scopes afectados cuando cambia un producto (incluye su(s) categoria(s))."""
+    scopes = ['products', f'product:{product_id}']
+    scopes += [f'category:{cid}' for cid in set(category_ids) if cid is not None]
+    return scopes
+
+
+def bump(*scopes):
+    """Incrementa la version de cada scope dentro de la transaccion actual."""
+    if not scopes:
+        return
+    table = CatalogVersion.__table__
+    dialect = db.session.get_bind().dialect.name
+    insert = _UPSERTS[dialect]
+    stmt = insert(table).on_conflict_do_update(
+        index_elements=[table.c.scope],
+        set_={"version": table.c.version + 1, "updated_at": db.func.now()},
+    )
+    db.session.execute(stmt, [{"scope": s, "version": 1} for s in sorted(set(scopes))])
+
+
+def current_versions(scopes):
+    rows = db.session.query(CatalogVersion.scope, CatalogVersion.version) \
+        .filter(CatalogVersion.scope.in_(scopes)).all()
+    versions = dict(rows)
+    return [versions.get(s, 0) for s in scopes]
+
+
+def version(scope):
+    """Version del scope, la misma que uso el ETag de esta request si ya se calculo."""
+    versions = g.get('catalog_versions', {})
+    if scope not in versions:
+        return current_versions([scope])[0]
+    return versions[scope]
+
+
+def compute_etag(scopes):
+    versions = current_versions(scopes)
+    g.catalog_versions = dict(zip(scopes, versions))
+    key = f"{request.full_path}|" + "|".join(f"{s}={v}" for s, v in zip(scopes, versions))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def conditional_response(scopes, render):
+    """Responde 304 si el If-None-Match coincide; si no, llama a render().
+
+    El ETag se deriva solo de los contadores de version (una consulta por PK/indice
+    unico), asi que una coleccion sin cambios no se consulta ni se serializa.
+    """
+    etag = compute_etag(scopes)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(etag)
+    max_age = current_app.config.get('CATALOG_CACHE_MAX_AGE', 0)
+    response.headers['Cache-Control'] = f"private, max-age={max_age}, must-revalidate"
+    return response
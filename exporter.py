@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from models import db, Product
+from pagination import sqlite_datetime
+from schemas import RATING_FIELDS
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# Columnas de ProductSchema; del resumen de calificaciones solo promedio y conteo
+FIELDS = [
+    c.key for c in Product.__table__.columns
+    if c.key not in RATING_FIELDS or c.key in ('rating_avg', 'rating_count')
+]
+
+
+class ExportParamsError(ValueError):
+    pass
+
+
+def parse_updated_since(value):
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportParamsError("updated_since must be an ISO 8601 datetime")
+    # updated_at se guarda en UTC sin zona
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _statement(category_id=None, updated_since=None):
+    stmt = select(*[Product.__table__.c[f] for f in FIELDS]).order_by(Product.id)
+    if category_id is not None:
+        stmt = stmt.where(Product.category_id == category_id)
+    if updated_since is not None:
+        if db.session.get_bind().dialect.name == 'sqlite':
+            # Texto en SQLite: ambos lados normalizados, como el orden por created_at
+            stmt = stmt.where(sqlite_datetime(Product.updated_at) >= sqlite_datetime(Product.updated_at, updated_since))
+        else:
+            stmt = stmt.where(Product.updated_at >= updated_since)
+    return stmt
+
+
+def _partitions(stmt, batch_size):
+    # yield_per activa stream_results: cursor del lado del servidor donde el
+    # driver lo soporta, y nunca mas de batch_size filas en memoria
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def export_products(fmt, category_id=None, updated_since=None, batch_size=1000):
+    """Generador con el catalogo serializado, un bloque de texto por batch."""
+    stmt = _statement(category_id, updated_since)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS)
+        yield buffer.getvalue()
+        for rows in _partitions(stmt, batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_value(v) for v in row] for row in rows)
+            yield buffer.getvalue()
+        return
+
+    for rows in _partitions(stmt, batch_size):
+        yield ''.join(
+            json.dumps({f: _value(v) for f, v in zip(FIELDS, row)}) + '\n' for row in rows
+        )
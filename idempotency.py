@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from cache import CacheFull, CacheRegion, LRUCache, make_backend
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Respuestas guardadas por clave; con CACHE_BACKEND='redis' se comparten
+# entre procesos y el claim (set-if-absent) es global
+store = CacheRegion('idempotency')
+
+
+def init_app(app):
+    # Sin expulsion LRU: una clave olvidada antes de su TTL haria que el
+    # reintento vuelva a ejecutar la mutacion. Lleno, se rechazan claves nuevas
+    backend = make_backend(
+        app.config, 'idempotency',
+        ttl=app.config.get('IDEMPOTENCY_TTL', 24 * 3600),
+        maxsize=app.config.get('IDEMPOTENCY_MAXSIZE', 100000),
+        evict=False,
+    )
+    if isinstance(backend, LRUCache) and app.config.get('WEB_CONCURRENCY', 1) > 1:
+        # Cada proceso tendria sus claves: el reintento que cae en otro worker
+        # no ve la primera ejecucion
+        raise RuntimeError("Idempotency-Key needs a shared store with several workers; set CACHE_BACKEND='redis'")
+    store.init_app(app, backend=backend)
+    # Ejecuciones en curso en este proceso: los duplicados esperan su Event
+    app.extensions['idempotency'] = {"inflight": {}, "lock": threading.Lock()}
+
+
+def _state():
+    return current_app.extensions['idempotency']
+
+
+def _key(raw_key):
+    # Por usuario y endpoint: la misma clave en otra ruta es otra request
+    scope = f"{get_jwt_identity()}|{request.method}|{request.path}|{raw_key}"
+    return hashlib.sha256(scope.encode()).hexdigest()
+
+
+def _claim(key, fingerprint):
+    """Reserva la clave; devuelve el Event de la ejecucion o None si ya existe."""
+    state = _state()
+    with state["lock"]:
+        if key in state["inflight"]:
+            return None
+        pending = {"state": "pending", "fingerprint": fingerprint}
+        if not store.backend.add(key, pending, ttl=current_app.config.get('IDEMPOTENCY_LOCK_TTL', 60)):
+            return None
+        event = state["inflight"][key] = threading.Event()
+        return event
+
+
+def _execute(key, fingerprint, event, view, args, kwargs):
+    try:
+        response = make_response(view(*args, **kwargs))
+        if response.status_code >= 500:
+            # Error del servidor: se libera la clave para poder reintentar
+            store.invalidate(key)
+        else:
+            try:
+                store.backend.set(key, {
+                    "state": "done",
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "body": response.get_data(as_text=True),
+                    "mimetype": response.mimetype,
+                })
+            except CacheFull:
+                # La clave en curso vencio y el store se lleno entre medio
+                logger.warning(f"Idempotency store full; response for key {key} not saved")
+        return response
+    except Exception:
+        store.invalidate(key)
+        raise
+    finally:
+        state = _state()
+        with state["lock"]:
+            state["inflight"].pop(key, None)
+        event.set()
+
+
+def _replay(entry):
+    response = current_app.response_class(entry["body"], status=entry["status"], mimetype=entry["mimetype"])
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _wait(key, timeout):
+    event = _state()["inflight"].get(key)
+    if event is not None:
+        event.wait(timeout)
+    else:
+        # La ejecucion esta en otro proceso: se consulta el store de nuevo
+        time.sleep(min(timeout, 0.05))
+
+
+def idempotent(view):
+    """Permite reintentar un POST con el header Idempotency-Key.
+
+    La primera request con una clave se ejecuta y su respuesta se guarda; las
+    repeticiones la reciben tal cual sin volver a ejecutar la vista, y las que
+    llegan mientras la primera sigue en curso esperan su resultado. Va debajo
+    de @jwt_required(): la clave es por usuario.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        raw_key = request.headers.get(HEADER)
+        if raw_key is None:
+            return view(*args, **kwargs)
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            return jsonify({"msg": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters"}), 400
+
+        key = _key(raw_key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        deadline = time.monotonic() + current_app.config.get('IDEMPOTENCY_WAIT', 10)
+        while True:
+            try:
+                event = _claim(key, fingerprint)
+            except CacheFull:
+                logger.warning("Idempotency store full; rejecting new keys")
+                response = jsonify({"msg": f"Too many pending {HEADER} values, try again later"})
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            if event is not None:
+                return _execute(key, fingerprint, event, view, args, kwargs)
+
+            entry = store.backend.get(key)
+            if entry is None:
+                if key not in _state()["inflight"]:
+                    # La primera ejecucion fallo y libero la clave: se reintenta el claim
+                    continue
+            elif entry["fingerprint"] != fingerprint:
+                return jsonify({"msg": f"{HEADER} was already used with a different request"}), 422
+            elif entry["state"] == "done":
+                return _replay(entry)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                response = jsonify({"msg": f"A request with this {HEADER} is still in progress"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            _wait(key, remaining)
+    return wrapper
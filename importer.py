@@ -0,0 +1,287 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from marshmallow import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, StatementError
+
+from models import db, Product, Category
+from validators import validate_price, validate_stock, validate_id_code
+from id_codes import allocate_product_codes
+from search import index_products
+from logger import setup_logger
+import etag
+
+logger = setup_logger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_FALSE = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class ImportParseError(ImportFormatError):
+    """El archivo no se puede seguir leyendo a partir de `line`.
+
+    `report` trae lo importado hasta ahi: los chunks anteriores ya se guardaron.
+    """
+
+    def __init__(self, message, line):
+        super().__init__(message)
+        self.line = line
+        self.report = None
+
+
+def detect_format(fmt, content_type, filename=None):
+    if fmt:
+        if fmt not in FORMATS:
+            raise ImportFormatError(f"Unsupported format '{fmt}', use one of {FORMATS}")
+        return fmt
+    content_type = (content_type or '').lower()
+    filename = (filename or '').lower()
+    if 'csv' in content_type or filename.endswith('.csv'):
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise ImportFormatError("Could not detect the import format, pass ?format=csv|ndjson")
+
+
+def iter_rows(binary_stream, fmt):
+    """Genera (linea, dict | None, error) leyendo el stream de a una linea."""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                raise ImportParseError(f"Malformed CSV at line {reader.line_num + 1}: {e}", reader.line_num + 1)
+            row.pop(None, None)  # columnas sobrantes se ignoran
+            yield reader.line_num, row, None
+
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, {"_row": ["Invalid JSON"]}
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, {"_row": ["Each line must be a JSON object"]}
+            continue
+        yield line_no, row, None
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _coerce(row, field, cast, errors, message):
+    value = row.get(field)
+    if _blank(value):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        errors[field] = [message]
+        return None
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return False
+    raise ValueError(value)
+
+
+def validate_row(row):
+    """Valida una fila con las mismas reglas que ProductSchema. Devuelve (values, errors)."""
+    errors = {}
+    values = {}
+
+    name = row.get('name')
+    if _blank(name):
+        errors['name'] = ["Missing data for required field."]
+    elif len(str(name)) > 80:
+        errors['name'] = ["Longer than maximum length 80."]
+    else:
+        values['name'] = str(name).strip()
+
+    for field, cast, validator, message in (
+        ('price', float, validate_price, "Not a valid number."),
+        ('stock', int, validate_stock, "Not a valid integer."),
+    ):
+        if _blank(row.get(field)):
+            errors[field] = ["Missing data for required field."]
+            continue
+        value = _coerce(row, field, cast, errors, message)
+        if field in errors:
+            continue
+        try:
+            validator(value)
+        except ValidationError as e:
+            errors[field] = e.messages
+            continue
+        values[field] = value
+
+    category_id = _coerce(row, 'category_id', int, errors, "Not a valid integer.")
+    is_active = _coerce(row, 'is_active', _to_bool, errors, "Not a valid boolean.")
+    if category_id is not None:
+        values['category_id'] = category_id
+    if is_active is not None:
+        values['is_active'] = is_active
+
+    for field in ('description', 'image_url', 'id_code'):
+        if not _blank(row.get(field)):
+            values[field] = str(row[field])
+    if 'id_code' in values:
+        try:
+            validate_id_code(values['id_code'])
+        except ValidationError as e:
+            errors['id_code'] = e.messages
+
+    return values, errors
+
+
+class ImportReport:
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, row_no, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_no, "errors": errors})
+
+    def to_dict(self):
+        return {
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _check_categories(batch, report):
+    category_ids = {values['category_id'] for _, values in batch if 'category_id' in values}
+    if not category_ids:
+        return batch
+    existing = {cid for (cid,) in db.session.query(Category.id).filter(Category.id.in_(category_ids))}
+    valid = []
+    for row_no, values in batch:
+        if 'category_id' in values and values['category_id'] not in existing:
+            report.fail(row_no, {"category_id": ["Category not found."]})
+        else:
+            valid.append((row_no, values))
+    return valid
+
+
+def _insert(rows):
+    # Un solo upsert reserva los codigos de todo el chunk. Se copian las filas:
+    # si la transaccion hace rollback los codigos reservados vuelven a liberarse
+    missing = sum(1 for values in rows if 'id_code' not in values)
+    if missing:
+        codes = iter(allocate_product_codes(db.session.connection(), missing))
+        rows = [values if 'id_code' in values else {**values, 'id_code': next(codes)} for values in rows]
+    stmt = insert(Product).returning(
+        Product.id, Product.name, Product.description, Product.category_id
+    )
+    return db.session.execute(stmt, rows).all()
+
+
+def _rejected_row(e):
+    """Errores por el contenido de la fila: restricciones, valores que la
+    columna no admite (DataError) o que ni siquiera se pueden enviar."""
+    return isinstance(e, (IntegrityError, DataError)) or not isinstance(e, DBAPIError)
+
+
+def _row_errors(e):
+    """Mensaje generico para el cliente; el error de la base queda en el log."""
+    logger.warning(f"Import row rejected by the database: {e.orig}")
+    if not isinstance(e, IntegrityError):
+        return {"_row": ["Invalid value."]}
+    message = str(e.orig).lower()
+    # id_code es la unica columna unica que trae el archivo
+    if 'unique' in message or 'duplicate' in message:
+        return {"id_code": ["Duplicate id_code."]}
+    return {"_row": ["Invalid reference."]}
+
+
+def _write_chunk(batch, report):
+    """Inserta un chunk en una transaccion; si falla, aisla las filas culpables."""
+    batch = _check_categories(batch, report)
+    if not batch:
+        return []
+    try:
+        inserted = _insert([values for _, values in batch])
+    except StatementError as e:
+        if not _rejected_row(e):
+            raise
+        db.session.rollback()
+        inserted = []
+        for row_no, values in batch:
+            try:
+                with db.session.begin_nested():
+                    inserted += _insert([values])
+            except StatementError as e:
+                if not _rejected_row(e):
+                    raise
+                report.fail(row_no, _row_errors(e))
+
+    if inserted:
+        index_products(inserted)
+        etag.bump('products', 'categories', *[f'category:{cid}' for cid in {r.category_id for r in inserted} if cid])
+    db.session.commit()
+    report.inserted += len(inserted)
+    return [r.id for r in inserted]
+
+
+def import_products(binary_stream, fmt, chunk_size=1000, max_errors=1000, on_chunk=None):
+    """Importa productos en streaming, un chunk (y una transaccion) a la vez.
+
+    La memoria usada depende de chunk_size, no del tamano del archivo.
+    """
+    report = ImportReport(max_errors)
+    rows = iter_rows(binary_stream, fmt)
+    while True:
+        # Lo leido antes de un error de formato se guarda igual
+        chunk = []
+        aborted = None
+        try:
+            chunk.extend(islice(rows, chunk_size))
+        except ImportParseError as e:
+            aborted = e
+        if not chunk and aborted is None:
+            break
+        batch = []
+        for line_no, row, error in chunk:
+            if error:
+                report.fail(line_no, error)
+                continue
+            values, errors = validate_row(row)
+            if errors:
+                report.fail(line_no, errors)
+            else:
+                batch.append((line_no, values))
+
+        ids = _write_chunk(batch, report)
+        if on_chunk:
+            on_chunk(ids)
+        if aborted is not None:
+            aborted.report = report.to_dict()
+            raise aborted
+    return report.to_dict()
@@ -0,0 +1,126 @@
+from collections import namedtuple
+
+from sqlalchemy import case, update
+
+from models import db, Product
+from cache import product_cache
+import catalog
+import etag
+
+# Resultado de un movimiento de stock: el stock ya actualizado, la categoria
+# (para versiones/caches) y el precio salen del mismo UPDATE ... RETURNING
+StockChange = namedtuple('StockChange', ['product_id', 'quantity', 'stock', 'category_id', 'crossed_zero', 'price'])
+
+
+def _change(product_id, delta, condition=None):
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock=Product.stock + delta)
+        .returning(Product.stock, Product.category_id, Product.price)
+        .execution_options(synchronize_session=False)
+    )
+    if condition is not None:
+        stmt = stmt.where(condition)
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None
+    return _record([(product_id, delta, row.stock, row.category_id, row.price)])[0]
+
+
+def _record(rows):
+    """Convierte filas (product_id, delta, stock, category_id, price) en
+    StockChange. Las versiones del catalogo se suben en publish()."""
+    changes = []
+    for product_id, delta, stock, category_id, price in rows:
+        # El conteo "in_stock" de categorias solo cambia al cruzar el cero
+        crossed_zero = (stock <= 0) != (stock - delta <= 0)
+        changes.append(StockChange(product_id, abs(delta), stock, category_id, crossed_zero, price))
+
+        # Si la instancia esta en la sesion, su stock quedo viejo
+        product = db.session.identity_map.get(db.session.identity_key(Product, product_id))
+        if product is not None:
+            db.session.expire(product, ['stock'])
+
+    return changes
+
+
+def reserve_stock(product_id, quantity):
+    """Descuenta stock con un UPDATE condicional (WHERE stock >= :qty).
+
+    La base de datos resuelve la carrera: entre checkouts concurrentes solo
+    tienen exito los que caben en el stock. Devuelve un StockChange, o None si
+    el producto no existe o no alcanza el stock. Corre en la transaccion actual.
+    """
+    return _change(product_id, -quantity, Product.stock >= quantity)
+
+
+def reserve_many(quantities):
+    """Reserva varios productos ({product_id: quantity}) con un solo UPDATE.
+
+    Devuelve (changes, short): `short` son los ids sin stock suficiente. Si no
+    esta vacio no se registra nada y el llamador debe hacer rollback, asi la
+    reserva es todo o nada.
+    """
+    if not quantities:
+        return [], []
+    delta = case(quantities, value=Product.id)
+    rows = _change_many(quantities, -delta, Product.stock >= delta)
+    reserved = {row.id for row in rows}
+    short = [pid for pid in quantities if pid not in reserved]
+    if short:
+        return [], short
+    return _record([(row.id, -quantities[row.id], row.stock, row.category_id, row.price) for row in rows]), []
+
+
+def release_many(quantities):
+    """Devuelve stock de varios productos con un solo UPDATE. Los productos
+    que ya no existen se ignoran."""
+    if not quantities:
+        return []
+    rows = _change_many(quantities, case(quantities, value=Product.id))
+    return _record([(row.id, quantities[row.id], row.stock, row.category_id, row.price) for row in rows])
+
+
+def _change_many(quantities, delta, condition=None):
+    stmt = (
+        update(Product)
+        .where(Product.id.in_(list(quantities)))
+        .values(stock=Product.stock + delta)
+        .returning(Product.id, Product.stock, Product.category_id, Product.price)
+        .execution_options(synchronize_session=False)
+    )
+    if condition is not None:
+        stmt = stmt.where(condition)
+    return db.session.execute(stmt).all()
+
+
+def release_stock(product_id, quantity):
+    """Devuelve stock reservado. None si el producto ya no existe."""
+    return _change(product_id, quantity)
+
+
+def publish(*changes):
+    """Sube las versiones del catalogo e invalida caches de los productos
+    tocados; llamar despues del commit.
+
+    Las versiones se suben en una transaccion corta propia y no en la del
+    checkout: si no, todas las reservas concurrentes se encolarian sobre la
+    fila de version 'products' hasta el commit de cada una. Entre el commit y
+    su publish un cliente puede leer el stock nuevo con el ETag viejo; a lo
+    sumo cuesta una revalidacion extra.
+    """
+    changes = [c for c in changes if c is not None]
+    if not changes:
+        return
+    # Primero las caches: un ETag nuevo nunca se sirve con un cuerpo viejo
+    product_cache.invalidate(*{c.product_id for c in changes})
+    if any(c.crossed_zero for c in changes):
+        catalog.invalidate_counts()
+    scopes = []
+    for c in changes:
+        scopes += etag.product_scopes(c.product_id, c.category_id)
+    if any(c.crossed_zero for c in changes):
+        scopes.append('categories')
+    etag.bump(*scopes)
+    db.session.commit()
@@ -0,0 +1,261 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Job
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# kind -> funcion(payload). Si la funcion devuelve un callable, se llama
+# despues del commit (p.ej. invalidar caches)
+HANDLERS = {}
+# nombre -> (clave de config con el intervalo en segundos, default, funcion)
+PERIODIC = {}
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def periodic(name, config_key, default):
+    """Registra una tarea que el Worker corre cada app.config[config_key] segundos."""
+    def register(fn):
+        PERIODIC[name] = (config_key, default, fn)
+        return fn
+    return register
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def db_ago(delta):
+    """Expresion SQL: el reloj de la base menos `delta`.
+
+    Para comparar con columnas que escribe la base (updated_at con
+    func.now()): restarle a utcnow() se corre horas si el servidor no esta en
+    UTC. SQLite no resta intervalos; su datetime('now') es UTC igual que
+    CURRENT_TIMESTAMP.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.datetime('now', f'-{int(delta.total_seconds())} seconds')
+    return func.now() - delta
+
+
+def enqueue(kind, payload=None, delay=0):
+    """Agrega un job a la transaccion actual: se ejecuta solo si esta hace commit."""
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        run_at=utcnow() + timedelta(seconds=delay),
+        max_attempts=current_app.config.get('JOBS_MAX_ATTEMPTS', 5),
+    )
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def claim(limit=10):
+    """Toma hasta `limit` jobs listos con un solo UPDATE ... RETURNING.
+
+    Tambien recupera jobs 'running' cuyo lease vencio (worker caido). En
+    Postgres la subconsulta usa FOR UPDATE SKIP LOCKED; la condicion se repite
+    en el UPDATE para que dos workers nunca tomen el mismo job.
+    """
+    now = utcnow()
+    ready = or_(
+        and_(Job.status == 'queued', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_until < now),
+    )
+    candidates = select(Job.id).where(ready).order_by(Job.id).limit(limit).with_for_update(skip_locked=True)
+    lease = timedelta(seconds=current_app.config.get('JOBS_LEASE', 60))
+    stmt = (
+        update(Job)
+        .where(Job.id.in_(candidates), ready)
+        .values(status='running', locked_until=now + lease, attempts=Job.attempts + 1, updated_at=db.func.now())
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.session.execute(stmt).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def run_job(job):
+    """Ejecuta un job tomado con claim(). Devuelve True si termino bien.
+
+    El handler y el paso a 'done' van en la misma transaccion: si el proceso
+    muere a mitad, el lease vence y el job se reintenta sin efectos a medias.
+    """
+    try:
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise LookupError(f"No handler registered for job kind {job.kind!r}")
+        after_commit = fn(json.loads(job.payload))
+        # Solo si seguimos siendo duenos del lease (attempts no cambio)
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == 'running', Job.attempts == job.attempts)
+            .values(status='done', locked_until=None, last_error=None, updated_at=db.func.now())
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            logger.warning(f"Job {job.id} lost its lease, discarding this run")
+            return False
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {e!r}")
+        failed = job.attempts >= job.max_attempts
+        backoff = timedelta(seconds=min(2 ** job.attempts, 300))
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.attempts == job.attempts)
+            .values(
+                status='failed' if failed else 'queued',
+                run_at=utcnow() + backoff,
+                locked_until=None,
+                last_error=repr(e)[:2000],
+                updated_at=db.func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return False
+
+    if callable(after_commit):
+        after_commit()
+    return True
+
+
+def run_pending(limit=10):
+    """Toma y ejecuta un lote de jobs en el hilo actual. Devuelve cuantos tomo."""
+    batch = claim(limit)
+    for job in batch:
+        run_job(job)
+    return len(batch)
+
+
+def purge(retention):
+    """Borra los jobs terminados hace mas de `retention` (timedelta)."""
+    result = db.session.execute(
+        delete(Job).where(Job.status == 'done', Job.updated_at < db_ago(retention))
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@periodic('jobs.purge', 'JOBS_PURGE_INTERVAL', 3600)
+def _purge_done():
+    purge(current_app.config.get('JOBS_RETENTION', timedelta(days=7)))
+
+
+class Worker:
+    """Pool de hilos que procesa la cola dentro del proceso de la app.
+
+    Cada hilo toma lotes con claim(); sin trabajo corre las tareas periodicas
+    vencidas y espera JOBS_POLL_INTERVAL o hasta que un commit con jobs nuevos
+    lo despierte.
+    """
+
+    def __init__(self, app, threads=4, batch_size=10, poll_interval=1.0):
+        self.app = app
+        self.threads = threads
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._started = threading.Lock()
+        self._pool = []
+        self._periodic_lock = threading.Lock()
+        self._next_run = {}
+
+    @property
+    def running(self):
+        return bool(self._pool)
+
+    def start(self):
+        with self._started:
+            if self._pool:
+                return
+            self._stop.clear()
+            for n in range(self.threads):
+                thread = threading.Thread(target=self._run, name=f"jobs-worker-{n}", daemon=True)
+                thread.start()
+                self._pool.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._pool:
+            thread.join(timeout)
+        self._pool = []
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            done = 0
+            with self.app.app_context():
+                try:
+                    done = run_pending(self.batch_size)
+                    if not done:
+                        self._run_periodic()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Jobs worker error: {e!r}")
+                finally:
+                    db.session.remove()
+            if not done:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _run_periodic(self):
+        # Un solo hilo a la vez; los demas siguen atendiendo la cola
+        if not self._periodic_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            for name, (config_key, default, fn) in PERIODIC.items():
+                if now < self._next_run.get(name, now):
+                    continue
+                self._next_run[name] = now + self.app.config.get(config_key, default)
+                try:
+                    fn()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Periodic task {name} failed: {e!r}")
+        finally:
+            self._periodic_lock.release()
+
+
+def init_app(app):
+    worker = Worker(
+        app,
+        threads=app.config.get('JOBS_WORKERS', 4),
+        batch_size=app.config.get('JOBS_BATCH_SIZE', 10),
+        poll_interval=app.config.get('JOBS_POLL_INTERVAL', 1.0),
+    )
+    app.extensions['jobs'] = worker
+    if app.config.get('JOBS_WORKER_ENABLED', True):
+        # Se arranca con la primera request, no al importar la app (CLI, migraciones)
+        app.before_request(worker.start)
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_worker(session):
+    if session.info.pop('jobs_enqueued', False):
+        worker = current_app.extensions.get('jobs') if current_app else None
+        if worker is not None:
+            worker.wake()
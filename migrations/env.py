@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from models import PRODUCT_SEARCH_TABLE, created_on
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -45,6 +47,18 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # El indice de busqueda (FTS5 y sus tablas sombra, o la tabla tsvector en
+    # PostgreSQL) lo crean los DDL de models.py, no los modelos: autogenerate
+    # no debe proponer borrarlo
+    if type_ == 'table' and name.startswith(PRODUCT_SEARCH_TABLE):
+        return False
+    # Indices que el modelo solo crea en algunos dialectos (models.created_on)
+    if type_ == 'index' and not reflected:
+        return created_on(object, context.get_context().dialect.name)
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +79,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +108,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,51 @@
+"""product search index
+
+Revision ID: 4b7d2e91c3a5
+Revises: 19fe8cf786fd
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d2e91c3a5'
+down_revision = '19fe8cf786fd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+            "USING fts5(name, description, category, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "INSERT INTO products_fts (rowid, name, description, category) "
+            "SELECT p.id, p.name, p.description, c.name "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS products_fts ("
+            "product_id INTEGER PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE, "
+            "document TSVECTOR NOT NULL)"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_products_fts_document ON products_fts USING gin (document)"
+        )
+        op.execute(
+            "INSERT INTO products_fts (product_id, document) "
+            "SELECT p.id, "
+            "setweight(to_tsvector('simple', coalesce(p.name, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(c.name, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(p.description, '')), 'C') "
+            "FROM products p LEFT JOIN categories c ON c.id = p.category_id"
+        )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS products_fts")
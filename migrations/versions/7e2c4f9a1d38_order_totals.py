@@ -0,0 +1,47 @@
+"""order totals
+
+Revision ID: 7e2c4f9a1d38
+Revises: 1b5e9d3a7c62
+Create Date: 2026-10-18 15:41:09.562114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2c4f9a1d38'
+down_revision = '1b5e9d3a7c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_price', sa.Float(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('subtotal', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_orders_user_id_subtotal_id', ['user_id', 'subtotal', 'id'], unique=False)
+
+    # Backfill: las lineas existentes no guardaron precio, se usa el actual
+    op.execute(
+        "UPDATE order_items SET unit_price = "
+        "(SELECT p.price FROM products p WHERE p.id = order_items.product_id)"
+    )
+    op.execute(
+        "UPDATE orders SET "
+        "item_count = (SELECT coalesce(sum(i.quantity), 0) FROM order_items i WHERE i.order_id = orders.id), "
+        "subtotal = (SELECT coalesce(sum(i.quantity * i.unit_price), 0) FROM order_items i WHERE i.order_id = orders.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_id_subtotal_id')
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('subtotal')
+
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('unit_price')
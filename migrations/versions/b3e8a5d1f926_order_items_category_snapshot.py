@@ -0,0 +1,32 @@
+"""order items category snapshot
+
+Revision ID: b3e8a5d1f926
+Revises: a2d7f4c9e861
+Create Date: 2026-10-18 21:02:36.184590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8a5d1f926'
+down_revision = 'a2d7f4c9e861'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('category_id', sa.Integer(), nullable=True))
+
+    # Backfill: las lineas existentes no guardaron categoria, se usa la actual
+    op.execute(
+        "UPDATE order_items SET category_id = "
+        "(SELECT p.category_id FROM products p WHERE p.id = order_items.product_id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('order_items', schema=None) as batch_op:
+        batch_op.drop_column('category_id')
@@ -0,0 +1,54 @@
+"""order jobs queue
+
+Revision ID: b8e1f5c3a9d2
+Revises: 9a3d6b2e5f14
+Create Date: 2026-10-18 17:05:31.640718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f5c3a9d2'
+down_revision = '9a3d6b2e5f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('kind', sa.String(length=80), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_jobs_status_run_at_id', ['status', 'run_at', 'id'], unique=False)
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('in_rollups', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    # Ninguna orden queda marcada como sumada y los rollups arrancan vacios:
+    # un sync previo al backfill solo suma ventas nuevas (nunca resta de un
+    # rollup que no existe) y `flask ventas backfill-rollups` los reconstruye
+    # y marca in_rollups segun el estado
+    op.execute("DELETE FROM sales_rollups")
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('in_rollups')
+
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_jobs_status_run_at_id')
+
+    op.drop_table('jobs')
@@ -0,0 +1,53 @@
+"""trim catalog indexes
+
+Revision ID: c7e2a4f8d913
+Revises: b3e8a5d1f926
+Create Date: 2026-10-18 21:40:12.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a4f8d913'
+down_revision = 'b3e8a5d1f926'
+branch_labels = None
+depends_on = None
+
+# Prefijo is_active: casi todo el catalogo esta activo, no pagan su costo
+# en cada INSERT y cada cambio de precio
+IS_ACTIVE_INDEXES = {
+    'ix_products_is_active_id': ['is_active', 'id'],
+    'ix_products_is_active_price_id': ['is_active', 'price', 'id'],
+    'ix_products_is_active_created_at_id': ['is_active', 'created_at', 'id'],
+    'ix_products_is_active_category_id_id': ['is_active', 'category_id', 'id'],
+    'ix_products_is_active_category_id_price_id': ['is_active', 'category_id', 'price', 'id'],
+    'ix_products_is_active_category_id_created_at_id': ['is_active', 'category_id', 'created_at', 'id'],
+}
+# En SQLite el orden por created_at compara datetime(created_at)
+CREATED_AT_INDEXES = {
+    'ix_products_created_at_id': ('ix_products_sqlite_created_at_id', ['created_at', 'id']),
+    'ix_products_category_id_created_at_id': (
+        'ix_products_sqlite_category_id_created_at_id', ['category_id', 'created_at', 'id'],
+    ),
+}
+
+
+def upgrade():
+    for name in IS_ACTIVE_INDEXES:
+        op.drop_index(name, table_name='products')
+    if op.get_bind().dialect.name == 'sqlite':
+        for name, (sqlite_name, columns) in CREATED_AT_INDEXES.items():
+            op.drop_index(name, table_name='products')
+            expression = ', '.join('datetime(created_at)' if c == 'created_at' else c for c in columns)
+            op.execute(f"CREATE INDEX {sqlite_name} ON products ({expression})")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for name, (sqlite_name, columns) in CREATED_AT_INDEXES.items():
+            op.drop_index(sqlite_name, table_name='products')
+            op.create_index(name, 'products', columns, unique=False)
+    for name, columns in IS_ACTIVE_INDEXES.items():
+        op.create_index(name, 'products', columns, unique=False)
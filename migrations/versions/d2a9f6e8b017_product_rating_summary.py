@@ -0,0 +1,51 @@
+"""product rating summary
+
+Revision ID: d2a9f6e8b017
+Revises: c51e07b2f4d8
+Create Date: 2026-10-18 12:26:15.772390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a9f6e8b017'
+down_revision = 'c51e07b2f4d8'
+branch_labels = None
+depends_on = None
+
+STAR_COLUMNS = ['stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5']
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_avg', sa.Float(), server_default='0', nullable=False))
+        for column in STAR_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_products_rating_avg_id', ['rating_avg', 'id'], unique=False)
+
+    # Backfill desde los comentarios existentes
+    stars = ", ".join(
+        f"{column} = (SELECT count(*) FROM comments c WHERE c.product_id = products.id AND c.stars = {n})"
+        for n, column in enumerate(STAR_COLUMNS, start=1)
+    )
+    op.execute(
+        "UPDATE products SET "
+        "rating_count = (SELECT count(*) FROM comments c WHERE c.product_id = products.id), "
+        "rating_sum = (SELECT coalesce(sum(c.stars), 0) FROM comments c WHERE c.product_id = products.id), "
+        "rating_avg = (SELECT coalesce(avg(c.stars), 0) FROM comments c WHERE c.product_id = products.id), "
+        + stars
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_rating_avg_id')
+        for column in reversed(STAR_COLUMNS):
+            batch_op.drop_column(column)
+        batch_op.drop_column('rating_avg')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('rating_count')
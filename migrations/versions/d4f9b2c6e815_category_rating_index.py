@@ -0,0 +1,27 @@
+"""category rating index
+
+Revision ID: d4f9b2c6e815
+Revises: c7e2a4f8d913
+Create Date: 2026-10-18 23:15:48.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f9b2c6e815'
+down_revision = 'c7e2a4f8d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sort=rating dentro de una categoria
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_category_id_rating_avg_id', ['category_id', 'rating_avg', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_category_id_rating_avg_id')
@@ -0,0 +1,29 @@
+"""sqlite updated_at index
+
+Revision ID: e7a3c5d1f024
+Revises: d4f9b2c6e815
+Create Date: 2026-10-19 00:04:27.613590
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5d1f024'
+down_revision = 'd4f9b2c6e815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # En SQLite el export filtra por datetime(updated_at)
+    if op.get_bind().dialect.name == 'sqlite':
+        op.drop_index('ix_products_updated_at', table_name='products')
+        op.execute("CREATE INDEX ix_products_sqlite_updated_at ON products (datetime(updated_at))")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.drop_index('ix_products_sqlite_updated_at', table_name='products')
+        op.create_index('ix_products_updated_at', 'products', ['updated_at'], unique=False)
@@ -0,0 +1,43 @@
+"""product id_code sequence
+
+Revision ID: f4c8a1d7e953
+Revises: e6f1b3c84a27
+Create Date: 2026-10-18 13:47:11.208356
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c8a1d7e953'
+down_revision = 'e6f1b3c84a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('id_sequences',
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+
+    # Los codigos PROD-<random> existentes se reescriben a partir del id, que ya
+    # es unico, y la secuencia arranca despues del id mas alto
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE products SET id_code = 'PROD-' || lpad(id::text, 8, '0') WHERE id_code LIKE 'PROD-%'")
+    else:
+        op.execute("UPDATE products SET id_code = 'PROD-' || printf('%08d', id) WHERE id_code LIKE 'PROD-%'")
+    op.execute(
+        "INSERT INTO id_sequences (name, next_value) "
+        "SELECT 'product_id_code', coalesce(max(id), 0) + 1 FROM products"
+    )
+
+
+def downgrade():
+    op.drop_table('id_sequences')
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 import os
-from random import randint
+from id_codes import next_product_code
 
 db = SQLAlchemy()
 
@@ -9,6 +10,16 @@ class Roles():
     ADMIN = os.getenv('ADMIN_ROLE')
     SELLER = os.getenv('SELLER_ROLE')
 
+def created_on(index, dialect):
+    """Si el indice existe en ese dialecto, segun info['dialects'] /
+    info['skip_dialects']. Lo usan create_all (ddl_if) y migrations/env.py."""
+    return dialect in index.info.get('dialects', (dialect,)) and dialect not in index.info.get('skip_dialects', ())
+
+
+def _dialect_index(name, *expressions, **info):
+    index = db.Index(name, *expressions, info=info)
+    return index.ddl_if(callable_=lambda ddl, target, bind, **kw: created_on(index, kw['dialect'].name))
+
 class ModelBase(db.Model):
     __abstract__ = True
 
@@ -26,6 +37,8 @@ class User(ModelBase):
     address = db.Column(db.String(256), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
     role = db.Column(db.String, default=Roles.USER)
+    # Sube con cada cambio de rol/estado; los tokens con otra version se revocan
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
 class Product(ModelBase):
     __tablename__ = 'products'
@@ -35,28 +48,82 @@ class Product(ModelBase):
     price = db.Column(db.Float, nullable=False)
     stock = db.Column(db.Integer, default=0)
     image_url = db.Column(db.String(256), nullable=True)
-    id_code = db.Column(db.String(80), unique=True, nullable=False, default=lambda: f"PROD-{randint(1000, 9999)}")
+    id_code = db.Column(db.String(80), unique=True, nullable=False, default=next_product_code)
     is_active = db.Column(db.Boolean, default=True)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     category = db.relationship('Category', backref=db.backref('products', lazy=True))
 
+    # Resumen de calificaciones, mantenido de forma incremental por ratings.py
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    stars_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    stars_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Indices del catalogo (ver catalog.ProductQuery): orden global y por
+    # categoria, con id al final para el cursor keyset. is_active no lleva
+    # indice propio: casi todo el catalogo esta activo y se filtra sobre estos.
+    # En SQLite el orden por created_at y el filtro del export por updated_at
+    # van sobre datetime() (ver pagination.sqlite_datetime), asi que ahi los
+    # indices son de esa expresion
+    __table_args__ = (
+        _dialect_index('ix_products_updated_at', 'updated_at', skip_dialects=('sqlite',)),
+        _dialect_index('ix_products_sqlite_updated_at', db.text('datetime(updated_at)'), dialects=('sqlite',)),
+        db.Index('ix_products_rating_avg_id', 'rating_avg', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+        _dialect_index('ix_products_created_at_id', 'created_at', 'id', skip_dialects=('sqlite',)),
+        _dialect_index('ix_products_sqlite_created_at_id', db.text('datetime(created_at)'), 'id', dialects=('sqlite',)),
+        db.Index('ix_products_category_id_id', 'category_id', 'id'),
+        db.Index('ix_products_category_id_price_id', 'category_id', 'price', 'id'),
+        db.Index('ix_products_category_id_rating_avg_id', 'category_id', 'rating_avg', 'id'),
+        _dialect_index('ix_products_category_id_created_at_id', 'category_id', 'created_at', 'id',
+                       skip_dialects=('sqlite',)),
+        _dialect_index('ix_products_sqlite_category_id_created_at_id', 'category_id',
+                       db.text('datetime(created_at)'), 'id', dialects=('sqlite',)),
+    )
+
 class OrderItem(ModelBase):
     __tablename__ = 'order_items'
     
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
+    # Precio del producto al agregarlo a la orden
+    unit_price = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # Categoria del producto al agregarlo: los rollups suman y restan siempre
+    # sobre la misma aunque el producto cambie de categoria o se borre
+    category_id = db.Column(db.Integer, nullable=True)
     
-    order = db.relationship('Order', backref=db.backref('order_items', lazy='joined'))
-    product = db.relationship('Product', backref=db.backref('order_items', lazy='joined'))
+    # Carga perezosa: leer el catalogo u ordenes no arrastra el historial de
+    # ventas. Quien serializa items los pide con selectinload
+    order = db.relationship('Order', backref=db.backref('order_items', lazy=True))
+    product = db.relationship('Product', backref=db.backref('order_items', lazy=True))
     
 class Order(ModelBase):
     __tablename__ = 'orders'
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     status = db.Column(db.String(50), default='pending')
+    # Totales mantenidos con UPDATEs relativos (ver orders.adjust_totals)
+    subtotal = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Si la orden esta sumada en sales_rollups (ver analytics.sync_order)
+    in_rollups = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     
     user = db.relationship('User', backref=db.backref('orders', lazy=True))
+
+    __table_args__ = (
+        # Listado de ordenes del usuario, mas recientes primero (keyset por id)
+        db.Index('ix_orders_user_id_id', 'user_id', 'id'),
+        db.Index('ix_orders_user_id_subtotal_id', 'user_id', 'subtotal', 'id'),
+        # Barrido de reservas vencidas (orders.sweep_expired)
+        db.Index('ix_orders_status_updated_at', 'status', 'updated_at'),
+        # Carrito abierto e historial del usuario (orders.open_cart)
+        db.Index('ix_orders_user_id_status_id', 'user_id', 'status', 'id'),
+    )
     
 class Comment(ModelBase):
     __tablename__ = 'comments'
@@ -74,3 +141,102 @@ class Category(ModelBase):
 
     name = db.Column(db.String(80), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=True)
+
+class IdSequence(ModelBase):
+    __tablename__ = 'id_sequences'
+
+    # Secuencias para codigos legibles (ver id_codes.py)
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
+class CatalogVersion(ModelBase):
+    __tablename__ = 'catalog_versions'
+
+    # 'products', 'categories', 'category:<id>', 'product:<id>'
+    scope = db.Column(db.String(80), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(ModelBase):
+    __tablename__ = 'jobs'
+
+    # Cola durable de trabajos en segundo plano (ver jobs.py). Se encolan en
+    # la misma transaccion que el cambio que los origina
+    kind = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at_id', 'status', 'run_at', 'id'),
+    )
+
+class RevokedToken(ModelBase):
+    __tablename__ = 'revoked_tokens'
+
+    # Blocklist de JWT (ver revocation.SQLStore); se purga al vencer el token
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RefreshToken(ModelBase):
+    __tablename__ = 'refresh_tokens'
+
+    # Un registro por refresh token emitido; family agrupa las rotaciones de un login
+    jti = db.Column(db.String(64), unique=True, nullable=False)
+    family = db.Column(db.String(36), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    used_at = db.Column(db.DateTime, nullable=True)
+    revoked = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+class SalesRollup(ModelBase):
+    __tablename__ = 'sales_rollups'
+
+    # Ventas agregadas por hora/dia ('hour', 'day') y por scope: 'total'
+    # (scope_id 0), 'product' o 'category'. Se mantienen desde analytics.py
+    granularity = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    scope = db.Column(db.String(20), nullable=False)
+    scope_id = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'scope', 'scope_id', 'bucket', name='uq_sales_rollups_key'),
+        db.Index('ix_sales_rollups_granularity_scope_bucket', 'granularity', 'scope', 'bucket'),
+    )
+
+class RollupCheckpoint(ModelBase):
+    __tablename__ = 'rollup_checkpoints'
+
+    # Avance de un backfill por lotes: procesado hasta last_id de target_id
+    name = db.Column(db.String(80), unique=True, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    target_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Indice full-text de productos: FTS5 en SQLite, tsvector + GIN en Postgres.
+# El rowid / product_id coincide con products.id; se mantiene desde search.py.
+PRODUCT_SEARCH_TABLE = 'products_fts'
+
+event.listen(Product.__table__, 'after_create', DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {PRODUCT_SEARCH_TABLE} "
+    "USING fts5(name, description, category, tokenize='unicode61 remove_diacritics 2')"
+).execute_if(dialect='sqlite'))
+event.listen(Product.__table__, 'after_create', DDL(
+    f"CREATE TABLE IF NOT EXISTS {PRODUCT_SEARCH_TABLE} ("
+    "product_id INTEGER PRIMARY KEY REFERENCES products (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)"
+).execute_if(dialect='postgresql'))
+event.listen(Product.__table__, 'after_create', DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_{PRODUCT_SEARCH_TABLE}_document "
+    f"ON {PRODUCT_SEARCH_TABLE} USING gin (document)"
+).execute_if(dialect='postgresql'))
+event.listen(Product.__table__, 'before_drop', DDL(
+    f"DROP TABLE IF EXISTS {PRODUCT_SEARCH_TABLE}"
+).execute_if(dialect=('sqlite', 'postgresql')))
@@ -0,0 +1,240 @@
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import case, delete, select, update
+
+from models import db, Order, OrderItem, Product
+from logger import setup_logger
+import inventory
+import jobs
+
+logger = setup_logger(__name__)
+
+# Ciclo de vida: pending -> paid -> shipped -> delivered; se puede cancelar
+# mientras no se haya enviado. Solo sweep_expired pasa una orden a expired
+PENDING = 'pending'
+PAID = 'paid'
+SHIPPED = 'shipped'
+DELIVERED = 'delivered'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+
+TRANSITIONS = {
+    PENDING: (PAID, CANCELLED),
+    PAID: (SHIPPED, CANCELLED),
+    SHIPPED: (DELIVERED,),
+    DELIVERED: (),
+    CANCELLED: (),
+    EXPIRED: (),
+}
+STATUSES = tuple(TRANSITIONS)
+# Ordenes cerradas (historial); IN en vez de != para usar (user_id, status, id)
+PAST_STATUSES = tuple(s for s in STATUSES if s != PENDING)
+
+
+class OrderTransitionError(ValueError):
+    pass
+
+
+def adjust_totals(order_id, quantity, amount):
+    """Suma unidades e importe al total de la orden (negativos para restar).
+
+    Es un UPDATE relativo en la transaccion actual, junto con el alta o baja
+    del item, asi que el total nunca queda desfasado de sus lineas. Tambien
+    renueva updated_at: la reserva de stock vence por inactividad.
+
+    Solo toca ordenes pending: si un cancel o sweep_expired la cerro despues
+    de que la vista leyo el estado, levanta OrderTransitionError y el llamador
+    hace rollback, junto con el stock que acababa de reservar.
+    """
+    item_count = Order.item_count + quantity
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == PENDING)
+        .values({
+            Order.item_count: item_count,
+            # Sin items el subtotal vuelve a 0 exacto (sin residuos de float)
+            Order.subtotal: case((item_count > 0, Order.subtotal + amount), else_=0.0),
+            Order.updated_at: db.func.now(),
+        })
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        raise OrderTransitionError("Only pending orders can be modified")
+    order = db.session.identity_map.get(db.session.identity_key(Order, order_id))
+    if order is not None:
+        db.session.expire(order, ['subtotal', 'item_count', 'updated_at'])
+
+
+def transition(order, status):
+    """Cambia el estado si la transicion es valida y encola sus efectos.
+
+    El UPDATE es condicional sobre el estado leido, asi dos cambios
+    concurrentes no pueden partir del mismo estado. Los efectos lentos (stock,
+    analytics, notificaciones) quedan como jobs en la misma transaccion.
+    """
+    current = order.status
+    if status not in TRANSITIONS.get(current, ()):
+        raise OrderTransitionError(f"Cannot change order status from {current} to {status}")
+    result = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == current)
+        .values(status=status, updated_at=db.func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        raise OrderTransitionError("Order status was changed by another request")
+    db.session.expire(order, ['status', 'updated_at'])
+
+    payload = {"order_id": order.id, "from": current, "to": status}
+    if status == CANCELLED:
+        # Se copian las cantidades: la orden puede borrarse antes de que corra el job
+        items = {str(product_id): quantity for product_id, quantity in order_quantities([order.id]).items()}
+        jobs.enqueue('orders.release_stock', dict(payload, items=items))
+    jobs.enqueue('analytics.sync_order', payload)
+    jobs.enqueue('orders.notify', payload)
+
+
+@jobs.handler('orders.release_stock')
+def release_stock(payload):
+    """Devuelve al inventario lo reservado por una orden cancelada."""
+    items = payload.get("items")
+    if items is None:
+        # Jobs encolados antes de que el payload llevara las cantidades
+        quantities = order_quantities([payload["order_id"]])
+    else:
+        quantities = {int(product_id): quantity for product_id, quantity in items.items()}
+    changes = inventory.release_many(quantities)
+    return lambda: inventory.publish(*changes)
+
+
+def _line_columns():
+    return (
+        OrderItem.id.label('item_id'),
+        OrderItem.product_id,
+        OrderItem.quantity,
+        OrderItem.unit_price,
+        Product.name,
+        Product.price,
+        Product.stock,
+    )
+
+
+def _line(row):
+    return {
+        "id": row.item_id,
+        "product_id": row.product_id,
+        "name": row.name,
+        "quantity": row.quantity,
+        "unit_price": row.unit_price,
+        "price": row.price,  # precio actual del producto
+        "stock": row.stock,
+        "line_total": row.quantity * row.unit_price,
+    }
+
+
+def open_cart(user_id):
+    """La orden pending mas reciente del usuario y sus lineas, en una consulta.
+
+    Devuelve (order, lines) o (None, []) si no tiene carrito abierto.
+    """
+    latest = (
+        select(Order.id)
+        .where(Order.user_id == user_id, Order.status == PENDING)
+        .order_by(Order.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    rows = db.session.execute(
+        select(Order, *_line_columns())
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(Order.id == latest)
+        .order_by(OrderItem.id)
+    ).all()
+    if not rows:
+        return None, []
+    return rows[0][0], [_line(row) for row in rows if row.item_id is not None]
+
+
+def lines_by_order(order_ids):
+    """Lineas con datos de producto para varias ordenes, en una consulta con IN."""
+    lines = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return lines
+    rows = db.session.execute(
+        select(OrderItem.order_id, *_line_columns())
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id.in_(order_ids))
+        .order_by(OrderItem.order_id, OrderItem.id)
+    )
+    for row in rows:
+        lines[row.order_id].append(_line(row))
+    return lines
+
+
+def order_quantities(order_ids):
+    rows = db.session.execute(
+        select(OrderItem.product_id, OrderItem.quantity).where(OrderItem.order_id.in_(order_ids))
+    ).all()
+    quantities = {}
+    for product_id, quantity in rows:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def sweep_expired(ttl=None, batch_size=None):
+    """Libera las reservas de ordenes pending sin actividad durante `ttl`.
+
+    Trabaja por lotes de `batch_size`, cada uno en su propia transaccion corta:
+    busca candidatas por el indice (status, updated_at), las pasa a expired con
+    un UPDATE condicional (si alguien las toco entre medio se saltan), devuelve
+    su stock con un UPDATE por lote y borra las que estaban vacias. Devuelve
+    cuantas ordenes cerro.
+    """
+    config = current_app.config
+    ttl = ttl or config.get('ORDER_RESERVATION_TTL', timedelta(minutes=30))
+    batch_size = batch_size or config.get('ORDER_SWEEP_BATCH_SIZE', 100)
+    # updated_at lo escribe la base: el corte tambien sale de su reloj
+    cutoff = jobs.db_ago(ttl)
+    stale = (Order.status == PENDING) & (Order.updated_at < cutoff)
+
+    swept = 0
+    while True:
+        ids = db.session.scalars(
+            select(Order.id).where(stale).order_by(Order.updated_at, Order.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        rows = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(ids), stale)
+            .values(status=EXPIRED, updated_at=db.func.now())
+            .returning(Order.id, Order.item_count)
+            .execution_options(synchronize_session=False)
+        ).all()
+        with_items = [row.id for row in rows if row.item_count > 0]
+        empty = [row.id for row in rows if row.item_count <= 0]
+        changes = inventory.release_many(order_quantities(with_items)) if with_items else []
+        if empty:
+            # Ordenes vacias: nada que conservar
+            db.session.execute(delete(Order).where(Order.id.in_(empty)).execution_options(synchronize_session=False))
+        db.session.commit()
+        inventory.publish(*changes)
+        swept += len(rows)
+        if len(ids) < batch_size:
+            break
+    return swept
+
+
+@jobs.periodic('orders.sweep_expired', 'ORDER_SWEEP_INTERVAL', 60)
+def _sweep():
+    swept = sweep_expired()
+    if swept:
+        logger.info(f"Expired {swept} abandoned pending orders")
+
+
+@jobs.handler('orders.notify')
+def notify(payload):
+    # Punto de enganche para email/push; por ahora queda en el log
+    logger.info(f"Order {payload['order_id']} changed from {payload['from']} to {payload['to']}")
@@ -0,0 +1,103 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import DateTime, func, tuple_
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def get_limit():
+    """Lee ?limit= de la request, aplicando el default y el tope de la config."""
+    default = current_app.config.get('PAGINATION_DEFAULT_LIMIT', 50)
+    maximum = current_app.config.get('PAGINATION_MAX_LIMIT', 200)
+    raw = request.args.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit <= 0:
+        raise PaginationError("limit must be a positive integer")
+    return min(limit, maximum)
+
+
+def encode_cursor(values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise PaginationError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise PaginationError("Invalid cursor")
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise PaginationError("Invalid cursor")
+        decoded.append(value)
+    return decoded
+
+
+def sqlite_datetime(column, value=None):
+    # SQLite guarda DateTime como texto: server_default=func.now() escribe
+    # 'YYYY-MM-DD HH:MM:SS' y SQLAlchemy agrega '.ffffff', y como strings no
+    # se comparan bien. Ambos lados se normalizan a segundos con datetime();
+    # los empates los desempata la ultima columna (id).
+    if value is None:
+        return func.datetime(column)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def keyset_paginate(query, columns, cursor=None, limit=50, descending=False):
+    """Pagina `query` por la clave (columns...), la ultima debe ser unica (p.ej. id).
+
+    Devuelve (items, next_cursor). El costo es O(limit) sin importar la
+    profundidad, porque se filtra por la ultima clave vista en vez de usar OFFSET.
+    """
+    sqlite = query.session.get_bind().dialect.name == 'sqlite'
+    keys = [
+        sqlite_datetime(c) if sqlite and isinstance(c.type, DateTime) else c
+        for c in columns
+    ]
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if sqlite:
+            values = [
+                sqlite_datetime(c, v) if v is not None and isinstance(c.type, DateTime) else v
+                for c, v in zip(columns, values)
+            ]
+        key = tuple_(*keys)
+        query = query.filter(key < tuple(values) if descending else key > tuple(values))
+        if len(keys) > 1 and values[0] is not None:
+            # Cota redundante sobre la primera clave: SQLite no busca en un
+            # indice de expresion (datetime()) con la comparacion por tuplas
+            query = query.filter(keys[0] <= values[0] if descending else keys[0] >= values[0])
+
+    order = [c.desc() for c in keys] if descending else [c.asc() for c in keys]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
+
+
+def page_response(items, next_cursor):
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class HasherBusy(Exception):
+    """El pool de hashing esta saturado; la request debe fallar rapido (503)."""
+
+
+class Hasher:
+    """Hashing de contraseñas en un pool de procesos acotado.
+
+    PBKDF2/scrypt son CPU pura y retienen el GIL: corriendo en procesos aparte
+    los hilos WSGI quedan libres mientras esperan. Hay a lo sumo
+    `max_pending` trabajos (en cola o corriendo); pasado ese limite se lanza
+    HasherBusy en vez de encolar. Con workers=0 todo corre en linea (tests).
+    """
+
+    def __init__(self, method='scrypt', salt_length=16, workers=None, max_pending=None, timeout=10):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 4 * max(self.workers, 1)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._prefix = None
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # spawn: hacer fork de un proceso con hilos puede colgar al hijo
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    )
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Password hashing pool is saturated")
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy("Password hashing timed out")
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True si el hash guardado usa otro metodo o parametros que los configurados."""
+        if self._prefix is None:
+            # 'scrypt' o 'pbkdf2' se expanden a los parametros por defecto de werkzeug
+            self._prefix = generate_password_hash('', self.method, 1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def init_app(app):
+    config = app.config
+    app.extensions['passwords'] = Hasher(
+        method=config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        salt_length=config.get('PASSWORD_SALT_LENGTH', 16),
+        workers=config.get('PASSWORD_HASH_WORKERS'),
+        max_pending=config.get('PASSWORD_HASH_MAX_PENDING'),
+        timeout=config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
+
+
+def hash_password(password):
+    return current_app.extensions['passwords'].hash(password)
+
+
+def verify_password(pwhash, password):
+    return current_app.extensions['passwords'].verify(pwhash, password)
+
+
+def rehash_if_needed(user, password):
+    """Tras un login correcto, actualiza el hash si los parametros cambiaron.
+
+    Es oportunista: si el pool esta saturado se deja para el proximo login.
+    El llamador hace commit.
+    """
+    hasher = current_app.extensions['passwords']
+    if not hasher.needs_rehash(user.password):
+        return False
+    try:
+        user.password = hasher.hash(password)
+    except HasherBusy:
+        return False
+    logger.info(f"Password hash of user {user.id} upgraded to {hasher.method}")
+    return True
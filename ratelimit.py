@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _estimate(previous, current, window, now):
+    """Contador de ventana deslizante aproximado: la ventana anterior pesa
+    segun cuanto de ella queda dentro de los ultimos `window` segundos."""
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+def _retry_after(previous, current, limit, window, now):
+    """Segundos hasta que entraria una request mas."""
+    elapsed = (now % window) / window
+    if current + 1 <= limit and previous:
+        # Dentro de esta ventana, cuando el peso de la anterior baje lo suficiente
+        needed = 1 - (limit - 1 - current) / previous
+        return max(1, math.ceil((needed - elapsed) * window))
+    return max(1, math.ceil((1 - elapsed) * window))
+
+
+class RateLimitBackend:
+    """Interfaz de los contadores. hit() cuenta la request si entra en el limite
+    y devuelve (allowed, retry_after)."""
+
+    def hit(self, key, limit, window):
+        raise NotImplementedError
+
+    def reset(self, key):
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """Contadores en proceso, O(1) por request. Cada clave guarda solo
+    (ventana, actual, anterior); las claves inactivas se expulsan por LRU al
+    pasar de `maxsize`, asi la memoria queda acotada aunque lleguen IPs nuevas."""
+
+    def __init__(self, maxsize=100000, clock=time.time):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        now = self._clock()
+        index = int(now // window)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < index - 1:
+                current = previous = 0
+            elif entry[0] == index - 1:
+                current, previous = 0, entry[1]
+            else:
+                current, previous = entry[1], entry[2]
+
+            if _estimate(previous, current + 1, window, now) > limit:
+                self._data[key] = (index, current, previous)
+                self._data.move_to_end(key)
+                return False, _retry_after(previous, current, limit, window, now)
+
+            self._data[key] = (index, current + 1, previous)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True, 0
+
+    def reset(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend(RateLimitBackend):
+    """Contadores compartidos entre procesos para clientes compatibles con Redis:
+    una clave por ventana fija con INCR y vencimiento de dos ventanas."""
+
+    def __init__(self, client, prefix='ratelimit:', clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self._clock = clock
+
+    def hit(self, key, limit, window):
+        now = self._clock()
+        index = int(now // window)
+        current_key = f"{self.prefix}{key}:{index}"
+        pipe = self.client.pipeline()
+        pipe.get(f"{self.prefix}{key}:{index - 1}")
+        pipe.incr(current_key)
+        pipe.expire(current_key, 2 * window)
+        previous, current, _ = pipe.execute()
+        previous = int(previous or 0)
+        if _estimate(previous, current, window, now) > limit:
+            # No cuenta la request rechazada
+            self.client.decr(current_key)
+            return False, _retry_after(previous, current - 1, limit, window, now)
+        return True, 0
+
+    def reset(self, key):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{key}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_backend(config):
+    kind = config.get('RATELIMIT_BACKEND', 'memory')
+    if kind == 'memory':
+        return MemoryBackend(maxsize=config.get('RATELIMIT_MAXSIZE', 100000))
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATELIMIT_BACKEND='redis' requires the redis package")
+        url = config.get('RATELIMIT_REDIS_URL') or config['CACHE_REDIS_URL']
+        return RedisBackend(redis.Redis.from_url(url))
+    raise RuntimeError(f"Unknown RATELIMIT_BACKEND: {kind}")
+
+
+def init_app(app):
+    app.extensions['ratelimit'] = make_backend(app.config)
+
+
+def _ip():
+    return request.remote_addr
+
+
+def _email():
+    data = request.get_json(silent=True)
+    email = data.get('email') if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+# Como se identifica al cliente en cada regla de RATELIMIT_RULES
+KEY_FUNCS = {
+    'ip': _ip,
+    'email': _email,
+}
+
+
+def limit(name):
+    """Aplica las reglas RATELIMIT_RULES[name] = [(clave, limite, ventana_s), ...].
+
+    Corre antes que la vista, o sea antes de cualquier consulta o hash. Con
+    una regla excedida responde 429 con Retry-After.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            config = current_app.config
+            if config.get('RATELIMIT_ENABLED', True):
+                backend = current_app.extensions['ratelimit']
+                for key_name, max_requests, window in config.get('RATELIMIT_RULES', {}).get(name, ()):
+                    value = KEY_FUNCS[key_name]()
+                    if value is None:
+                        continue
+                    allowed, retry_after = backend.hit(f"{name}:{key_name}:{value}", max_requests, window)
+                    if not allowed:
+                        logger.warning(f"Rate limit {name}/{key_name} exceeded for {value}")
+                        return jsonify({"msg": "Too many requests"}), 429, {"Retry-After": str(retry_after)}
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,44 @@
+from sqlalchemy import Float, case, cast, update
+
+from models import db, Product
+import etag
+
+
+def _apply(product_id, stars, delta):
+    """Suma (delta=1) o resta (delta=-1) una calificacion al resumen del producto.
+
+    Es un unico UPDATE relativo, asi que escrituras concurrentes no pisan el
+    conteo y la lectura nunca necesita agregar sobre comments.
+    """
+    count = Product.rating_count + delta
+    total = Product.rating_sum + delta * stars
+    star_column = getattr(Product, f'stars_{stars}')
+    db.session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values({
+            Product.rating_count: count,
+            Product.rating_sum: total,
+            star_column: star_column + delta,
+            Product.rating_avg: case((count > 0, cast(total, Float) / count), else_=0.0),
+        })
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_comment(comment):
+    _apply(comment.product_id, comment.stars, 1)
+    _touch(comment.product_id)
+
+
+def forget_comment(comment):
+    _apply(comment.product_id, comment.stars, -1)
+    _touch(comment.product_id)
+
+
+def _touch(product_id):
+    # El UPDATE no sincroniza la sesion: se expira la instancia para releerla
+    product = db.session.get(Product, product_id)
+    category_id = product.category_id
+    db.session.expire(product)
+    etag.bump(*etag.product_scopes(product_id, category_id))
@@ -0,0 +1,320 @@
+import hashlib
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, RevokedToken
+import jobs
+
+_UPSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+class BloomFilter:
+    """Filtro de Bloom: nunca da falsos negativos, falsos positivos ~error_rate."""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Doble hashing sobre un solo digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        new = False
+        for position in self._positions(key):
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not self._bits[byte] & bit:
+                self._bits[byte] |= bit
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class RevocationStore:
+    """Interfaz de un store de JTIs revocados; expires_at es epoch en segundos."""
+
+    def add(self, jti, expires_at):
+        raise NotImplementedError
+
+    def contains(self, jti):
+        raise NotImplementedError
+
+    def changes(self, cursor=None):
+        """(jtis, cursor): todos los vigentes si cursor es None, o los revocados
+        desde el cursor anterior. Repetir un jti no es un problema."""
+        raise NotImplementedError
+
+    def purge(self):
+        """Borra las revocaciones de tokens que ya vencieron."""
+        raise NotImplementedError
+
+
+class MemoryStore(RevocationStore):
+    """Dict jti -> vencimiento y un heap por vencimiento para expulsar lo viejo.
+
+    Vive en el proceso: sirve para desarrollo o un solo worker.
+    """
+
+    def __init__(self, clock=time.time):
+        self._data = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._clock = clock
+
+    def _evict(self):
+        now = self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._heap)
+            if self._data.get(jti) == expires_at:
+                del self._data[jti]
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._data[jti] = expires_at
+            heapq.heappush(self._heap, (expires_at, jti))
+            self._evict()
+
+    def contains(self, jti):
+        expires_at = self._data.get(jti)
+        return expires_at is not None and expires_at > self._clock()
+
+    def changes(self, cursor=None):
+        # Las revocaciones solo se hacen en este proceso y ya estan en el filtro
+        with self._lock:
+            self._evict()
+            return (list(self._data) if cursor is None else []), 0
+
+    def purge(self):
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+class SQLStore(RevocationStore):
+    """Tabla revoked_tokens compartida por todos los workers.
+
+    add() corre en la transaccion actual (el llamador hace commit). El cursor
+    es un instante; se relee una ventana de `grace` segundos para no perder
+    revocaciones que confirmaron tarde.
+    """
+
+    def __init__(self, grace=30):
+        self.grace = timedelta(seconds=grace)
+
+    def add(self, jti, expires_at):
+        table = RevokedToken.__table__
+        insert = _UPSERTS[db.session.get_bind().dialect.name]
+        db.session.execute(
+            insert(table).on_conflict_do_nothing(index_elements=[table.c.jti]),
+            {"jti": jti, "expires_at": _utc(expires_at), "revoked_at": jobs.utcnow()},
+        )
+
+    def contains(self, jti):
+        stmt = select(RevokedToken.id).where(RevokedToken.jti == jti, RevokedToken.expires_at > jobs.utcnow())
+        return db.session.execute(stmt).first() is not None
+
+    def changes(self, cursor=None):
+        now = jobs.utcnow()
+        stmt = select(RevokedToken.jti).where(RevokedToken.expires_at > now)
+        if cursor is not None:
+            stmt = stmt.where(RevokedToken.revoked_at >= cursor - self.grace)
+        return db.session.scalars(stmt).all(), now
+
+    def purge(self):
+        db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= jobs.utcnow()))
+
+
+class RedisStore(RevocationStore):
+    """Para clientes compatibles con Redis: una clave con TTL por jti y un log
+    ordenado (ZSET por secuencia) para que los workers sincronicen su filtro."""
+
+    def __init__(self, client, prefix='revoked:', clock=time.time):
+        self.client = client
+        self.prefix = prefix
+        self._clock = clock
+
+    def add(self, jti, expires_at):
+        ttl = max(1, int(expires_at - self._clock()))
+        seq = self.client.incr(f"{self.prefix}seq")
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}{jti}", 1, ex=ttl)
+        pipe.zadd(f"{self.prefix}log", {f"{jti}|{int(expires_at)}": seq})
+        pipe.execute()
+
+    def contains(self, jti):
+        return bool(self.client.exists(f"{self.prefix}{jti}"))
+
+    def changes(self, cursor=None):
+        low = '-inf' if cursor is None else f'({cursor}'
+        entries = self.client.zrangebyscore(f"{self.prefix}log", low, '+inf', withscores=True)
+        now = self._clock()
+        jtis = []
+        for member, score in entries:
+            jti, _, expires_at = (member.decode() if isinstance(member, bytes) else member).rpartition('|')
+            if int(expires_at) > now:
+                jtis.append(jti)
+            cursor = max(cursor or 0, int(score))
+        return jtis, cursor or 0
+
+    def purge(self):
+        now = self._clock()
+        expired = [
+            member for member in self.client.zrange(f"{self.prefix}log", 0, -1)
+            if int((member.decode() if isinstance(member, bytes) else member).rpartition('|')[2]) <= now
+        ]
+        if expired:
+            self.client.zrem(f"{self.prefix}log", *expired)
+
+
+class Revocation:
+    """Chequeo de revocacion por worker.
+
+    Cada worker mantiene un filtro de Bloom con los JTIs revocados y lo
+    sincroniza con el store cada `sync_interval` segundos (incremental, con
+    una reconstruccion completa cada `rebuild_interval` para descartar los
+    vencidos). Un token que no esta en el filtro, casi todos, se acepta sin
+    consultar el store; solo los aciertos del filtro se confirman en el store.
+    Una revocacion hecha en otro worker tarda a lo sumo `sync_interval` en
+    llegar; las hechas en este worker aplican de inmediato.
+    """
+
+    def __init__(self, store, sync_interval=2.0, capacity=100000, error_rate=0.001,
+                 rebuild_interval=3600, clock=time.monotonic):
+        self.store = store
+        self.sync_interval = sync_interval
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._cursor = None
+        self._local = []
+        self._next_sync = 0
+        self._next_rebuild = 0
+
+    def _sync(self):
+        now = self._clock()
+        if self._bloom is not None and now < self._next_sync:
+            return
+        with self._lock:
+            if self._bloom is not None and now < self._next_sync:
+                return
+            if self._bloom is None or now >= self._next_rebuild or self._bloom.count > self.capacity:
+                jtis, cursor = self.store.changes(None)
+                # Las revocaciones locales pueden no estar confirmadas todavia
+                jtis = list(jtis) + self._local
+                bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+                for jti in jtis:
+                    bloom.add(jti)
+                self._bloom, self._cursor, self._local = bloom, cursor, []
+                self._next_rebuild = now + self.rebuild_interval
+            else:
+                jtis, self._cursor = self.store.changes(self._cursor)
+                for jti in jtis:
+                    self._bloom.add(jti)
+            self._next_sync = now + self.sync_interval
+
+    def revoke(self, jti, expires_at):
+        self.store.add(jti, expires_at)
+        self._sync()
+        with self._lock:
+            self._bloom.add(jti)
+            self._local.append(jti)
+
+    def is_revoked(self, jti):
+        self._sync()
+        if jti not in self._bloom:
+            return False
+        return self.store.contains(jti)
+
+
+def make_store(config):
+    kind = config.get('REVOCATION_STORE', 'sql')
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'sql':
+        return SQLStore()
+    if kind == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("REVOCATION_STORE='redis' requires the redis package")
+        url = config.get('REVOCATION_REDIS_URL') or config['CACHE_REDIS_URL']
+        return RedisStore(redis.Redis.from_url(url))
+    raise RuntimeError(f"Unknown REVOCATION_STORE: {kind}")
+
+
+def init_app(app, jwt):
+    config = app.config
+    app.extensions['revocation'] = Revocation(
+        make_store(config),
+        sync_interval=config.get('REVOCATION_SYNC_INTERVAL', 2.0),
+        capacity=config.get('REVOCATION_BLOOM_CAPACITY', 100000),
+        error_rate=config.get('REVOCATION_BLOOM_ERROR_RATE', 0.001),
+        rebuild_interval=config.get('REVOCATION_REBUILD_INTERVAL', 3600),
+    )
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        checker = current_app.extensions['revocation']
+        if 'ver' in jwt_payload and checker.is_revoked(_user_key(jwt_payload['sub'], jwt_payload['ver'])):
+            return True
+        if 'fam' in jwt_payload and checker.is_revoked(_family_key(jwt_payload['fam'])):
+            return True
+        return checker.is_revoked(jwt_payload['jti'])
+
+
+def _user_key(user_id, version):
+    return f"user:{user_id}:{version}"
+
+
+def _family_key(family):
+    return f"fam:{family}"
+
+
+def revoke_token(jwt_payload):
+    """Revoca el token (payload de get_jwt()) hasta su vencimiento."""
+    current_app.extensions['revocation'].revoke(jwt_payload['jti'], jwt_payload['exp'])
+
+
+def revoke_user(user_id, version, expires_at):
+    """Revoca todos los tokens del usuario con claim ver=version. expires_at
+    (epoch) debe cubrir al token mas nuevo de esa version."""
+    current_app.extensions['revocation'].revoke(_user_key(user_id, version), expires_at)
+
+
+def revoke_family(family, expires_at):
+    """Revoca todos los tokens con claim fam=family (una sesion de login)."""
+    current_app.extensions['revocation'].revoke(_family_key(family), expires_at)
+
+
+@jobs.periodic('revocation.purge', 'REVOCATION_PURGE_INTERVAL', 3600)
+def _purge():
+    current_app.extensions['revocation'].store.purge()
+    db.session.commit()
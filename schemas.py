@@ -1,7 +1,7 @@
 from flask_marshmallow import Marshmallow
 from marshmallow import fields, ValidationError
 from models import User, Product, Order, OrderItem, Comment, Category,Roles
-from validators import validate_password, validate_phone, validate_email,validate_price, validate_stock
+from validators import validate_password, validate_phone, validate_email,validate_price, validate_stock, validate_stars, validate_id_code
 
 
 ma = Marshmallow()
@@ -16,6 +16,8 @@ class UserSchema(ma.SQLAlchemyAutoSchema):
         model = User
         load_instance = True
         include_fk = True
+        # Lo sube authz.user_changed; si el usuario lo pudiera bajar, anularia su revocacion
+        dump_only = ('token_version',)
 
     def get_role_name(self, obj):
         # Diccionario de mapeo de claves a nombres legibles
@@ -28,13 +30,25 @@ class UserSchema(ma.SQLAlchemyAutoSchema):
         return role_mapping.get(obj.role, obj.role)
         
 
+RATING_FIELDS = ('rating_count', 'rating_sum', 'rating_avg', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5')
+
 class ProductSchema(ma.SQLAlchemyAutoSchema):
     price = fields.Float(required=True, validate=validate_price) 
     stock = fields.Integer(required=True, validate=validate_stock)
+    id_code = fields.String(validate=validate_id_code)
+    rating = fields.Method("get_rating", dump_only=True)
     class Meta:
         model = Product
         load_instance = True
         include_fk = True
+        exclude = RATING_FIELDS
+
+    def get_rating(self, obj):
+        return {
+            "average": round(obj.rating_avg or 0, 2),
+            "count": obj.rating_count or 0,
+            "histogram": {str(n): getattr(obj, f"stars_{n}") or 0 for n in range(1, 6)},
+        }
 
 
 
@@ -53,6 +67,7 @@ class OrderSchema(ma.SQLAlchemyAutoSchema):
         include_fk = True
 
 class CommentSchema(ma.SQLAlchemyAutoSchema):
+    stars = fields.Integer(required=True, validate=validate_stars)
     class Meta:
         model = Comment
         load_instance = True
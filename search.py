@@ -0,0 +1,153 @@
+import re
+
+from sqlalchemy import Float, Integer, column, text
+
+from models import db, Product, Category, PRODUCT_SEARCH_TABLE
+from pagination import decode_cursor, encode_cursor
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_CURSOR_COLUMNS = [column('rank', Float), column('id', Integer)]
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def tokenize(q):
+    return _TOKEN_RE.findall((q or '').lower())
+
+
+class SQLiteSearchIndex:
+    # Pesos bm25 por columna: name, description, category
+    _RANK = f"bm25({PRODUCT_SEARCH_TABLE}, 10.0, 1.0, 4.0)"
+
+    def build_query(self, tokens):
+        # Cada termino va entre comillas (sin operadores de usuario) y con prefijo
+        return ' '.join(f'"{t}"*' for t in tokens)
+
+    def upsert(self, rows):
+        db.session.execute(
+            text(f"DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid = :id"),
+            [{"id": r["id"]} for r in rows],
+        )
+        db.session.execute(
+            text(f"INSERT INTO {PRODUCT_SEARCH_TABLE} (rowid, name, description, category) "
+                 "VALUES (:id, :name, :description, :category)"),
+            rows,
+        )
+
+    def delete(self, product_ids):
+        db.session.execute(
+            text(f"DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE rowid = :id"),
+            [{"id": pid} for pid in product_ids],
+        )
+
+    def matches_sql(self):
+        return (f"SELECT rowid AS id, {self._RANK} AS rank FROM {PRODUCT_SEARCH_TABLE} "
+                f"WHERE {PRODUCT_SEARCH_TABLE} MATCH :q")
+
+
+class PostgresSearchIndex:
+    _DOCUMENT = (
+        "setweight(to_tsvector('simple', coalesce(:name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(:category, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(:description, '')), 'C')"
+    )
+
+    def build_query(self, tokens):
+        return ' & '.join(f'{t}:*' for t in tokens)
+
+    def upsert(self, rows):
+        db.session.execute(
+            text(f"INSERT INTO {PRODUCT_SEARCH_TABLE} (product_id, document) "
+                 f"VALUES (:id, {self._DOCUMENT}) "
+                 "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"),
+            rows,
+        )
+
+    def delete(self, product_ids):
+        db.session.execute(
+            text(f"DELETE FROM {PRODUCT_SEARCH_TABLE} WHERE product_id = :id"),
+            [{"id": pid} for pid in product_ids],
+        )
+
+    def matches_sql(self):
+        # ts_rank es "mayor es mejor"; se niega para ordenar ascendente igual que bm25
+        return (f"SELECT product_id AS id, -ts_rank(document, query) AS rank "
+                f"FROM {PRODUCT_SEARCH_TABLE}, to_tsquery('simple', :q) AS query "
+                "WHERE document @@ query")
+
+
+_BACKENDS = {
+    'sqlite': SQLiteSearchIndex(),
+    'postgresql': PostgresSearchIndex(),
+}
+
+
+def get_index():
+    dialect = db.session.get_bind().dialect.name
+    try:
+        return _BACKENDS[dialect]
+    except KeyError:
+        raise RuntimeError(f"Full-text search is not supported on {dialect}")
+
+
+def _document(product, category_name):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "description": product.description,
+        "category": category_name,
+    }
+
+
+def index_products(products):
+    """Agrega o reemplaza productos en el indice, dentro de la transaccion actual."""
+    products = list(products)
+    if not products:
+        return
+    category_ids = {p.category_id for p in products if p.category_id}
+    names = {}
+    if category_ids:
+        names = dict(db.session.query(Category.id, Category.name)
+                     .filter(Category.id.in_(category_ids)).all())
+    get_index().upsert([_document(p, names.get(p.category_id)) for p in products])
+
+
+def reindex_products(product_ids):
+    """Reindexa por id, p.ej. cuando cambia la categoria (y su nombre) de
+    muchos productos a la vez. Dentro de la transaccion actual."""
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 1000):
+        index_products(Product.query.filter(Product.id.in_(product_ids[start:start + 1000])))
+
+
+def remove_products(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        get_index().delete(product_ids)
+
+
+def search_products(q, cursor=None, limit=50):
+    """Busqueda rankeada. Devuelve (products, next_cursor) igual que keyset_paginate."""
+    tokens = tokenize(q)
+    if not tokens:
+        raise SearchQueryError("Search query is required")
+
+    index = get_index()
+    params = {"q": index.build_query(tokens), "limit": limit + 1}
+    sql = f"SELECT id, rank FROM ({index.matches_sql()}) AS matches"
+    if cursor:
+        params["rank"], params["id"] = decode_cursor(cursor, _CURSOR_COLUMNS)
+        sql += " WHERE (rank > :rank OR (rank = :rank AND id > :id))"
+    sql += " ORDER BY rank, id LIMIT :limit"
+
+    hits = db.session.execute(text(sql), params).all()
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor([hits[-1].rank, hits[-1].id])
+
+    ids = [hit.id for hit in hits]
+    by_id = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()} if ids else {}
+    return [by_id[i] for i in ids if i in by_id], next_cursor
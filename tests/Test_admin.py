@@ -68,3 +68,61 @@ def test_delete(client,access_token):
   assert response.get_json()
   
 
+
+def _statements(app, fn):
+  from sqlalchemy import event
+  statements = []
+  with app.app_context():
+    engine = db.engine
+  listener = lambda conn, cursor, statement, *args: statements.append(statement)
+  event.listen(engine, "before_cursor_execute", listener)
+  try:
+    fn()
+  finally:
+    event.remove(engine, "before_cursor_execute", listener)
+  return statements
+
+def test_role_claims_skip_user_lookup(app, client):
+  token = client.post('/auth/login', json={"email": "testuser@example.com", "password": "Hashedpassword123"}).get_json()["access_token"]
+  headers = {"Authorization": f"Bearer {token}"}
+  client.get("/admin/get_user/1", headers=headers)  # sincroniza el filtro de revocacion
+  statements = _statements(app, lambda: client.get("/admin/get_user/1", headers=headers))
+  # Solo el SELECT del usuario pedido, nada para autorizar
+  assert len(statements) == 1
+
+def test_role_change_revokes_tokens(app, client, access_token):
+  client.post('/auth/register', json={
+        "username": "seller",
+        "email": "seller@example.com",
+        "password": "Password123",
+        "phone": "+352123456780",
+        "address": "av.state 532"
+    })
+  admin = {"Authorization": f"Bearer {access_token}"}
+  client.patch("/admin/change_role/2", json={"role": "admin"}, headers=admin)
+  token = client.post('/auth/login', json={"email": "seller@example.com", "password": "Password123"}).get_json()["access_token"]
+  headers = {"Authorization": f"Bearer {token}"}
+  assert client.get("/admin/get_all_users", headers=headers).status_code == 200
+
+  client.patch("/admin/change_role/2", json={"role": "user"}, headers=admin)
+  # El token con el rol viejo queda revocado
+  assert client.get("/admin/get_all_users", headers=headers).status_code == 401
+  token = client.post('/auth/login', json={"email": "seller@example.com", "password": "Password123"}).get_json()["access_token"]
+  assert client.get("/admin/get_all_users", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+def test_claimless_token_uses_invalidated_cache(app, client, access_token):
+  client.post('/auth/register', json={
+        "username": "other",
+        "email": "other@example.com",
+        "password": "Password123",
+        "phone": "+352123456781",
+        "address": "av.state 532"
+    })
+  admin = {"Authorization": f"Bearer {access_token}"}
+  client.patch("/admin/change_role/2", json={"role": "admin"}, headers=admin)
+  with app.app_context():
+    legacy = create_access_token(identity="2")
+  headers = {"Authorization": f"Bearer {legacy}"}
+  assert client.get("/admin/get_all_users", headers=headers).status_code == 200
+  client.patch("/admin/change_role/2", json={"role": "user"}, headers=admin)
+  assert client.get("/admin/get_all_users", headers=headers).status_code == 403
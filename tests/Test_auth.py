@@ -84,6 +84,12 @@ def test_update_user(client, access_token):
     assert response.status_code == 200
     assert response.get_json()["username"] == "updateduser"
 
+def test_update_user_cannot_set_token_version(client, app, access_token):
+    response = client.patch('/auth/update', json={"token_version": 0},
+                            headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 400
+    assert "token_version" in response.get_json()
+
 def test_update_user_deactivate_account(client, access_token):
     response = client.patch('/auth/update', json={
         "is_active": False
@@ -99,4 +105,140 @@ def test_get_current_user(client, access_token):
 def test_logout(client, access_token):
     response = client.post('/auth/logout', headers={"Authorization": f"Bearer {access_token}"})
     assert response.status_code == 200
-    assert response.get_json()["msg"] == "Successfully logged out"
\ No newline at end of file
+    assert response.get_json()["msg"] == "Successfully logged out"
+    # El token queda revocado
+    response = client.get('/auth/me', headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 401
+
+def test_deactivated_account_token_is_revoked(client, access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    assert client.patch('/auth/update', json={"is_active": False}, headers=headers).status_code == 200
+    assert client.get('/auth/me', headers=headers).status_code == 401
+
+def test_revocation_seen_by_other_workers(app, access_token):
+    """Un worker con su propio filtro ve la revocacion al sincronizar."""
+    from flask_jwt_extended import decode_token
+    from revocation import Revocation, SQLStore
+    clock = [0.0]
+    other = Revocation(SQLStore(), sync_interval=2.0, clock=lambda: clock[0])
+    with app.app_context():
+        payload = decode_token(access_token)
+        assert not other.is_revoked(payload['jti'])
+        app.extensions['revocation'].revoke(payload['jti'], payload['exp'])
+        db.session.commit()
+        clock[0] = 2.5
+        assert other.is_revoked(payload['jti'])
+
+def test_bloom_filter_and_memory_store():
+    from revocation import BloomFilter, MemoryStore
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+    now = [100.0]
+    store = MemoryStore(clock=lambda: now[0])
+    store.add("a", 110)
+    store.add("b", 200)
+    assert store.contains("a") and store.contains("b")
+    now[0] = 150
+    store.add("c", 300)  # expulsa los vencidos
+    assert not store.contains("a")
+    assert len(store) == 2
+
+def _login(client):
+    return client.post('/auth/login', json={"email": "testuser@example.com", "password": "Hashedpassword123"}).get_json()
+
+def test_refresh_rotates_tokens(client):
+    pair = _login(client)
+    response = client.post('/auth/refresh', headers={"Authorization": f"Bearer {pair['refresh_token']}"})
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated["refresh_token"] != pair["refresh_token"]
+    assert client.get('/auth/me', headers={"Authorization": f"Bearer {rotated['access_token']}"}).status_code == 200
+    # Un access token no sirve para renovar
+    assert client.post('/auth/refresh', headers={"Authorization": f"Bearer {pair['access_token']}"}).status_code == 422
+
+def test_refresh_reuse_revokes_family(client):
+    pair = _login(client)
+    rotated = client.post('/auth/refresh', headers={"Authorization": f"Bearer {pair['refresh_token']}"}).get_json()
+    # Reusar el refresh viejo revoca toda la familia
+    assert client.post('/auth/refresh', headers={"Authorization": f"Bearer {pair['refresh_token']}"}).status_code == 401
+    assert client.post('/auth/refresh', headers={"Authorization": f"Bearer {rotated['refresh_token']}"}).status_code == 401
+    assert client.get('/auth/me', headers={"Authorization": f"Bearer {rotated['access_token']}"}).status_code == 401
+
+def test_logout_revokes_refresh_family(client):
+    pair = _login(client)
+    client.post('/auth/logout', headers={"Authorization": f"Bearer {pair['access_token']}"})
+    assert client.post('/auth/refresh', headers={"Authorization": f"Bearer {pair['refresh_token']}"}).status_code == 401
+
+def test_login_rehashes_outdated_password(client, app):
+    with app.app_context():
+        user = User.query.filter_by(email="testuser@example.com").first()
+        user.password = generate_password_hash("Hashedpassword123", method="pbkdf2:sha256:1000")
+        db.session.commit()
+    assert client.post('/auth/login', json={"email": "testuser@example.com", "password": "Hashedpassword123"}).status_code == 200
+    with app.app_context():
+        stored = User.query.filter_by(email="testuser@example.com").first().password
+        assert stored.startswith("scrypt:")
+        assert check_password_hash(stored, "Hashedpassword123")
+
+def test_login_fails_fast_when_hashing_pool_is_saturated(client, app):
+    from passwords import Hasher
+    hasher = Hasher(workers=1, max_pending=1)
+    hasher._slots.acquire()  # el unico lugar ya esta ocupado
+    app.extensions['passwords'] = hasher
+    response = client.post('/auth/login', json={"email": "testuser@example.com", "password": "Hashedpassword123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+def test_hasher_process_pool():
+    from passwords import Hasher
+    hasher = Hasher(method="pbkdf2:sha256:1000", workers=1)
+    try:
+        pwhash = hasher.hash("secret")
+        assert hasher.verify(pwhash, "secret") and not hasher.verify(pwhash, "other")
+        assert not hasher.needs_rehash(pwhash)
+        assert hasher.needs_rehash(generate_password_hash("secret", method="pbkdf2:sha256:2000"))
+    finally:
+        hasher.shutdown()
+
+def test_login_rate_limited_before_db(client, app):
+    from sqlalchemy import event
+    app.config["RATELIMIT_RULES"] = {"login": [("email", 3, 60)]}
+    attempt = {"email": "TestUser@example.com", "password": "wrong"}
+    for _ in range(3):
+        assert client.post('/auth/login', json=attempt).status_code == 401
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        # La clave se normaliza: otra capitalizacion cuenta igual
+        response = client.post('/auth/login', json={**attempt, "email": "testuser@example.com"})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert statements == []
+
+def test_sliding_window_memory_backend():
+    from ratelimit import MemoryBackend
+    now = [0.0]
+    backend = MemoryBackend(maxsize=2, clock=lambda: now[0])
+    assert all(backend.hit("a", 4, 60)[0] for _ in range(4))
+    allowed, retry_after = backend.hit("a", 4, 60)
+    assert not allowed and retry_after == 60
+    # A mitad de la ventana siguiente la anterior pesa la mitad: entran 2
+    now[0] = 90.0
+    assert backend.hit("a", 4, 60)[0] and backend.hit("a", 4, 60)[0]
+    assert not backend.hit("a", 4, 60)[0]
+    # Las claves inactivas se expulsan por LRU
+    backend.hit("b", 4, 60)
+    backend.hit("c", 4, 60)
+    assert len(backend) == 2
+    assert backend.hit("a", 4, 60)[0]
@@ -0,0 +1,60 @@
+import pytest
+
+from cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == "a"  # 1 pasa a ser el mas reciente
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert len(cache) == 2
+
+def test_lru_cache_ttl_expiry_and_delete():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    cache.set("k", {"id": 1})
+    clock.now = 4.9
+    assert cache.get("k") == {"id": 1}
+    clock.now = 5.0
+    assert cache.get("k") is None
+
+    cache.set("k", 1)
+    cache.delete("k")
+    assert cache.get("k") is None
+
+def test_lru_cache_add_only_if_absent():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+    assert cache.add("k", 1)
+    assert not cache.add("k", 2)
+    assert cache.get("k") == 1
+    clock.now = 6.0
+    assert cache.add("k", 3)
+    assert cache.get("k") == 3
+
+def test_lru_cache_without_eviction_rejects_until_entries_expire():
+    from cache import CacheFull
+    clock = FakeClock()
+    cache = LRUCache(maxsize=2, ttl=5, clock=clock, evict=False)
+    cache.set("a", 1)
+    assert cache.add("b", 2, ttl=10)
+    with pytest.raises(CacheFull):
+        cache.add("c", 3)
+    cache.set("a", 4)  # reemplazar una clave existente siempre se puede
+    assert (cache.get("a"), cache.get("b")) == (4, 2)
+    clock.now = 6.0
+    assert cache.add("c", 3)
+    assert cache.get("b") == 2
@@ -112,9 +112,63 @@ def test_get_products(client, user_access_token):
     headers = {'Authorization': f'Bearer {user_access_token}'}
     response = client.get('/products/products', headers=headers)
     assert response.status_code == 200
-    assert all('description' in product for product in response.json)
-    assert all('image_url' in product for product in response.json)
-    assert all('category_id' in product for product in response.json)
+    products = response.json["items"]
+    assert all('description' in product for product in products)
+    assert all('image_url' in product for product in products)
+    assert all('category_id' in product for product in products)
+
+def test_get_products_cursor_pagination(client, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    first = client.get('/products/products?limit=1', headers=headers).get_json()
+    assert [p["name"] for p in first["items"]] == ["Test Product 1"]
+    assert first["next_cursor"]
+
+    second = client.get(f'/products/products?limit=1&cursor={first["next_cursor"]}', headers=headers).get_json()
+    assert [p["name"] for p in second["items"]] == ["Test Product 2"]
+    assert second["next_cursor"] is None
+
+def test_created_at_sort_pages_over_server_timestamps(client, app, user_access_token):
+    from sqlalchemy import text
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    with app.app_context():
+        db.session.add_all([Product(name=f"Bulk {i}", price=1.0, stock=1) for i in range(8)])
+        db.session.commit()
+        # Timestamps escritos por la base (sin microsegundos), varios iguales
+        db.session.execute(text("UPDATE products SET created_at = datetime('now', '-1 hour') WHERE id IN (3, 4, 5)"))
+        db.session.execute(text("UPDATE products SET created_at = datetime('now', '-2 hours') WHERE id = 9"))
+        db.session.commit()
+        expected = [p.id for p in Product.query.order_by(db.func.datetime(Product.created_at), Product.id)]
+
+    def walk(sort):
+        ids, cursor = [], None
+        for _ in range(10):
+            url = f'/products/products?sort={sort}&limit=3' + (f'&cursor={cursor}' if cursor else '')
+            body = client.get(url, headers=headers).get_json()
+            ids += [p["id"] for p in body["items"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids
+        raise AssertionError(f"{sort} pagination did not terminate: {ids}")
+
+    assert walk('created_at') == expected
+    assert walk('-created_at') == expected[::-1]
+
+def test_get_products_by_category_paginated(client, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    response = client.get('/products/categories/1?limit=5', headers=headers)
+    assert response.status_code == 200
+    assert len(response.json["items"]) == 2
+    assert response.json["next_cursor"] is None
+
+    response = client.get('/products/categories/99', headers=headers)
+    assert response.json == {"items": [], "next_cursor": None}
+
+def test_get_products_invalid_cursor(client, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    response = client.get('/products/products?cursor=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+    response = client.get('/products/products?limit=0', headers=headers)
+    assert response.status_code == 400
     
 def test_create_category(client, admin_access_token):
     headers = {'Authorization': f'Bearer {admin_access_token}'}
@@ -161,4 +215,417 @@ def test_create_category_unauthorized(client, user_access_token):
     # Verificar que la respuesta indique acceso prohibido
     assert response.status_code == 403
     response_data = response.get_json()
-    assert response_data["msg"] == "Access forbidden"
\ No newline at end of file
+    assert response_data["msg"] == "Access forbidden"
+
+def test_search_products_index_sync(client, seller_access_token, user_access_token):
+    seller = {'Authorization': f'Bearer {seller_access_token}'}
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    response = client.post('/products/products', json={
+        "name": "Wireless Headphones",
+        "description": "Noise cancelling",
+        "price": 99.0,
+        "stock": 5,
+        "category_id": 1
+    }, headers=seller)
+    assert response.status_code == 201
+    product_id = response.get_json()["id"]
+
+    # Coincide por nombre, prefijo, descripcion y nombre de categoria
+    for q in ["headphones", "wire", "cancelling", "electronics"]:
+        response = client.get(f'/products/search?q={q}', headers=headers)
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json["items"]] == [product_id]
+
+    client.patch(f'/products/{product_id}', json={"name": "Studio Monitors"}, headers=seller)
+    assert client.get('/products/search?q=headphones', headers=headers).json["items"] == []
+    assert len(client.get('/products/search?q=studio', headers=headers).json["items"]) == 1
+
+    client.delete(f'/products/{product_id}', headers=seller)
+    assert client.get('/products/search?q=studio', headers=headers).json["items"] == []
+
+def test_deleting_category_reindexes_its_products(client, seller_access_token, admin_access_token, user_access_token):
+    seller = {'Authorization': f'Bearer {seller_access_token}'}
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    client.post('/products/products', json={"name": "Speaker", "price": 50.0, "stock": 1, "category_id": 1}, headers=seller)
+    assert len(client.get('/products/search?q=electronics', headers=headers).json["items"]) == 1
+
+    response = client.delete('/products/categories/1', headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 200
+    assert client.get('/products/search?q=electronics', headers=headers).json["items"] == []
+    assert len(client.get('/products/search?q=speaker', headers=headers).json["items"]) == 1
+
+def test_deleting_category_changes_product_etags(client, admin_access_token, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    first = client.get('/products/products/1', headers=headers)
+    assert first.json["category_id"] == 1
+
+    client.delete('/products/categories/1', headers={'Authorization': f'Bearer {admin_access_token}'})
+    response = client.get('/products/products/1', headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json["category_id"] is None
+
+def test_cached_body_from_older_version_is_not_served(client, app, user_access_token):
+    import etag
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    assert client.get('/products/products/1', headers=headers).json["name"] == "Test Product 1"
+    # Otro worker cambia el producto: sube la version pero no limpia la cache de este
+    with app.app_context():
+        db.session.get(Product, 1).name = "Renamed"
+        etag.bump('product:1')
+        db.session.commit()
+    assert client.get('/products/products/1', headers=headers).json["name"] == "Renamed"
+
+def test_search_products_ranked_pagination(client, app, user_access_token):
+    from search import index_products
+    with app.app_context():
+        index_products(Product.query.all())
+        db.session.commit()
+
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    first = client.get('/products/search?q=test product&limit=1', headers=headers).get_json()
+    assert len(first["items"]) == 1 and first["next_cursor"]
+    second = client.get(f'/products/search?q=test product&limit=1&cursor={first["next_cursor"]}', headers=headers).get_json()
+    assert len(second["items"]) == 1 and second["next_cursor"] is None
+    assert first["items"][0]["id"] != second["items"][0]["id"]
+
+    assert client.get('/products/search?q=', headers=headers).status_code == 400
+
+def test_get_product_cache_hits_and_invalidation(client, user_access_token, admin_access_token, seller_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+
+    assert client.get('/products/products/1', headers=headers).json["stock"] == 100
+    assert client.get('/products/products/1', headers=headers).json["stock"] == 100
+    stats = client.get('/products/cache/stats', headers=admin).json["products"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # Una actualizacion invalida la entrada y la siguiente lectura ve el cambio
+    client.patch('/products/1', json={"stock": 7}, headers={'Authorization': f'Bearer {seller_access_token}'})
+    assert client.get('/products/products/1', headers=headers).json["stock"] == 7
+
+    # El cambio de stock al agregar a una orden tambien invalida
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 2}, headers=headers)
+    assert client.get('/products/products/1', headers=headers).json["stock"] == 5
+
+    assert client.get('/products/products/999', headers=headers).status_code == 404
+    assert client.get('/products/cache/stats', headers=headers).status_code == 403
+
+def test_conditional_get_products_and_categories(client, user_access_token, seller_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    for url in ['/products/products', '/products/categories', '/products/products/1', '/products/categories/1']:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        assert response.headers['ETag']
+        assert 'must-revalidate' in response.headers['Cache-Control']
+
+        cached = client.get(url, headers={**headers, 'If-None-Match': response.headers['ETag']})
+        assert cached.status_code == 304
+        assert cached.data == b''
+
+    products_etag = client.get('/products/products', headers=headers).headers['ETag']
+    other_product_etag = client.get('/products/products/2', headers=headers).headers['ETag']
+    client.patch('/products/1', json={"price": 12.5}, headers={'Authorization': f'Bearer {seller_access_token}'})
+    response = client.get('/products/products', headers={**headers, 'If-None-Match': products_etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != products_etag
+    # Un producto sin cambios conserva su ETag
+    response = client.get('/products/products/2', headers={**headers, 'If-None-Match': other_product_etag})
+    assert response.status_code == 304
+
+    categories_etag = client.get('/products/categories', headers=headers).headers['ETag']
+    client.post('/products/categories', json={"name": "Books"}, headers={'Authorization': f'Bearer {admin_access_token}'})
+    response = client.get('/products/categories', headers={**headers, 'If-None-Match': categories_etag})
+    assert response.status_code == 200
+    assert len(response.json) == 2
+
+def test_bulk_import_ndjson_with_row_errors(client, app, seller_access_token, user_access_token):
+    import json
+    rows = [
+        {"name": "Keyboard", "price": 30, "stock": 3, "category_id": 1, "id_code": "KB-1"},
+        {"name": "Mouse", "price": -1, "stock": 3},
+        {"name": "Cable", "price": 2.5, "stock": "many"},
+        {"name": "Keyboard copy", "price": 31, "stock": 1, "id_code": "KB-1"},
+        {"name": "Monitor", "price": 150, "stock": 0, "category_id": 42},
+        {"name": "Webcam", "price": 45.5, "stock": 8},
+    ]
+    body = "\n".join(json.dumps(r) for r in rows) + "\nnot json\n"
+    app.config['IMPORT_CHUNK_SIZE'] = 4
+    response = client.post('/products/products/import', data=body, content_type='application/x-ndjson',
+                           headers={'Authorization': f'Bearer {seller_access_token}'})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["inserted"] == 2
+    assert report["failed"] == 5
+    errors = {e["row"]: e["errors"] for e in report["errors"]}
+    assert set(errors) == {2, 3, 4, 5, 7}
+    assert "price" in errors[2] and "stock" in errors[3]
+    # El error de la base no llega al cliente
+    assert errors[4] == {"id_code": ["Duplicate id_code."]}
+    assert "category_id" in errors[5]
+
+    with app.app_context():
+        assert {p.name for p in Product.query.filter(Product.name.in_(["Keyboard", "Webcam"]))} == {"Keyboard", "Webcam"}
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    assert len(client.get('/products/search?q=webcam', headers=headers).json["items"]) == 1
+
+def test_bulk_import_csv_upload(client, app, admin_access_token, user_access_token):
+    import io
+    csv_body = "name,description,price,stock,category_id,is_active\nLamp,Desk lamp,12.5,4,1,true\nChair,,80,2,,no\n"
+    response = client.post('/products/products/import', data={"file": (io.BytesIO(csv_body.encode()), "items.csv")},
+                           content_type='multipart/form-data',
+                           headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 200
+    assert response.get_json() == {"inserted": 2, "failed": 0, "errors": [], "errors_truncated": False}
+    with app.app_context():
+        chair = Product.query.filter_by(name="Chair").one()
+        assert chair.is_active is False and chair.category_id is None and chair.stock == 2
+
+    response = client.post('/products/products/import', data="x", content_type='application/json',
+                           headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 400
+    response = client.post('/products/products/import?format=csv', data=csv_body,
+                           headers={'Authorization': f'Bearer {user_access_token}'})
+    assert response.status_code == 403
+
+def test_bulk_import_malformed_csv_reports_line(client, app, admin_access_token):
+    csv_body = "name,price,stock\nLamp,12.5,4\nHuge," + "9" * 200000 + ",1\nChair,80,2\n"
+    app.config['IMPORT_CHUNK_SIZE'] = 10
+    response = client.post('/products/products/import?format=csv', data=csv_body,
+                           headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["line"] == 3
+    # Lo leido antes de la linea rota queda importado y se informa
+    assert body["report"]["inserted"] == 1
+    with app.app_context():
+        assert {p.name for p in Product.query.filter(Product.name.in_(["Lamp", "Chair"]))} == {"Lamp"}
+
+def test_bulk_import_reports_rows_the_database_rejects(client, app, admin_access_token, monkeypatch):
+    import json
+    import importer
+    from sqlalchemy.exc import DataError
+    insert = importer._insert
+    def strict_insert(rows):
+        # Lo que PostgreSQL rechaza con DataError (p.ej. numeric field overflow)
+        if any(values["name"] == "Overflow" for values in rows):
+            raise DataError("INSERT INTO products ...", {}, Exception("numeric field overflow"))
+        return insert(rows)
+    monkeypatch.setattr(importer, "_insert", strict_insert)
+    rows = [{"name": "Lamp", "price": 1, "stock": 1}, {"name": "Overflow", "price": 1, "stock": 1}]
+    response = client.post('/products/products/import', data="\n".join(json.dumps(r) for r in rows),
+                           content_type='application/x-ndjson',
+                           headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report["inserted"] == 1
+    assert report["errors"] == [{"row": 2, "errors": {"_row": ["Invalid value."]}}]
+
+def test_export_catalog_ndjson_and_csv(client, app, user_access_token):
+    import csv, io, json
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    app.config['EXPORT_BATCH_SIZE'] = 1
+
+    response = client.get('/products/products/export', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r["name"] for r in rows] == ["Test Product 1", "Test Product 2"]
+    assert set(client.get('/products/products/1', headers=headers).json) - {"rating"} < set(rows[0])
+    assert {"rating_avg", "rating_count"} < set(rows[0])
+
+    response = client.get('/products/products/export?format=csv&category_id=1', headers=headers)
+    assert response.mimetype == 'text/csv'
+    rows = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [r["price"] for r in rows] == ["10.99", "20.5"]
+
+    assert client.get('/products/products/export?category_id=2', headers=headers).data == b''
+    assert client.get('/products/products/export?updated_since=2999-01-01', headers=headers).data == b''
+    assert client.get('/products/products/export?updated_since=yesterday', headers=headers).status_code == 400
+    assert client.get('/products/products/export?format=xml', headers=headers).status_code == 400
+
+def test_export_updated_since_boundary_over_server_timestamps(client, app, user_access_token):
+    import json
+    from urllib.parse import quote
+    from sqlalchemy import text
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    with app.app_context():
+        # Como lo escribe la base: sin microsegundos
+        db.session.execute(text("UPDATE products SET updated_at = '2026-03-01 10:00:00' WHERE id = 1"))
+        db.session.execute(text("UPDATE products SET updated_at = '2026-03-01 09:59:59' WHERE id = 2"))
+        db.session.commit()
+
+    def exported(since):
+        data = client.get(f'/products/products/export?updated_since={quote(since)}', headers=headers).data
+        return [json.loads(line)["id"] for line in data.decode().splitlines()]
+    assert exported('2026-03-01 10:00:00') == [1]
+    assert exported('2026-03-01T10:00:00') == [1]
+    assert exported('2026-03-01T10:00:00.000000') == [1]
+    assert exported('2026-03-01T12:00:00+02:00') == [1]
+    assert exported('2026-03-01T09:59:59') == [1, 2]
+    assert exported('2026-03-01T10:00:01') == []
+
+def test_comment_ratings_summary_and_sorting(client, user_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    assert client.get('/products/products/2', headers=headers).json["rating"]["count"] == 0
+
+    for stars in (5, 4, 4):
+        response = client.post('/products/products/2/comments', json={"content": "ok", "stars": stars}, headers=headers)
+        assert response.status_code == 201
+    response = client.post('/products/products/1/comments', json={"content": "meh", "stars": 2}, headers=headers)
+    low_comment_id = response.json["id"]
+    assert client.post('/products/products/1/comments', json={"content": "x", "stars": 6}, headers=headers).status_code == 400
+    assert client.post('/products/products/99/comments', json={"content": "x", "stars": 3}, headers=headers).status_code == 404
+
+    rating = client.get('/products/products/2', headers=headers).json["rating"]
+    assert rating == {"average": 4.33, "count": 3, "histogram": {"1": 0, "2": 0, "3": 0, "4": 2, "5": 1}}
+
+    ranked = client.get('/products/products?sort=rating', headers=headers).json["items"]
+    assert [p["id"] for p in ranked] == [2, 1]
+    filtered = client.get('/products/products?min_rating=3', headers=headers).json["items"]
+    assert [p["id"] for p in filtered] == [2]
+
+    # Solo el autor o un admin puede borrar; al borrar se descuenta del resumen
+    response = client.delete(f'/products/comments/{low_comment_id}', headers={'Authorization': f'Bearer {admin_access_token}'})
+    assert response.status_code == 200
+    assert client.get('/products/products/1', headers=headers).json["rating"]["count"] == 0
+    assert len(client.get('/products/products/2/comments', headers=headers).json["items"]) == 3
+
+def test_categories_listing_with_product_counts(client, user_access_token, seller_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    seller = {'Authorization': f'Bearer {seller_access_token}'}
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+    client.post('/products/categories', json={"name": "Empty"}, headers=admin)
+
+    listing = client.get('/products/categories', headers=headers).json
+    assert [c["product_count"] for c in listing] == [
+        {"total": 2, "active": 2, "in_stock": 2},
+        {"total": 0, "active": 0, "in_stock": 0},
+    ]
+    client.get('/products/categories', headers=headers)
+    stats = client.get('/products/cache/stats', headers=admin).json["categories"]
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # Cambios que afectan los conteos invalidan el listado cacheado
+    client.patch('/products/2', json={"stock": 0}, headers=seller)
+    client.patch('/products/1', json={"is_active": False}, headers=seller)
+    client.post('/products/products', json={"name": "Extra", "price": 1.0, "stock": 1, "category_id": 2}, headers=seller)
+    listing = client.get('/products/categories', headers=headers).json
+    assert [c["product_count"] for c in listing] == [
+        {"total": 2, "active": 1, "in_stock": 0},
+        {"total": 1, "active": 1, "in_stock": 1},
+    ]
+
+def test_get_products_filters_sort_and_facets(client, seller_access_token, user_access_token):
+    seller = {'Authorization': f'Bearer {seller_access_token}'}
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    client.post('/products/products', json={"name": "Cheap", "price": 3.0, "stock": 0, "category_id": 1}, headers=seller)
+    client.post('/products/products', json={"name": "Premium", "price": 300.0, "stock": 2, "is_active": False}, headers=seller)
+
+    def names(query):
+        response = client.get(f'/products/products?{query}', headers=headers)
+        assert response.status_code == 200
+        return [p["name"] for p in response.json["items"]]
+
+    assert names('sort=-price') == ["Premium", "Test Product 2", "Test Product 1", "Cheap"]
+    assert names('min_price=5&max_price=25&sort=price') == ["Test Product 1", "Test Product 2"]
+    assert names('in_stock=true&is_active=true&category_id=1') == ["Test Product 1", "Test Product 2"]
+    assert names('is_active=false') == ["Premium"]
+    assert names('sort=price&limit=2&min_price=1') == ["Cheap", "Test Product 1"]
+
+    body = client.get('/products/products?min_price=5&max_price=25&category_id=1&facets=true', headers=headers).json
+    # La faceta de categoria ignora el filtro de categoria y la de precio el de precio
+    assert body["facets"]["categories"] == [{"id": 1, "count": 2}]
+    assert [b["count"] for b in body["facets"]["price"][:3]] == [1, 2, 0]
+    assert body["facets"]["price"][-1] == {"min": 1000, "max": None, "count": 0}
+    assert "facets" not in client.get('/products/products', headers=headers).json
+
+    assert client.get('/products/products?sort=name', headers=headers).status_code == 400
+    assert client.get('/products/products?in_stock=maybe', headers=headers).status_code == 400
+
+def test_catalog_filters_use_composite_indexes(app):
+    from sqlalchemy import event
+    from catalog import ProductQuery
+    from pagination import encode_cursor
+    with app.app_context():
+        product = db.session.get(Product, 1)
+        statements = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+        for category in (None, '1'):
+            for active in (None, 'true'):
+                for sort in ('id', 'price', '-price', 'created_at', '-created_at', 'rating'):
+                    args = {"sort": sort}
+                    if category:
+                        args["category_id"] = category
+                    if active:
+                        args["is_active"] = active
+                    query = ProductQuery(args)
+                    # El SQL real de la pagina, con cursor
+                    cursor = encode_cursor([getattr(product, c.key) for c in query.SORTS[sort][0]])
+                    statements.clear()
+                    event.listen(db.engine, 'before_cursor_execute', capture)
+                    try:
+                        query.page(cursor=cursor, limit=50)
+                    finally:
+                        event.remove(db.engine, 'before_cursor_execute', capture)
+                    sql, params = statements[0]
+                    explain = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)
+                    plan = " ".join(row[-1] for row in explain)
+                    assert "TEMP B-TREE" not in plan, (args, plan)
+                    assert "SEARCH" in plan, (args, plan)
+        names = {index.name for index in Product.__table__.indexes}
+        assert not any('is_active' in name for name in names)
+
+def test_id_code_blocks_are_reserved_per_process(app, monkeypatch):
+    import id_codes
+    from types import SimpleNamespace
+    reserved = []
+    def reserve(engine, n, name):
+        start = sum(reserved) + 1
+        reserved.append(n)
+        return range(start, start + n)
+    monkeypatch.setattr(id_codes, "_reserve", reserve)
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), engine=object())
+    app.config['ID_CODE_BLOCK_SIZE'] = 3
+    with app.app_context():
+        values = [id_codes.take(connection, 1)[0] for _ in range(4)] + id_codes.take(connection, 5)
+    # Un bloque por cada tres codigos, sin repetir ni volver a la base por cada uno
+    assert values == list(range(1, 10))
+    assert reserved == [3, 3, 3]
+
+def test_product_id_codes_are_allocated_without_collisions(client, app, seller_access_token):
+    import json
+    seller = {'Authorization': f'Bearer {seller_access_token}'}
+    created = [
+        client.post('/products/products', json={"name": f"P{i}", "price": 1.0, "stock": 1}, headers=seller).json["id_code"]
+        for i in range(3)
+    ]
+    assert len(set(created)) == 3 and all(code.startswith("PROD-") for code in created)
+    # El prefijo reservado no se acepta desde el cliente
+    response = client.post('/products/products', json={"name": "X", "price": 1.0, "stock": 1, "id_code": "PROD-00000099"}, headers=seller)
+    assert response.status_code == 400
+
+    body = "\n".join(json.dumps({"name": f"Bulk {i}", "price": 2.0, "stock": 1}) for i in range(2500))
+    app.config['IMPORT_CHUNK_SIZE'] = 1000
+    report = client.post('/products/products/import?format=ndjson', data=body, headers=seller).get_json()
+    assert report["inserted"] == 2500 and report["failed"] == 0
+    with app.app_context():
+        codes = [code for (code,) in db.session.query(Product.id_code)]
+        assert len(codes) == len(set(codes)) == 2 + 3 + 2500
+
+
+def test_catalog_reads_do_not_load_order_items(client, app, user_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.get('/products/products', headers=headers).status_code == 200
+        assert client.get('/products/products/1', headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements and not any("order_items" in s for s in statements)
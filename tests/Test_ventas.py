@@ -0,0 +1,688 @@
+import threading
+
+import pytest
+from flask_jwt_extended import create_access_token
+from models import db, User, Product, Order, OrderItem, Category, Roles
+from werkzeug.security import generate_password_hash
+from app import create_app
+import os
+from config import get_config
+
+os.environ['APP_ENV'] = 'testing'
+
+
+def seed():
+    category = Category(name="Electronics", description="Electronic devices")
+    user = User(
+        username="buyer",
+        email="buyer@example.com",
+        password=generate_password_hash("Buyerpassword123"),
+        phone="5512345678",
+        address="av.state 532"
+    )
+    admin_user = User(
+        username="adminuser",
+        email="admin@example.com",
+        password=generate_password_hash("Adminpassword123"),
+        phone="5587654321",
+        address="admin address",
+        role=Roles.ADMIN
+    )
+    product1 = Product(name="Phone", description="Smartphone", price=200.0, stock=10, category=category)
+    product2 = Product(name="Case", description="Phone case", price=15.0, stock=3, category=category)
+    db.session.add_all([category, user, admin_user, product1, product2])
+    db.session.commit()
+
+
+@pytest.fixture
+def app():
+    """Crea una instancia de la aplicación para pruebas."""
+    app = create_app()
+    app.config.from_object(get_config())
+    with app.app_context():
+        db.create_all()
+        seed()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def file_app(tmp_path):
+    """App sobre un archivo SQLite: cada hilo usa su propia conexion."""
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'ventas.db'}"})
+    with app.app_context():
+        db.create_all()
+        seed()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    """Crea un cliente de pruebas."""
+    return app.test_client()
+
+@pytest.fixture
+def user_access_token(app):
+    with app.app_context():
+        user = User.query.filter_by(email="buyer@example.com").first()
+        return create_access_token(identity=str(user.id))
+
+@pytest.fixture
+def admin_access_token(app):
+    with app.app_context():
+        user = User.query.filter_by(email="admin@example.com").first()
+        return create_access_token(identity=str(user.id))
+
+
+def test_add_order_item_reserves_stock(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 2, "quantity": 2}, headers=headers)
+    assert response.status_code == 201
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 2, "quantity": 2}, headers=headers)
+    assert response.status_code == 400
+    assert response.json["msg"] == "Insufficient stock"
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 2, "quantity": 1}, headers=headers)
+    assert response.status_code == 201
+    assert response.json["order_item"]["quantity"] == 3
+
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 99, "quantity": 1}, headers=headers)
+    assert response.status_code == 404
+    with app.app_context():
+        assert db.session.get(Product, 2).stock == 0
+
+def test_concurrent_reservations_never_oversell(file_app):
+    from inventory import reserve_stock, release_stock
+
+    def run(operation, product_id, results):
+        with file_app.app_context():
+            change = operation(product_id, 1)
+            db.session.commit()
+            results.append(change is not None)
+
+    # 30 compradores contra 10 unidades: exactamente 10 reservas
+    reserved = []
+    threads = [threading.Thread(target=run, args=(reserve_stock, 1, reserved)) for _ in range(30)]
+    # 20 devoluciones concurrentes sobre otro producto, sin perder actualizaciones
+    released = []
+    threads += [threading.Thread(target=run, args=(release_stock, 2, released)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert reserved.count(True) == 10
+    assert released.count(True) == 20
+    with file_app.app_context():
+        assert db.session.get(Product, 1).stock == 0
+        assert db.session.get(Product, 2).stock == 3 + 20
+
+def test_reservation_does_not_lock_catalog_versions(app):
+    from sqlalchemy import event
+    from inventory import publish, reserve_stock
+    import etag
+    with app.app_context():
+        before = etag.current_versions(['products', 'product:1'])
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            change = reserve_stock(1, 1)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        # La transaccion de la reserva no toca la fila global de versiones
+        assert not any("catalog_versions" in s for s in statements)
+        publish(change)
+        after = etag.current_versions(['products', 'product:1'])
+        assert [a - b for a, b in zip(after, before)] == [1, 1]
+
+def test_add_order_items_batch(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+
+    # Lineas repetidas se suman; el producto 1 ya estaba en la orden
+    items = [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}, {"product_id": 2, "quantity": 1}]
+    response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+    assert response.status_code == 201
+    assert [r["status"] for r in response.json["items"]] == ["ok", "ok", "ok"]
+    assert {i["product_id"]: i["quantity"] for i in response.json["order_items"]} == {1: 3, 2: 2}
+
+    # Una linea sin stock y otra inexistente: no se aplica nada
+    items = [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 5}]
+    response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+    assert response.status_code == 400
+    assert [r["status"] for r in response.json["items"]] == ["skipped", "insufficient_stock"]
+    items = [{"product_id": 99, "quantity": 1}, {"product_id": 1, "quantity": 0}, {"product_id": 1, "quantity": 1}]
+    response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+    assert [r["status"] for r in response.json["items"]] == ["not_found", "invalid", "skipped"]
+
+    with app.app_context():
+        assert db.session.get(Product, 1).stock == 7
+        assert db.session.get(Product, 2).stock == 1
+
+def test_add_order_items_batch_query_count(app, client, user_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    with app.app_context():
+        products = [Product(name=f"P{i}", description="x", price=1.0, stock=100, category_id=1) for i in range(30)]
+        db.session.add_all(products)
+        db.session.commit()
+        ids = [p.id for p in products]
+        engine = db.engine
+
+    def count(n):
+        order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            items = [{"product_id": pid, "quantity": 1} for pid in ids[:n]]
+            response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert response.status_code == 201
+        return len(statements)
+
+    assert count(2) == count(30)
+
+def test_get_orders_is_paginated_and_scoped(client, user_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    admin_headers = {'Authorization': f'Bearer {admin_access_token}'}
+    ids = [client.post('/ventas/orders', headers=headers).json["order"]["id"] for _ in range(3)]
+    client.post('/ventas/orders', headers=admin_headers)
+    client.patch(f'/ventas/orders/{ids[0]}', json={"status": "paid"}, headers=admin_headers)
+
+    page = client.get('/ventas/orders?limit=2', headers=headers).json
+    assert [o["id"] for o in page["items"]] == [ids[2], ids[1]]
+    page = client.get(f'/ventas/orders?limit=2&cursor={page["next_cursor"]}', headers=headers).json
+    assert [o["id"] for o in page["items"]] == [ids[0]]
+    assert page["next_cursor"] is None
+
+    response = client.get('/ventas/orders?status=paid', headers=headers)
+    assert [o["id"] for o in response.json["items"]] == [ids[0]]
+
+    # Solo un admin puede ver las ordenes de todos
+    assert client.get('/ventas/orders?all=true', headers=headers).status_code == 403
+    response = client.get('/ventas/orders?all=true', headers=admin_headers)
+    assert len(response.json["items"]) == 4
+    assert client.get('/ventas/orders?created_after=ayer', headers=headers).status_code == 400
+
+def test_get_orders_query_count_is_constant(app, client, user_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    for _ in range(10):
+        order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+        client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+    with app.app_context():
+        engine = db.engine
+
+    def selects(limit):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(f'/ventas/orders?limit={limit}', headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert len(response.json["items"]) == limit
+        assert all(o["order_items"] for o in response.json["items"])
+        return len([s for s in statements if s.lstrip().upper().startswith("SELECT")])
+
+    # Ordenes + items (selectinload); sin consultas por fila
+    assert selects(1) == selects(10) == 2
+
+def test_order_totals_follow_items(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 2}, headers=headers)
+
+    # El precio queda capturado en la linea aunque el producto cambie despues
+    with app.app_context():
+        db.session.get(Product, 1).price = 250.0
+        db.session.commit()
+    items = [{"product_id": 1, "quantity": 1}, {"product_id": 2, "quantity": 2}]
+    response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+    assert {i["product_id"]: i["unit_price"] for i in response.json["order_items"]} == {1: 200.0, 2: 15.0}
+
+    order = client.get(f'/ventas/orders/{order_id}', headers=headers).json
+    assert order["item_count"] == 5
+    assert order["subtotal"] == 3 * 200.0 + 2 * 15.0
+
+    case_item = next(i for i in order["order_items"] if i["product_id"] == 2)
+    client.delete(f'/ventas/orders/{order_id}/items/{case_item["id"]}', headers=headers)
+    order = client.get(f'/ventas/orders/{order_id}', headers=headers).json
+    assert (order["item_count"], order["subtotal"]) == (3, 600.0)
+
+    other_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{other_id}/items', json={"product_id": 2, "quantity": 1}, headers=headers)
+    response = client.get('/ventas/orders?sort=-total', headers=headers)
+    assert [o["id"] for o in response.json["items"]] == [order_id, other_id]
+    response = client.get('/ventas/orders?max_total=100', headers=headers)
+    assert [o["id"] for o in response.json["items"]] == [other_id]
+
+def run_jobs(app):
+    import jobs
+    with app.app_context():
+        while jobs.run_pending():
+            pass
+
+def test_sales_rollups_follow_status_changes(client, app, user_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    items = [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}]
+    client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+
+    client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers=admin)
+    client.patch(f'/ventas/orders/{order_id}', json={"status": "shipped"}, headers=admin)
+    run_jobs(app)
+    day = client.get('/ventas/reports/sales', headers=admin).json["items"]
+    assert [(d["revenue"], d["units"], d["orders"]) for d in day] == [(415.0, 3, 1)]
+    hour = client.get('/ventas/reports/sales?granularity=hour&scope=category&scope_id=1', headers=admin).json
+    assert [(h["revenue"], h["orders"]) for h in hour["items"]] == [(415.0, 1)]
+    top = client.get('/ventas/reports/top/product?metric=units', headers=admin).json["items"]
+    assert [(t["scope_id"], t["units"]) for t in top] == [(1, 2), (2, 1)]
+
+    # Una orden pagada y cancelada sale de los rollups
+    other_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{other_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+    client.patch(f'/ventas/orders/{other_id}', json={"status": "paid"}, headers=admin)
+    run_jobs(app)
+    day = client.get('/ventas/reports/sales', headers=admin).json["items"]
+    assert [(d["revenue"], d["orders"]) for d in day] == [(615.0, 2)]
+    client.patch(f'/ventas/orders/{other_id}', json={"status": "cancelled"}, headers=headers)
+    run_jobs(app)
+    day = client.get('/ventas/reports/sales', headers=admin).json["items"]
+    assert [(d["revenue"], d["units"], d["orders"]) for d in day] == [(415.0, 3, 1)]
+
+    assert client.get('/ventas/reports/sales', headers=headers).status_code == 403
+    assert client.get('/ventas/reports/sales?granularity=week', headers=admin).status_code == 400
+
+def test_sales_rollups_backfill_is_resumable(app):
+    import analytics
+    from models import SalesRollup
+    with app.app_context():
+        # Ordenes historicas escritas sin pasar por los hooks
+        for n in range(5):
+            order = Order(user_id=1, status='paid' if n != 2 else 'pending')
+            order.order_items.append(OrderItem(product_id=1, quantity=1, unit_price=200.0))
+            db.session.add(order)
+        db.session.commit()
+
+        def crash(last, target):
+            if last >= 2:
+                raise RuntimeError("interrumpido")
+        with pytest.raises(RuntimeError):
+            analytics.backfill(batch_size=2, on_batch=crash)
+        assert analytics.backfill(batch_size=2) == 3
+
+        total = SalesRollup.query.filter_by(granularity='day', scope='total').one()
+        assert (total.revenue, total.units, total.orders) == (800.0, 4, 4)
+
+    result = app.test_cli_runner().invoke(args=['ventas', 'backfill-rollups', '--batch-size', '10'])
+    assert "Backfilled 5 orders" in result.output
+    with app.app_context():
+        assert SalesRollup.query.filter_by(granularity='day', scope='total').one().orders == 4
+
+def test_idempotency_key_replays_stored_response(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}', 'Idempotency-Key': 'order-1'}
+    first = client.post('/ventas/orders', headers=headers)
+    retry = client.post('/ventas/orders', headers=headers)
+    assert retry.status_code == 201
+    assert retry.json["order"]["id"] == first.json["order"]["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+    order_id = first.json["order"]["id"]
+    headers["Idempotency-Key"] = "item-1"
+    for _ in range(3):
+        client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 2, "quantity": 1}, headers=headers)
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 2, "quantity": 2}, headers=headers)
+    assert response.status_code == 422
+
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert db.session.get(Product, 2).stock == 2
+
+def test_idempotency_key_coalesces_concurrent_duplicates(file_app):
+    with file_app.app_context():
+        token = create_access_token(identity="1")
+    headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'retry-storm'}
+    client = file_app.test_client()
+    order_id = client.post('/ventas/orders', headers={'Authorization': f'Bearer {token}'}).json["order"]["id"]
+
+    results = []
+    def add():
+        response = file_app.test_client().post(
+            f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers
+        )
+        results.append((response.status_code, response.json["order_item"]["id"]))
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 1 and results[0][0] == 201
+    with file_app.app_context():
+        assert db.session.get(Product, 1).stock == 9
+
+def test_rollups_subtract_from_category_at_sale_time(client, app, user_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+    client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers=admin)
+    run_jobs(app)
+
+    # El producto se mueve a otra categoria despues de la venta
+    with app.app_context():
+        other = Category(name="Phones")
+        db.session.add(other)
+        db.session.flush()
+        db.session.get(Product, 1).category_id = other.id
+        db.session.commit()
+    client.patch(f'/ventas/orders/{order_id}', json={"status": "cancelled"}, headers=admin)
+    run_jobs(app)
+
+    def category_revenue(category_id):
+        url = f'/ventas/reports/sales?scope=category&scope_id={category_id}'
+        return [d["revenue"] for d in client.get(url, headers=admin).json["items"]]
+    assert category_revenue(1) == [0.0]
+    assert category_revenue(2) == []
+
+def test_order_status_transitions_and_cancel_releases_stock(client, app, user_access_token, admin_access_token):
+    from models import Job
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    items = [{"product_id": 1, "quantity": 4}, {"product_id": 2, "quantity": 3}]
+    client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "lost"}, headers=headers).status_code == 400
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "shipped"}, headers=admin).status_code == 409
+    # El dueño no puede marcar su orden como pagada
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers=headers).status_code == 403
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers=admin).status_code == 200
+    response = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+    assert response.status_code == 409
+
+    # El PATCH solo encola: el stock vuelve cuando corre el job
+    response = client.patch(f'/ventas/orders/{order_id}', json={"status": "cancelled"}, headers=headers)
+    assert response.json["order"]["status"] == "cancelled"
+    with app.app_context():
+        assert db.session.get(Product, 1).stock == 6
+        kinds = [job.kind for job in Job.query.filter_by(status='queued').order_by(Job.id)]
+        assert kinds.count('orders.release_stock') == 1
+    run_jobs(app)
+    with app.app_context():
+        assert (db.session.get(Product, 1).stock, db.session.get(Product, 2).stock) == (10, 3)
+        assert Job.query.filter(Job.status != 'done').count() == 0
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers=admin).status_code == 409
+
+def test_order_status_requires_owner_or_staff(client, app, user_access_token, admin_access_token):
+    admin = {'Authorization': f'Bearer {admin_access_token}'}
+    with app.app_context():
+        intruder = User(username="intruder", email="intruder@example.com", password="x")
+        db.session.add(intruder)
+        db.session.commit()
+        intruder = {'Authorization': f'Bearer {create_access_token(identity=str(intruder.id))}'}
+    order_id = client.post('/ventas/orders', headers={'Authorization': f'Bearer {user_access_token}'}).json["order"]["id"]
+    for status in ("paid", "cancelled"):
+        assert client.patch(f'/ventas/orders/{order_id}', json={"status": status}, headers=intruder).status_code == 404
+    assert client.patch(f'/ventas/orders/{order_id}', json={"status": "cancelled"}, headers=admin).status_code == 200
+
+def test_order_items_require_owner_or_staff(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    with app.app_context():
+        intruder = User(username="intruder", email="intruder@example.com", password="x")
+        db.session.add(intruder)
+        db.session.commit()
+        intruder = {'Authorization': f'Bearer {create_access_token(identity=str(intruder.id))}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    item_id = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1},
+                          headers=headers).json["order_item"]["id"]
+
+    assert client.get(f'/ventas/orders/{order_id}', headers=intruder).status_code == 404
+    line = {"product_id": 2, "quantity": 1}
+    assert client.post(f'/ventas/orders/{order_id}/items', json=line, headers=intruder).status_code == 404
+    response = client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": [line]}, headers=intruder)
+    assert response.status_code == 404
+    assert client.delete(f'/ventas/orders/{order_id}/items/{item_id}', headers=intruder).status_code == 404
+    with app.app_context():
+        assert (db.session.get(Product, 1).stock, db.session.get(Product, 2).stock) == (9, 3)
+        assert db.session.get(Order, order_id).item_count == 1
+
+def test_adding_existing_line_increments_quantity_in_sql(client, app, user_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+
+    # Otra request suma 5 a la linea entre la lectura y la escritura de esta
+    def concurrent_add(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE order_items") and not injected:
+            injected.append(True)
+            cursor.execute("UPDATE order_items SET quantity = quantity + 5")
+    with app.app_context():
+        for url, body in ((f'/ventas/orders/{order_id}/items', {"product_id": 1, "quantity": 2}),
+                          (f'/ventas/orders/{order_id}/items/batch', {"items": [{"product_id": 1, "quantity": 1}]})):
+            injected = []
+            event.listen(db.engine, 'before_cursor_execute', concurrent_add)
+            try:
+                assert client.post(url, json=body, headers=headers).status_code == 201
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', concurrent_add)
+            assert injected
+        assert OrderItem.query.filter_by(order_id=order_id).one().quantity == 1 + 5 + 2 + 5 + 1
+
+def test_order_closed_during_add_rolls_back_reservation(client, app, user_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+
+    # sweep_expired cierra la orden despues de que la vista leyo su estado
+    def sweep(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE products"):
+            cursor.execute("UPDATE orders SET status = 'expired'")
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', sweep)
+        try:
+            single = client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 2},
+                                 headers=headers)
+            batch = client.post(f'/ventas/orders/{order_id}/items/batch',
+                                json={"items": [{"product_id": 2, "quantity": 1}]}, headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', sweep)
+        assert (single.status_code, batch.status_code) == (409, 409)
+        assert (db.session.get(Product, 1).stock, db.session.get(Product, 2).stock) == (10, 3)
+        assert OrderItem.query.filter_by(order_id=order_id).count() == 0
+
+def test_jobs_retry_with_backoff_then_fail(app):
+    import jobs
+    from models import Job
+    calls = []
+
+    @jobs.handler('test.flaky')
+    def flaky(payload):
+        calls.append(payload["n"])
+        raise RuntimeError("boom")
+
+    with app.app_context():
+        app.config['JOBS_MAX_ATTEMPTS'] = 2
+        job = jobs.enqueue('test.flaky', {"n": 1})
+        db.session.commit()
+        job_id = job.id
+        assert jobs.run_pending() == 1
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ('queued', 1)
+        # Backoff: todavia no esta listo
+        assert jobs.run_pending() == 0
+        job.run_at = job.created_at
+        db.session.commit()
+        assert jobs.run_pending() == 1
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ('failed', 2)
+        assert "boom" in job.last_error
+    assert calls == [1, 1]
+
+def test_jobs_queue_throughput_with_worker_pool(file_app):
+    import time
+    import jobs
+    from models import Job
+    seen = []
+    lock = threading.Lock()
+
+    @jobs.handler('test.count')
+    def count(payload):
+        with lock:
+            seen.append(payload["n"])
+
+    total = 500
+    with file_app.app_context():
+        start = time.perf_counter()
+        for n in range(total):
+            jobs.enqueue('test.count', {"n": n})
+        db.session.commit()
+        enqueue_rate = total / (time.perf_counter() - start)
+
+        worker = jobs.Worker(file_app, threads=4, batch_size=20, poll_interval=0.05)
+        start = time.perf_counter()
+        worker.start()
+        deadline = start + 60
+        while Job.query.filter(Job.status != 'done').count() and time.perf_counter() < deadline:
+            db.session.remove()
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        worker.stop(timeout=5)
+
+    # Cada job corre exactamente una vez aunque compitan 4 hilos
+    assert sorted(seen) == list(range(total))
+    assert total / elapsed > 50 and enqueue_rate > 500, (total / elapsed, enqueue_rate)
+
+def test_sweeper_expires_abandoned_pending_orders(client, app, user_access_token, admin_access_token):
+    from datetime import datetime, timedelta
+    import orders
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    stale = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{stale}/items', json={"product_id": 1, "quantity": 3}, headers=headers)
+    empty = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    fresh = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{fresh}/items', json={"product_id": 2, "quantity": 1}, headers=headers)
+    paid = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{paid}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+    client.patch(f'/ventas/orders/{paid}', json={"status": "paid"}, headers={'Authorization': f'Bearer {admin_access_token}'})
+
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(hours=2)
+        db.session.query(Order).filter(Order.id.in_([stale, empty, paid])).update({"updated_at": old})
+        db.session.commit()
+        assert orders.sweep_expired(ttl=timedelta(minutes=30), batch_size=1) == 2
+        assert db.session.get(Order, stale).status == "expired"
+        assert db.session.get(Order, empty) is None
+        assert db.session.get(Order, fresh).status == "pending"
+        assert db.session.get(Order, paid).status == "paid"
+        assert (db.session.get(Product, 1).stock, db.session.get(Product, 2).stock) == (9, 2)
+        assert orders.sweep_expired(ttl=timedelta(minutes=30)) == 0
+
+    # Quitar un item tambien devuelve su stock
+    item_id = client.get(f'/ventas/orders/{fresh}', headers=headers).json["order_items"][0]["id"]
+    client.delete(f'/ventas/orders/{fresh}/items/{item_id}', headers=headers)
+    with app.app_context():
+        assert db.session.get(Product, 2).stock == 3
+
+def test_delete_pending_order_returns_its_stock(client, app, user_access_token, admin_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    items = [{"product_id": 1, "quantity": 4}, {"product_id": 2, "quantity": 3}]
+    client.post(f'/ventas/orders/{order_id}/items/batch', json={"items": items}, headers=headers)
+    with app.app_context():
+        intruder = User(username="intruder", email="intruder@example.com", password="x")
+        db.session.add(intruder)
+        db.session.commit()
+        intruder = {'Authorization': f'Bearer {create_access_token(identity=str(intruder.id))}'}
+    assert client.delete(f'/ventas/orders/{order_id}', headers=intruder).status_code == 404
+
+    assert client.delete(f'/ventas/orders/{order_id}', headers=headers).status_code == 200
+    with app.app_context():
+        assert (db.session.get(Product, 1).stock, db.session.get(Product, 2).stock) == (10, 3)
+        assert OrderItem.query.filter_by(order_id=order_id).count() == 0
+
+def test_cancel_then_delete_still_returns_stock(client, app, user_access_token):
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 4}, headers=headers)
+    client.patch(f'/ventas/orders/{order_id}', json={"status": "cancelled"}, headers=headers)
+    # Se borra antes de que corra el job de cancelacion
+    assert client.delete(f'/ventas/orders/{order_id}', headers=headers).status_code == 200
+    run_jobs(app)
+    with app.app_context():
+        assert db.session.get(Product, 1).stock == 10
+
+def test_cart_and_history_in_constant_queries(client, app, user_access_token, admin_access_token):
+    from sqlalchemy import event
+    headers = {'Authorization': f'Bearer {user_access_token}'}
+    assert client.get('/ventas/cart', headers=headers).json == {"order": None, "items": []}
+
+    past = []
+    for _ in range(3):
+        order_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+        client.post(f'/ventas/orders/{order_id}/items', json={"product_id": 1, "quantity": 1}, headers=headers)
+        client.patch(f'/ventas/orders/{order_id}', json={"status": "paid"}, headers={'Authorization': f'Bearer {admin_access_token}'})
+        past.append(order_id)
+    cart_id = client.post('/ventas/orders', headers=headers).json["order"]["id"]
+    items = [{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 1}]
+    client.post(f'/ventas/orders/{cart_id}/items/batch', json={"items": items}, headers=headers)
+    with app.app_context():
+        engine = db.engine
+
+    def selects(url):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        return response.json, len([s for s in statements if s.lstrip().upper().startswith("SELECT")])
+
+    cart, queries = selects('/ventas/cart')
+    assert queries == 1
+    assert cart["order"]["id"] == cart_id and cart["order"]["subtotal"] == 415.0
+    assert [(i["name"], i["quantity"], i["line_total"], i["stock"]) for i in cart["items"]] == \
+        [("Phone", 2, 400.0, 5), ("Case", 1, 15.0, 2)]
+
+    page, queries = selects('/ventas/cart/history?limit=2')
+    assert queries == 2
+    assert [o["id"] for o in page["items"]] == [past[2], past[1]]
+    assert page["items"][0]["items"][0]["name"] == "Phone"
+    page, _ = selects(f'/ventas/cart/history?limit=2&cursor={page["next_cursor"]}')
+    assert [o["id"] for o in page["items"]] == [past[0]] and page["next_cursor"] is None
+
+def test_idempotency_store_rejects_new_keys_instead_of_evicting(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'full.db'}", "IDEMPOTENCY_MAXSIZE": 1})
+    with app.app_context():
+        db.create_all()
+        seed()
+        token = create_access_token(identity="1")
+    client = app.test_client()
+    first = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'first'}
+    order_id = client.post('/ventas/orders', headers=first).json["order"]["id"]
+
+    response = client.post('/ventas/orders', headers={**first, 'Idempotency-Key': 'second'})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    # La primera clave sigue guardada: su reintento no crea otra orden
+    assert client.post('/ventas/orders', headers=first).json["order"]["id"] == order_id
+    with app.app_context():
+        assert Order.query.count() == 1
+
+def test_memory_idempotency_store_refused_with_several_workers():
+    with pytest.raises(RuntimeError):
+        create_app({"WEB_CONCURRENCY": 2})
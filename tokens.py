@@ -0,0 +1,106 @@
+import time
+import uuid
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import delete, select, update
+
+from models import db, RefreshToken, User
+from logger import setup_logger
+import authz
+import jobs
+import revocation
+
+logger = setup_logger(__name__)
+
+
+class RefreshError(Exception):
+    """El refresh token no sirve; `reused` indica que ya se habia usado."""
+
+    def __init__(self, msg, reused=False):
+        super().__init__(msg)
+        self.reused = reused
+
+
+def issue(user, family=None):
+    """Emite un par access/refresh. El refresh queda registrado en su familia
+    (una por login) dentro de la transaccion actual; el llamador hace commit."""
+    family = family or str(uuid.uuid4())
+    jti = str(uuid.uuid4())
+    expires = current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    db.session.add(RefreshToken(
+        jti=jti, family=family, user_id=user.id, expires_at=jobs.utcnow() + expires,
+    ))
+    identity = str(user.id)
+    return {
+        "access_token": create_access_token(identity=identity, additional_claims={**authz.claims_for(user), "fam": family}),
+        "refresh_token": create_refresh_token(identity=identity, additional_claims={"jti": jti, "fam": family}),
+    }
+
+
+def rotate(jwt_payload):
+    """Canjea un refresh token por un par nuevo de la misma familia.
+
+    El token se marca usado con un UPDATE condicional, asi dos canjes
+    concurrentes no pueden ganar los dos. Presentar un token ya usado es
+    señal de robo: se revoca la familia entera y se lanza RefreshError.
+    """
+    now = jobs.utcnow()
+    row = db.session.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.jti == jwt_payload['jti'],
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked.is_(False),
+            RefreshToken.expires_at > now,
+        )
+        .values(used_at=now)
+        .returning(RefreshToken.family, RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        family = db.session.scalar(select(RefreshToken.family).where(RefreshToken.jti == jwt_payload['jti']))
+        if family is not None:
+            revoke_family(family)
+            logger.warning(f"Refresh token reuse detected, family {family} revoked")
+        raise RefreshError("Refresh token already used or revoked", reused=family is not None)
+
+    user = db.session.get(User, row.user_id)
+    if user is None or not user.is_active:
+        revoke_family(row.family)
+        raise RefreshError("User account is inactive")
+    return user, issue(user, row.family)
+
+
+def revoke_family(family):
+    """Corta la sesion: ni sus refresh tokens ni los access tokens que emitio
+    siguen valiendo."""
+    expires = current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+    revocation.revoke_family(family, time.time() + expires.total_seconds())
+    db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family == family, RefreshToken.revoked.is_(False))
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def revoke_user(user_id):
+    """Revoca todas las familias del usuario (baja de la cuenta)."""
+    db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked.is_(False))
+        .values(revoked=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def drop_user(user_id):
+    """Borra los refresh tokens del usuario antes de borrarlo."""
+    db.session.execute(delete(RefreshToken).where(RefreshToken.user_id == user_id))
+
+
+@jobs.periodic('tokens.purge', 'REFRESH_PURGE_INTERVAL', 3600)
+def _purge():
+    db.session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= jobs.utcnow()))
+    db.session.commit()
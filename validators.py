@@ -1,6 +1,7 @@
 from marshmallow import ValidationError
 import re
 from models import User, Product, Order, OrderItem, Comment, Category
+from id_codes import PRODUCT_CODE_RE
 
 
 def validate_password(password):
@@ -33,4 +34,13 @@ def validate_price(price):
     
 def validate_stock(stock):
     if stock < 0:
-        raise ValidationError("El stock no puede ser negativo.")
\ No newline at end of file
+        raise ValidationError("El stock no puede ser negativo.")
+
+def validate_id_code(id_code):
+    # El prefijo PROD-<n> lo reparte el asignador de id_codes.py
+    if PRODUCT_CODE_RE.match(id_code):
+        raise ValidationError("Los codigos PROD-<numero> se asignan automaticamente.")
+
+def validate_stars(stars):
+    if stars < 1 or stars > 5:
+        raise ValidationError("Las estrellas deben estar entre 1 y 5.")
\ No newline at end of file